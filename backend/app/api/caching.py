@@ -0,0 +1,91 @@
+"""Conditional GET / compression for responses served from the response cache."""
+
+from typing import Awaitable, Callable, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.api.responses import dumps
+from app.services.response_cache import CachedResponse, brotli, get_response_cache
+
+# Readers revalidate on every view; unchanged resources cost a 304
+CACHE_CONTROL = "private, no-cache"
+
+
+async def cached_resource(
+    request: Request,
+    resource: str,
+    resource_id: str,
+    loader: Callable[[], Awaitable[dict]],
+    tags: Callable[[dict], Iterable[Tuple[str, str]]] = lambda data: (),
+    variant: str = "",
+) -> Tuple[Response, dict]:
+    """
+    Serve (resource, id) from the response cache, loading it with `loader`
+    on a miss (HTTPExceptions such as 404 pass through uncached). `variant`
+    names the projection the loader selects. Returns the response (304 when
+    If-None-Match matches) and the resource data.
+    """
+    cache = get_response_cache()
+    key = (resource, str(resource_id))
+
+    cached = cache.get(key, variant)
+    if cached is None:
+        generation = cache.generation(key)
+        data = await loader()
+        body = dumps({"success": True, "data": data, "error": None, "meta": None})
+        cached = CachedResponse(data, body, cache.compress_min_bytes)
+        cache.put(key, variant, cached, generation, tags(data))
+
+    # Each encoding is its own representation, with its own ETag
+    encoding = _negotiate(request.headers.get("accept-encoding"))
+    etag = cached.etag_for(encoding)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        cache.not_modified += 1
+        return Response(status_code=304, headers=headers), cached.data
+
+    body, encoding = cached.encoded(encoding)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return (
+        Response(content=body, media_type="application/json", headers=headers),
+        cached.data,
+    )
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Preferred available encoding (br, then gzip) the client accepts."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+
+    def ok(encoding: str) -> bool:
+        return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+    if brotli is not None and ok("br"):
+        return "br"
+    if ok("gzip"):
+        return "gzip"
+    return None
@@ -1,8 +1,19 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import List, Literal, Optional
 from uuid import UUID
 
-from app.services.supabase_client import get_supabase_client
+from supabase import Client
+
+from app.api.deps import get_supabase
+from app.services.supabase_client import execute
+from app.api.caching import cached_resource
+from app.api.pagination import CREATED_AT_KEYS, fetch_page
+from app.api.projection import CHARACTER, project
+from app.api.responses import ok_response
+from app.services.character_indexer import get_character_indexer
+from app.services.vector_index import get_story_vector_index
+from app.services.entity_matcher import get_story_entity_matcher
+from app.services.response_cache import get_response_cache
 from app.schemas.models import Character, CharacterCreate, ApiResponse
 
 router = APIRouter(prefix="/characters", tags=["characters"])
@@ -10,38 +21,45 @@ router = APIRouter(prefix="/characters", tags=["characters"])
 
 @router.get("", response_model=ApiResponse)
 async def list_characters(
-    limit: int = Query(default=10, ge=1, le=100), offset: int = Query(default=0, ge=0)
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    count: Optional[Literal["exact", "planned"]] = None,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    client: Client = Depends(get_supabase),
 ):
-    """List all characters."""
+    """List all characters, newest first (cursor paginated)."""
     try:
-        client = get_supabase_client()
-        response = (
-            client.table("characters")
-            .select("*")
-            .range(offset, offset + limit - 1)
-            .execute()
+        projection = project(CHARACTER, fields, exclude, list_view=True)
+        characters, meta = await fetch_page(
+            client.table("characters").select(projection.select(), count=count),
+            CREATED_AT_KEYS,
+            limit,
+            cursor,
         )
 
-        return ApiResponse.ok(
-            data=response.data,
-            meta={"total": len(response.data), "limit": limit, "offset": offset},
-        )
+        return ok_response(characters, meta)
+    except HTTPException:
+        raise
     except Exception as e:
         return ApiResponse.fail(str(e))
 
 
 @router.post("", response_model=ApiResponse)
-async def create_character(character: CharacterCreate):
+async def create_character(
+    character: CharacterCreate, client: Client = Depends(get_supabase)
+):
     """Create a new character."""
     try:
-        client = get_supabase_client()
-
         character_data = character.model_dump()
-        response = client.table("characters").insert(character_data).execute()
+        response = await execute(client.table("characters").insert(character_data))
 
         if not response.data:
             raise HTTPException(status_code=500, detail="Failed to create character")
 
+        # Embedding is generated in the background (see character_indexer.py)
+        get_character_indexer().enqueue(response.data[0])
+
         return ApiResponse.ok(data=response.data[0])
     except Exception as e:
         raise HTTPException(
@@ -49,23 +67,54 @@ async def create_character(character: CharacterCreate):
         )
 
 
-@router.get("/{character_id}", response_model=ApiResponse)
-async def get_character(character_id: UUID):
-    """Get a specific character."""
+@router.get("/index-status", response_model=ApiResponse)
+async def character_index_status(client: Client = Depends(get_supabase)):
+    """Embedding index lag and counters."""
     try:
-        client = get_supabase_client()
-        response = (
+        stats = get_character_indexer().stats()
+
+        response = await execute(
             client.table("characters")
-            .select("*")
-            .eq("id", str(character_id))
-            .single()
-            .execute()
+            .select("id", count="exact")
+            .is_("embedding", "null")
+            .limit(1)
         )
+        stats["unindexed"] = response.count
 
-        if not response.data:
-            raise HTTPException(status_code=404, detail="Character not found")
+        return ApiResponse.ok(data=stats)
+    except Exception as e:
+        return ApiResponse.fail(str(e))
 
-        return ApiResponse.ok(data=response.data)
+
+@router.get("/{character_id}", response_model=ApiResponse)
+async def get_character(
+    character_id: UUID,
+    request: Request,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    client: Client = Depends(get_supabase),
+):
+    """Get a specific character (cached, conditional GET)."""
+    try:
+        projection = project(CHARACTER, fields, exclude)
+
+        async def load() -> dict:
+            response = await execute(
+                client.table("characters")
+                .select(projection.select())
+                .eq("id", str(character_id))
+                .single()
+            )
+
+            if not response.data:
+                raise HTTPException(status_code=404, detail="Character not found")
+
+            return response.data
+
+        response, _ = await cached_resource(
+            request, "character", str(character_id), load, variant=projection.variant
+        )
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -75,20 +124,38 @@ async def get_character(character_id: UUID):
 
 
 @router.patch("/{character_id}", response_model=ApiResponse)
-async def update_character(character_id: UUID, character_update: dict):
+async def update_character(
+    character_id: UUID, character_update: dict, client: Client = Depends(get_supabase)
+):
     """Update a character."""
     try:
-        client = get_supabase_client()
-        response = (
+        response = await execute(
             client.table("characters")
             .update(character_update)
             .eq("id", str(character_id))
-            .execute()
         )
 
         if not response.data:
             raise HTTPException(status_code=404, detail="Character not found")
 
+        # Re-embed only if name/description/traits/appearance/background changed
+        get_character_indexer().enqueue(response.data[0])
+
+        story_index = get_story_vector_index()
+        if story_index is not None:
+            # Refresh name/description now; the vector follows once re-embedded
+            updated = response.data[0]
+            story_index.upsert_character(
+                {
+                    "id": updated["id"],
+                    "name": updated["name"],
+                    "description": updated["description"],
+                }
+            )
+        get_story_entity_matcher().upsert_character(response.data[0])
+        # Also drops the cached stories that embed this character
+        get_response_cache().invalidate("character", str(character_id))
+
         return ApiResponse.ok(data=response.data[0])
     except HTTPException:
         raise
@@ -99,17 +166,24 @@ async def update_character(character_id: UUID, character_update: dict):
 
 
 @router.delete("/{character_id}", response_model=ApiResponse)
-async def delete_character(character_id: UUID):
+async def delete_character(character_id: UUID, client: Client = Depends(get_supabase)):
     """Delete a character."""
     try:
-        client = get_supabase_client()
-        response = (
-            client.table("characters").delete().eq("id", str(character_id)).execute()
+        response = await execute(
+            client.table("characters").delete().eq("id", str(character_id))
         )
 
         if not response.data:
             raise HTTPException(status_code=404, detail="Character not found")
 
+        get_character_indexer().discard(str(character_id))
+
+        story_index = get_story_vector_index()
+        if story_index is not None:
+            story_index.remove_character(str(character_id))
+        get_story_entity_matcher().remove_character(str(character_id))
+        get_response_cache().invalidate("character", str(character_id))
+
         return ApiResponse.ok(data={"deleted": True, "character_id": str(character_id)})
     except HTTPException:
         raise
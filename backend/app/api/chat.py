@@ -1,21 +1,173 @@
-from fastapi import APIRouter, HTTPException
+import json
+import math
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from app.schemas.chat import ChatRequest
 from app.services.chat_service import ChatService
+from app.services.embedding_cache import get_embedding_cache
+from app.services.llm_scheduler import SchedulerOverloaded, get_llm_scheduler
+from app.services.session_store import SessionBindingError
+from app.api.deps import get_chat_service
 
 router = APIRouter()
-chat_service = ChatService()
+
 
 @router.post("/chat")
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest, chat_service: ChatService = Depends(get_chat_service)
+):
     try:
-        # Request에 history 필드가 있다면 받아서 넘겨줄 수 있음 (현재 스키마엔 없음)
-        ai_response = await chat_service.generate_response(request.message)
+        ai_response = await chat_service.generate_response(
+            request.message,
+            history=_history(request),
+            story_id=_story_id(request),
+            session_id=request.session_id,
+            user_id=_user_id(request),
+        )
         return {"response": ai_response}
 
+    except SessionBindingError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except SchedulerOverloaded as e:
+        raise _overloaded(e)
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(
             status_code=500, detail=f"AI 응답 생성 중 오류 발생: {str(e)}"
         )
-    
 
+
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    http_request: Request,
+    chat_service: ChatService = Depends(get_chat_service),
+):
+    """
+    토큰 단위 스트리밍 응답 (Server-Sent Events).
+    event: token  -> {"content": "..."}
+    event: done   -> {"content": 전체 텍스트, "usage": {...}}
+    event: error  -> {"detail": "..."}
+    LLM 대기열이 이미 마감 시간을 넘길 상태면 스트림을 열기 전에 503으로 거절합니다.
+    다른 사용자/스토리에 묶인 세션이면(세션에 user_id가 있는데 요청에 없는 경우 포함) 403.
+    """
+    try:
+        get_llm_scheduler().check_admission("chat")
+        if request.session_id:
+            # 바인딩 오류는 스트림을 열기 전에 403으로 (세션은 메모리에 캐시됨)
+            await chat_service.session_store.get(
+                request.session_id, _user_id(request), _story_id(request)
+            )
+    except SchedulerOverloaded as e:
+        raise _overloaded(e)
+    except SessionBindingError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+    async def event_stream():
+        events = chat_service.stream_response(
+            request.message,
+            history=_history(request),
+            story_id=_story_id(request),
+            session_id=request.session_id,
+            user_id=_user_id(request),
+        )
+        try:
+            async for event in events:
+                # 클라이언트가 떠났으면 더 읽지 않고 upstream 생성을 중단
+                if await http_request.is_disconnected():
+                    break
+                yield _format_sse(event.pop("type"), event)
+        except Exception as e:
+            print(f"Error: {e}")
+            yield _format_sse(
+                "error", {"detail": f"AI 응답 생성 중 오류 발생: {str(e)}"}
+            )
+        finally:
+            # stream_response의 finally에서 Groq 스트림을 닫음
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/chat/sessions/{session_id}")
+async def get_session(
+    session_id: str,
+    user_id: Optional[str] = None,
+    chat_service: ChatService = Depends(get_chat_service),
+):
+    """세션의 바인딩 정보와 최근 메시지 (메모리에 유지되는 범위)."""
+    try:
+        session = await chat_service.session_store.get(session_id, user_id)
+    except SessionBindingError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get session: {str(e)}")
+
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    return {
+        "session_id": session.session_id,
+        "user_id": session.user_id,
+        "story_id": session.story_id,
+        "message_count": session.next_seq,
+        "messages": session.history(),
+    }
+
+
+@router.get("/chat/session-store")
+async def session_store_stats(chat_service: ChatService = Depends(get_chat_service)):
+    """Session cache counters."""
+    return chat_service.session_store.stats()
+
+
+@router.get("/chat/rag-status")
+async def rag_status(chat_service: ChatService = Depends(get_chat_service)):
+    """RAG decision paths, circuit breaker state and per-stage timings."""
+    return {
+        **chat_service.rag_service.stats(),
+        "decisions": dict(chat_service.rag_decisions),
+        "entity_matcher": chat_service.entity_matcher.stats(),
+    }
+
+
+@router.get("/chat/scheduler")
+async def scheduler_stats():
+    """LLM queue depth, wait times, concurrency limit and shed/coalesced counts."""
+    return get_llm_scheduler().stats()
+
+
+@router.get("/chat/embedding-cache")
+async def embedding_cache_stats():
+    """Embedding cache hit/miss counters."""
+    return get_embedding_cache().stats()
+
+
+def _overloaded(e: SchedulerOverloaded) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+    )
+
+
+def _story_id(request: ChatRequest):
+    return str(request.story_id) if request.story_id else None
+
+
+def _user_id(request: ChatRequest):
+    return str(request.user_id) if request.user_id else None
+
+
+def _history(request: ChatRequest):
+    return [m.model_dump() for m in request.history]
+
+
+def _format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,23 @@
+from fastapi import Request
+from supabase import Client
+
+from app.services.chat_service import ChatService
+from app.services.container import ServiceContainer
+from app.services.image_service import ImageService
+
+
+def get_services(request: Request) -> ServiceContainer:
+    """Service container created in the app lifespan (main.py)."""
+    return request.app.state.services
+
+
+def get_supabase(request: Request) -> Client:
+    return get_services(request).supabase
+
+
+def get_chat_service(request: Request) -> ChatService:
+    return get_services(request).chat
+
+
+def get_image_service(request: Request) -> ImageService:
+    return get_services(request).images
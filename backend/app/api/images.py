@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from app.api.deps import get_image_service
+from app.services.image_service import ImageService
+from app.schemas.models import ApiResponse
+
+router = APIRouter(prefix="/images", tags=["images"])
+
+
+@router.get("/cache", response_model=ApiResponse)
+async def image_cache_stats(images: ImageService = Depends(get_image_service)):
+    """Image generation cache hit rates."""
+    return ApiResponse.ok(data=images.cache_stats())
+
+
+@router.delete("/cache", response_model=ApiResponse)
+async def purge_image_cache(
+    model_id: Optional[str] = None,
+    images: ImageService = Depends(get_image_service),
+):
+    """Admin: forget cached prompts (optionally for one model) so they re-render."""
+    try:
+        purged = await images.purge_cache(model_id)
+        return ApiResponse.ok(data={"purged": purged})
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to purge image cache: {str(e)}"
+        )
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException
+from uuid import UUID
+
+from app.services.job_queue import get_job_queue
+from app.schemas.models import ApiResponse
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}", response_model=ApiResponse)
+async def get_job(job_id: UUID):
+    """Get the status (and result) of a background media job."""
+    try:
+        job = await get_job_queue().get(str(job_id))
+
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        return ApiResponse.ok(data=job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch job: {str(e)}")
+
+
+@router.post("/{job_id}/retry", response_model=ApiResponse)
+async def retry_job(job_id: UUID):
+    """Requeue a dead-lettered job."""
+    try:
+        job = await get_job_queue().requeue(str(job_id))
+
+        if not job:
+            raise HTTPException(status_code=404, detail="Dead-lettered job not found")
+
+        return ApiResponse.ok(data=job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retry job: {str(e)}")
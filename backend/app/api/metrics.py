@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Response
+
+from app.services.metrics import get_metrics
+
+router = APIRouter(tags=["metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(content=get_metrics().render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,120 @@
+"""Keyset (cursor) pagination for list endpoints."""
+
+import base64
+import json
+from typing import List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+from app.services.supabase_client import execute
+
+# (column, descending); the last key must be unique (e.g. id)
+SortKey = Tuple[str, bool]
+
+# Newest first; served by idx_*_created_at (created_at desc, id desc)
+CREATED_AT_KEYS: Sequence[SortKey] = (("created_at", True), ("id", True))
+
+
+async def fetch_page(
+    query, keys: Sequence[SortKey], limit: int, cursor: Optional[str] = None
+) -> Tuple[List[dict], dict]:
+    """
+    One page of `query` (a select builder with its filters applied) in
+    `keys` order, continuing from `cursor`. Returns the rows and the page
+    meta: limit, opaque next/prev cursors (None at either end) and the row
+    count when the select asked for one (count="exact"/"planned").
+
+    Instead of OFFSET, the page starts strictly after the cursor's key
+    values, so every page costs the same index range scan however deep the
+    reader has scrolled.
+    """
+    direction, values = ("next", None) if cursor is None else _decode(cursor, keys)
+    backwards = direction == "prev"
+
+    if values is not None:
+        query = _seek(query, keys, values, backwards)
+    for column, descending in keys:
+        query = query.order(column, desc=descending != backwards)
+
+    # One extra row tells whether there is another page
+    response = await execute(query.limit(limit + 1))
+    rows = response.data or []
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    meta = {"limit": limit, "next_cursor": None, "prev_cursor": None}
+    if rows:
+        has_next = values is not None if backwards else has_more
+        has_prev = has_more if backwards else values is not None
+        if has_next:
+            meta["next_cursor"] = _encode(rows[-1], keys, "next")
+        if has_prev:
+            meta["prev_cursor"] = _encode(rows[0], keys, "prev")
+    if response.count is not None:
+        meta["total"] = response.count
+
+    return rows, meta
+
+
+def _seek(query, keys: Sequence[SortKey], values: list, backwards: bool):
+    """Filter to the rows strictly after `values` in (possibly reversed) key order."""
+
+    def op(descending: bool, strict: bool = True) -> str:
+        before = descending != backwards
+        return ("lt" if before else "gt") if strict else ("lte" if before else "gte")
+
+    first_column, first_descending = keys[0]
+    if len(keys) == 1:
+        return query.filter(
+            first_column, op(first_descending), _literal(values[0], quoted=False)
+        )
+
+    # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y); the redundant a >= x
+    # bounds the index scan, which the OR alone doesn't
+    terms = []
+    for i, (column, descending) in enumerate(keys):
+        conditions = [
+            f"{prior}.eq.{_literal(value)}"
+            for (prior, _), value in zip(keys[:i], values[:i])
+        ]
+        conditions.append(f"{column}.{op(descending)}.{_literal(values[i])}")
+        terms.append(
+            conditions[0] if len(conditions) == 1 else f"and({','.join(conditions)})"
+        )
+    query = query.filter(
+        first_column,
+        op(first_descending, strict=False),
+        _literal(values[0], quoted=False),
+    )
+    return query.or_(",".join(terms))
+
+
+def _literal(value, quoted: bool = True) -> str:
+    # Timestamps contain ':' and '+', reserved inside or=(...)
+    text = str(value)
+    if not quoted:
+        return text
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _encode(row: dict, keys: Sequence[SortKey], direction: str) -> str:
+    payload = {"d": direction, "v": [row[column] for column, _ in keys]}
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str, keys: Sequence[SortKey]) -> Tuple[str, list]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        direction, values = payload["d"], payload["v"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if direction not in ("next", "prev") or len(values) != len(keys):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if any(value is None for value in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return direction, values
@@ -0,0 +1,74 @@
+import math
+
+from fastapi import APIRouter, HTTPException
+from uuid import UUID
+
+from app.services.progress_buffer import ProgressBufferFull, get_progress_buffer
+from app.services.story_graph import get_story_graph_cache
+from app.schemas.models import ApiResponse, ProgressEvent
+
+router = APIRouter(prefix="/stories/{story_id}/progress", tags=["progress"])
+
+
+@router.post("", response_model=ApiResponse)
+async def record_progress(story_id: UUID, event: ProgressEvent):
+    """
+    Record that a reader reached a scene. Buffered and written in batches
+    (see progress_buffer.py); reads already include it.
+    """
+    try:
+        # Scene -> sequence (its bit in the progress bitmap) from the cached graph
+        sequence = await get_story_graph_cache().scene_sequence(
+            str(story_id), str(event.scene_id)
+        )
+
+        if sequence is None:
+            raise HTTPException(status_code=404, detail="Scene not found in story")
+
+        # Checked here: a row for an unknown user would be rejected at flush time
+        buffer = get_progress_buffer()
+        if not await buffer.user_exists(str(event.user_id)):
+            raise HTTPException(status_code=404, detail="User not found")
+
+        buffer.record(
+            str(event.user_id),
+            str(story_id),
+            str(event.scene_id),
+            sequence,
+            choice_id=str(event.choice_id) if event.choice_id else None,
+            is_completed=event.is_completed,
+        )
+
+        return ApiResponse.ok(
+            data={"scene_id": str(event.scene_id), "sequence": sequence}
+        )
+    except HTTPException:
+        raise
+    except ProgressBufferFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to record progress: {str(e)}"
+        )
+
+
+@router.get("", response_model=ApiResponse)
+async def get_progress(story_id: UUID, user_id: UUID):
+    """A reader's progress in a story, including updates not yet flushed."""
+    try:
+        progress = await get_progress_buffer().get(str(user_id), str(story_id))
+
+        if progress is None:
+            raise HTTPException(status_code=404, detail="Progress not found")
+
+        return ApiResponse.ok(data=progress)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to fetch progress: {str(e)}"
+        )
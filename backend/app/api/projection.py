@@ -0,0 +1,157 @@
+"""Sparse fieldsets (?fields= / ?exclude=) pushed down into the PostgREST select."""
+
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+
+class Resource:
+    """
+    Selectable columns of a table, plus embedded relations that cost an extra
+    query or join (story -> characters, scene -> choices).
+
+    `always` columns are selected whatever the request asks for (ids, sort
+    keys for cursors, columns the response cache keys on). `hidden` columns
+    are left out unless named in `fields`; `hidden_in_lists` are additionally
+    left out of list views.
+    """
+
+    def __init__(
+        self,
+        columns: Iterable[str],
+        relations: Iterable[str] = (),
+        always: Iterable[str] = ("id",),
+        hidden: Iterable[str] = (),
+        hidden_in_lists: Iterable[str] = (),
+    ):
+        self.columns: Tuple[str, ...] = tuple(columns)
+        self.relations: FrozenSet[str] = frozenset(relations)
+        self.always: FrozenSet[str] = frozenset(always)
+        self.hidden: FrozenSet[str] = frozenset(hidden)
+        self.hidden_in_lists: FrozenSet[str] = frozenset(hidden_in_lists)
+
+
+STORY = Resource(
+    columns=(
+        "id",
+        "user_id",
+        "title",
+        "genre",
+        "description",
+        "status",
+        "total_scenes",
+        "current_scene_id",
+        "cover_image_url",
+        "created_at",
+        "updated_at",
+    ),
+    relations=("characters",),
+    always=("id", "created_at"),
+)
+
+SCENE = Resource(
+    columns=(
+        "id",
+        "story_id",
+        "chapter_id",
+        "content",
+        "sequence",
+        "emotion_score",
+        "importance_score",
+        "has_generated_image",
+        "has_generated_bgm",
+        "scene_type",
+        "current_choice_id",
+        "created_at",
+        "updated_at",
+    ),
+    relations=("choices",),
+    always=("id", "story_id", "sequence"),
+    hidden_in_lists=("content",),
+)
+
+CHARACTER = Resource(
+    columns=(
+        "id",
+        "user_id",
+        "name",
+        "description",
+        "aliases",
+        "key_terms",
+        "personality_traits",
+        "background_story",
+        "appearance_description",
+        "image_url",
+        "embedding",
+        "embedding_hash",
+        "embedded_at",
+        "created_at",
+        "updated_at",
+    ),
+    always=("id", "created_at"),
+    # 384 floats as JSON text: several KB per row the client never uses
+    hidden=("embedding", "embedding_hash"),
+    hidden_in_lists=("background_story",),
+)
+
+
+class Projection:
+    def __init__(self, columns: List[str], relations: FrozenSet[str]):
+        self.columns = columns
+        self.relations = relations
+
+    def select(self) -> str:
+        return ",".join(self.columns)
+
+    def includes(self, relation: str) -> bool:
+        return relation in self.relations
+
+    @property
+    def variant(self) -> str:
+        """Stable key for the response cache."""
+        return ",".join(self.columns + sorted(self.relations))
+
+
+def project(
+    resource: Resource,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    list_view: bool = False,
+) -> Projection:
+    """
+    Resolve ?fields=a,b / ?exclude=c (comma separated) for `resource`.
+    `fields` replaces the default set ("*" = every column, hidden ones
+    included); `exclude` is then removed from it. Unknown names are a 400.
+    """
+    # Lists don't embed relations
+    relations = frozenset() if list_view else resource.relations
+    requested = _names(resource, relations, fields)
+    excluded = _names(resource, relations, exclude) or set()
+
+    if requested is None:
+        hidden = resource.hidden | (resource.hidden_in_lists if list_view else set())
+        requested = {c for c in resource.columns if c not in hidden} | relations
+    elif "*" in requested:
+        requested = set(resource.columns) | relations
+
+    selected = (requested - excluded) | resource.always
+    return Projection(
+        [c for c in resource.columns if c in selected],
+        frozenset(selected & resource.relations),
+    )
+
+
+def _names(
+    resource: Resource, relations: FrozenSet[str], value: Optional[str]
+) -> Optional[set]:
+    if value is None:
+        return None
+
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    known = set(resource.columns) | relations | {"*"}
+    unknown = sorted(names - known)
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}"
+        )
+    return names
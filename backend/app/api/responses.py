@@ -0,0 +1,22 @@
+"""ApiResponse bodies encoded straight to JSON bytes with orjson."""
+
+from typing import Any, Optional
+
+import orjson
+from fastapi import Response
+
+
+def dumps(payload: Any) -> bytes:
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+
+
+def ok_response(data: Any = None, meta: Optional[dict] = None) -> Response:
+    """
+    Same body as ApiResponse.ok(data, meta). The rows come straight from
+    PostgREST, so they are encoded as-is instead of being re-validated
+    through the pydantic model.
+    """
+    return Response(
+        content=dumps({"success": True, "data": data, "error": None, "meta": meta}),
+        media_type="application/json",
+    )
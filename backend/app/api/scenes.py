@@ -1,8 +1,29 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
+import asyncio
+import json
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Literal, Optional, Set
 from uuid import UUID
 
-from app.services.supabase_client import get_supabase_client
+from postgrest.exceptions import APIError
+
+from supabase import Client
+
+from app.api.deps import get_supabase
+from app.services.supabase_client import execute
+from app.api.caching import cached_resource
+from app.api.pagination import fetch_page
+from app.api.projection import SCENE, project
+from app.api.responses import ok_response
+from app.services.job_queue import get_job_queue
+from app.services.llm_scheduler import SchedulerOverloaded
+from app.services.progress_buffer import get_progress_buffer
+from app.services.scene_generator import get_scene_generator
+from app.services.scoring_engine import get_scoring_engine
+from app.services.story_graph import get_story_graph_cache
+from app.services.response_cache import get_response_cache
 from app.schemas.models import (
     Scene,
     SceneCreate,
@@ -11,44 +32,65 @@ from app.schemas.models import (
     ChoiceCreate,
     ApiResponse,
     SceneScore,
+    BulkSceneCreate,
+    BulkSceneImport,
 )
 
 router = APIRouter(prefix="/stories/{story_id}/scenes", tags=["scenes"])
 
+# Concurrent appends to one story race for the next sequence number
+APPEND_ATTEMPTS = 5
+UNIQUE_VIOLATION = "23505"
+# Sequences per existence check in a bulk import
+SEQUENCE_LOOKUP_CHUNK = 500
+
 
 @router.get("", response_model=ApiResponse)
 async def list_scenes(
     story_id: UUID,
     chapter_id: Optional[UUID] = None,
     limit: int = Query(default=20, ge=1, le=100),
-    offset: int = Query(default=0, ge=0),
+    cursor: Optional[str] = None,
+    count: Optional[Literal["exact", "planned"]] = None,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    client: Client = Depends(get_supabase),
 ):
-    """List all scenes in a story."""
+    """
+    List the scenes of a story in reading order (cursor paginated). Scene
+    text is left out unless asked for (?fields=content,...).
+    """
     try:
-        client = get_supabase_client()
-        query = client.table("scenes").select("*").eq("story_id", str(story_id))
+        projection = project(SCENE, fields, exclude, list_view=True)
+        query = (
+            client.table("scenes")
+            .select(projection.select(), count=count)
+            .eq("story_id", str(story_id))
+        )
 
         if chapter_id:
             query = query.eq("chapter_id", str(chapter_id))
 
-        response = query.order("sequence").range(offset, offset + limit - 1).execute()
+        # (story_id, sequence) is unique and indexed (idx_scenes_sequence)
+        scenes, meta = await fetch_page(query, [("sequence", False)], limit, cursor)
 
-        return ApiResponse.ok(
-            data=response.data,
-            meta={"total": len(response.data), "limit": limit, "offset": offset},
-        )
+        return ok_response(scenes, meta)
+    except HTTPException:
+        raise
     except Exception as e:
         return ApiResponse.fail(str(e))
 
 
 @router.post("", response_model=ApiResponse)
-async def create_scene(story_id: UUID, scene: SceneCreate):
+async def create_scene(
+    story_id: UUID, scene: SceneCreate, client: Client = Depends(get_supabase)
+):
     """Create a new scene in a story."""
     try:
-        client = get_supabase_client()
-
-        # Calculate scores
-        scores = calculate_scene_scores(scene.content)
+        # Calculate scores (with the story genre's lexicon)
+        scores = calculate_scene_scores(
+            scene.content, await _story_genre(client, story_id)
+        )
 
         scene_data = scene.model_dump(
             exclude={"choices", "generate_image", "generate_bgm"}
@@ -56,32 +98,16 @@ async def create_scene(story_id: UUID, scene: SceneCreate):
         scene_data["story_id"] = str(story_id)
         scene_data["emotion_score"] = scores["emotion_score"]
         scene_data["importance_score"] = scores["importance_score"]
-        scene_data["has_generated_image"] = scores["should_generate_image"]
+        # Set to true by the image job once the image is stored
+        scene_data["has_generated_image"] = False
         scene_data["has_generated_bgm"] = scores["should_generate_bgm"]
 
         # Insert scene
-        scene_response = client.table("scenes").insert(scene_data).execute()
+        scene_response = await execute(client.table("scenes").insert(scene_data))
 
         if not scene_response.data:
             raise HTTPException(status_code=500, detail="Failed to create scene")
 
-        created_scene = scene_response.data[0]
-        scene_id = created_scene["id"]
-        
-        # 4. Trigger Image Generation (Async)
-        # Note: In production, use Celery/BackgroundTasks. 
-        # Here we just fire and forget or await (for simplicity awaiting, which might slow response)
-        if scores["should_generate_image"]:
-            # Warning: Creating service instance here. Dependency Injection is better.
-            from app.services.image_service import ImageService
-            image_service = ImageService()
-            
-            # Use BackgroundTasks in real app. For now, await it to ensure it works.
-            # prompt: use first 100 chars of content as prompt
-            prompt = scene.content[:200]
-            await image_service.generate_scene_image(prompt, scene_id)
-
-
         created_scene = scene_response.data[0]
         scene_id = created_scene["id"]
 
@@ -91,10 +117,24 @@ async def create_scene(story_id: UUID, scene: SceneCreate):
                 {**choice.model_dump(), "scene_id": scene_id}
                 for choice in scene.choices
             ]
-            client.table("choices").insert(choices_data).execute()
+            await execute(client.table("choices").insert(choices_data))
 
         # Update story total_scenes
-        client.rpc("increment_story_scene_count", {"story_id": str(story_id)}).execute()
+        await execute(
+            client.rpc("increment_story_scene_count", {"story_id": str(story_id)})
+        )
+        get_story_graph_cache().invalidate(str(story_id))
+        get_response_cache().invalidate("story", str(story_id))
+
+        # Image generation runs in the job queue; the client polls GET /api/jobs/{id}
+        if scores["should_generate_image"] or scene.generate_image:
+            # prompt: use first 200 chars of content as prompt
+            job = await get_job_queue().enqueue(
+                "scene_image",
+                payload={"prompt": scene.content[:200]},
+                scene_id=scene_id,
+            )
+            created_scene["image_job"] = {"id": job["id"], "status": job["status"]}
 
         return ApiResponse.ok(data=created_scene)
     except Exception as e:
@@ -102,63 +142,117 @@ async def create_scene(story_id: UUID, scene: SceneCreate):
 
 
 @router.get("/{scene_id}", response_model=ApiResponse)
-async def get_scene(story_id: UUID, scene_id: UUID):
-    """Get a specific scene with its choices."""
+async def get_scene(
+    story_id: UUID,
+    scene_id: UUID,
+    request: Request,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    client: Client = Depends(get_supabase),
+):
+    """Get a specific scene with its choices (cached, conditional GET)."""
     try:
-        client = get_supabase_client()
-
-        # Get scene
-        scene_response = (
-            client.table("scenes")
-            .select("*")
-            .eq("id", str(scene_id))
-            .single()
-            .execute()
+        projection = project(SCENE, fields, exclude)
+
+        async def load() -> dict:
+            # Get scene
+            scene_response = await execute(
+                client.table("scenes")
+                .select(projection.select())
+                .eq("id", str(scene_id))
+                .single()
+            )
+
+            if not scene_response.data:
+                raise HTTPException(status_code=404, detail="Scene not found")
+
+            scene = scene_response.data
+            if not projection.includes("choices"):
+                return scene
+
+            # Get choices
+            choices_response = await execute(
+                client.table("choices")
+                .select("*")
+                .eq("scene_id", str(scene_id))
+                .order("sequence")
+            )
+            scene["choices"] = choices_response.data if choices_response.data else []
+            return scene
+
+        response, scene = await cached_resource(
+            request,
+            "scene",
+            str(scene_id),
+            load,
+            # Story-wide writes (rescore, delete) drop all of its scenes
+            tags=lambda scene: [("story_scenes", str(scene["story_id"]))],
+            variant=projection.variant,
         )
 
-        if not scene_response.data:
-            raise HTTPException(status_code=404, detail="Scene not found")
+        # Draft the continuations while the reader is still reading (opt-in)
+        if scene.get("choices") and "content" in scene:
+            get_scene_generator().prefetch(str(story_id), scene, scene["choices"])
 
-        scene = scene_response.data
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch scene: {str(e)}")
 
-        # Get choices
-        choices_response = (
-            client.table("choices")
-            .select("*")
+
+@router.get("/{scene_id}/images", response_model=ApiResponse)
+async def list_scene_images(
+    story_id: UUID, scene_id: UUID, client: Client = Depends(get_supabase)
+):
+    """List generated images of a scene with their rendition manifests (srcset)."""
+    try:
+        response = await execute(
+            client.table("generated_images")
+            .select("id, image_url, model_used, generation_params, created_at")
             .eq("scene_id", str(scene_id))
-            .order("sequence")
-            .execute()
+            .order("created_at", desc=True)
         )
-        scene["choices"] = choices_response.data if choices_response.data else []
 
-        return ApiResponse.ok(data=scene)
-    except HTTPException:
-        raise
+        images = []
+        for image in response.data or []:
+            manifest = image.pop("generation_params", None) or {}
+            images.append({**image, "manifest": manifest})
+        return ApiResponse.ok(data={"images": images})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch scene: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Failed to fetch scene images: {str(e)}"
+        )
 
 
 @router.patch("/{scene_id}", response_model=ApiResponse)
-async def update_scene(story_id: UUID, scene_id: UUID, scene_update: dict):
+async def update_scene(
+    story_id: UUID,
+    scene_id: UUID,
+    scene_update: dict,
+    client: Client = Depends(get_supabase),
+):
     """Update a scene."""
     try:
-        client = get_supabase_client()
-
-        # Recalculate scores if content updated
+        # Recalculate scores if content updated (only the score columns exist)
         if "content" in scene_update:
-            scores = calculate_scene_scores(scene_update["content"])
-            scene_update.update(scores)
-
-        response = (
-            client.table("scenes")
-            .update(scene_update)
-            .eq("id", str(scene_id))
-            .execute()
+            scores = calculate_scene_scores(
+                scene_update["content"], await _story_genre(client, story_id)
+            )
+            scene_update["emotion_score"] = scores["emotion_score"]
+            scene_update["importance_score"] = scores["importance_score"]
+
+        response = await execute(
+            client.table("scenes").update(scene_update).eq("id", str(scene_id))
         )
 
         if not response.data:
             raise HTTPException(status_code=404, detail="Scene not found")
 
+        get_scene_generator().invalidate_story(str(story_id))
+        get_story_graph_cache().invalidate(str(story_id))
+        get_response_cache().invalidate("scene", str(scene_id))
+
         return ApiResponse.ok(data=response.data[0])
     except HTTPException:
         raise
@@ -167,18 +261,32 @@ async def update_scene(story_id: UUID, scene_id: UUID, scene_update: dict):
 
 
 @router.delete("/{scene_id}", response_model=ApiResponse)
-async def delete_scene(story_id: UUID, scene_id: UUID):
+async def delete_scene(
+    story_id: UUID, scene_id: UUID, client: Client = Depends(get_supabase)
+):
     """Delete a scene."""
     try:
-        client = get_supabase_client()
-
-        response = client.table("scenes").delete().eq("id", str(scene_id)).execute()
+        response = await execute(
+            client.table("scenes").delete().eq("id", str(scene_id))
+        )
 
         if not response.data:
             raise HTTPException(status_code=404, detail="Scene not found")
 
+        # Its sequence may be reused: readers' progress bit for it goes too
+        get_progress_buffer().forget_sequence(
+            str(story_id), response.data[0]["sequence"]
+        )
+
         # Update story total_scenes
-        client.rpc("decrement_story_scene_count", {"story_id": str(story_id)}).execute()
+        await execute(
+            client.rpc("decrement_story_scene_count", {"story_id": str(story_id)})
+        )
+        get_scene_generator().invalidate_story(str(story_id))
+        get_story_graph_cache().invalidate(str(story_id))
+        get_response_cache().invalidate("story", str(story_id))
+        # The scene itself, and choices elsewhere that pointed at it
+        get_response_cache().invalidate("story_scenes", str(story_id))
 
         return ApiResponse.ok(data={"deleted": True, "scene_id": str(scene_id)})
     except HTTPException:
@@ -188,57 +296,384 @@ async def delete_scene(story_id: UUID, scene_id: UUID):
 
 
 @router.post("/{scene_id}/choices", response_model=ApiResponse)
-async def add_choice(story_id: UUID, scene_id: UUID, choice: ChoiceCreate):
+async def add_choice(
+    story_id: UUID,
+    scene_id: UUID,
+    choice: ChoiceCreate,
+    client: Client = Depends(get_supabase),
+):
     """Add a choice to a scene."""
     try:
-        client = get_supabase_client()
-
         choice_data = choice.model_dump()
         choice_data["scene_id"] = str(scene_id)
 
-        response = client.table("choices").insert(choice_data).execute()
+        response = await execute(client.table("choices").insert(choice_data))
+        get_story_graph_cache().invalidate(str(story_id))
+        get_response_cache().invalidate("scene", str(scene_id))
 
         return ApiResponse.ok(data=response.data[0])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add choice: {str(e)}")
 
 
-def calculate_scene_scores(content: str) -> dict:
+@router.post("/{scene_id}/choices/{choice_id}/select", response_model=ApiResponse)
+async def select_choice(
+    story_id: UUID,
+    scene_id: UUID,
+    choice_id: UUID,
+    client: Client = Depends(get_supabase),
+):
+    """
+    Follow a choice to its next scene, writing that scene if it doesn't exist
+    yet. A speculative draft for the choice is used when one is available.
+    """
+    try:
+        choice_response = await execute(
+            client.table("choices")
+            .select("*")
+            .eq("id", str(choice_id))
+            .eq("scene_id", str(scene_id))
+            .single()
+        )
+        if not choice_response.data:
+            raise HTTPException(status_code=404, detail="Choice not found")
+        choice = choice_response.data
+
+        # Already written: just follow the link
+        if choice.get("next_scene_id"):
+            next_response = await execute(
+                client.table("scenes")
+                .select("*")
+                .eq("id", choice["next_scene_id"])
+                .single()
+            )
+            return ApiResponse.ok(
+                data={"scene": next_response.data, "source": "existing"}
+            )
+
+        scene_response = await execute(
+            client.table("scenes").select("*").eq("id", str(scene_id)).single()
+        )
+        scene = scene_response.data
+
+        generator = get_scene_generator()
+        draft = await generator.take(str(choice_id))
+        source = "speculative"
+        if draft is None:
+            story_response = await execute(
+                client.table("stories")
+                .select("title, genre, description")
+                .eq("id", str(story_id))
+                .single()
+            )
+            draft = await generator.generate_next(story_response.data, scene, choice)
+            source = "generated"
+
+        scores = calculate_scene_scores(
+            draft["content"], await _story_genre(client, story_id)
+        )
+        next_scene = await _append_scene(
+            client,
+            story_id,
+            {
+                "story_id": str(story_id),
+                "chapter_id": scene.get("chapter_id"),
+                "content": draft["content"],
+                "scene_type": "narrative",
+                "emotion_score": scores["emotion_score"],
+                "importance_score": scores["importance_score"],
+                "has_generated_image": False,
+                "has_generated_bgm": scores["should_generate_bgm"],
+            },
+        )
+
+        # Only link if nobody else did while we were writing
+        link_response = await execute(
+            client.table("choices")
+            .update({"next_scene_id": next_scene["id"]})
+            .eq("id", str(choice_id))
+            .is_("next_scene_id", "null")
+        )
+        if not link_response.data:
+            # A concurrent select won: drop our scene and follow theirs
+            await execute(client.table("scenes").delete().eq("id", next_scene["id"]))
+            choice_response = await execute(
+                client.table("choices")
+                .select("next_scene_id")
+                .eq("id", str(choice_id))
+                .single()
+            )
+            next_response = await execute(
+                client.table("scenes")
+                .select("*")
+                .eq("id", choice_response.data["next_scene_id"])
+                .single()
+            )
+            return ApiResponse.ok(
+                data={"scene": next_response.data, "source": "existing"}
+            )
+
+        await execute(
+            client.rpc("increment_story_scene_count", {"story_id": str(story_id)})
+        )
+        get_story_graph_cache().invalidate(str(story_id))
+        get_response_cache().invalidate("scene", str(scene_id))
+        get_response_cache().invalidate("story", str(story_id))
+
+        return ApiResponse.ok(data={"scene": next_scene, "source": source})
+    except HTTPException:
+        raise
+    except SchedulerOverloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to select choice: {str(e)}"
+        )
+
+
+@router.post(":bulk", response_model=ApiResponse)
+async def bulk_create_scenes(
+    story_id: UUID,
+    payload: BulkSceneImport,
+    stream: bool = False,
+    client: Client = Depends(get_supabase),
+):
+    """
+    Import many scenes with their choices in one transaction (one RPC call).
+    Choices link to scenes of the same upload through `next_scene_key`.
+    Everything is validated before anything is written. With `stream=true`
+    progress and per-item results are streamed as NDJSON.
+    Media generation is not triggered for imported scenes.
+    """
+    try:
+        taken = await _taken_sequences(
+            client, story_id, [scene.sequence for scene in payload.scenes]
+        )
+        genre = await _story_genre(client, story_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to import scenes: {str(e)}"
+        )
+
+    errors = _validate_bulk(payload.scenes, taken)
+    if errors:
+        raise HTTPException(status_code=422, detail={"errors": errors})
+
+    events = _run_bulk_import(client, story_id, payload.scenes, genre)
+    if stream:
+        return StreamingResponse(
+            (json.dumps(event, ensure_ascii=False) + "\n" async for event in events),
+            media_type="application/x-ndjson",
+        )
+
+    results = []
+    async for event in events:
+        if event["event"] == "result":
+            results.append({k: event[k] for k in ("index", "key", "scene_id")})
+        elif event["event"] == "error":
+            raise HTTPException(
+                status_code=500, detail=f"Failed to import scenes: {event['detail']}"
+            )
+
+    return ApiResponse.ok(data={"inserted": len(results), "results": results})
+
+
+@router.post(":rescore", response_model=ApiResponse)
+async def rescore_scenes(
+    story_id: UUID, reload_lexicon: bool = False, client: Client = Depends(get_supabase)
+):
+    """
+    Recompute emotion/importance scores for every scene of a story (e.g. after
+    tuning the lexicon) and write them with one batched update.
+    """
+    try:
+        engine = get_scoring_engine(reload=reload_lexicon)
+        genre = await _story_genre(client, story_id)
+
+        # Page through the story's scenes; only id + content are needed
+        scenes = []
+        page_size = 1000
+        while True:
+            response = await execute(
+                client.table("scenes")
+                .select("id, content, emotion_score, importance_score")
+                .eq("story_id", str(story_id))
+                .order("sequence")
+                .range(len(scenes), len(scenes) + page_size - 1)
+            )
+            scenes.extend(response.data or [])
+            if len(response.data or []) < page_size:
+                break
+
+        previous = {scene["id"]: scene for scene in scenes}
+        # CPU-bound over the whole story: keep it off the event loop
+        scored_scenes = await asyncio.to_thread(engine.score_batch, scenes, genre)
+        updates = [
+            {
+                "id": scored["id"],
+                "emotion_score": scored["emotion_score"],
+                "importance_score": scored["importance_score"],
+            }
+            for scored in scored_scenes
+            if scored["emotion_score"] != previous[scored["id"]]["emotion_score"]
+            or scored["importance_score"] != previous[scored["id"]]["importance_score"]
+        ]
+
+        if updates:
+            await execute(client.rpc("update_scene_scores", {"updates": updates}))
+            get_scene_generator().invalidate_story(str(story_id))
+            get_story_graph_cache().invalidate(str(story_id))
+            get_response_cache().invalidate("story_scenes", str(story_id))
+
+        return ApiResponse.ok(
+            data={"scanned": len(scenes), "updated": len(updates), "genre": genre}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to rescore scenes: {str(e)}"
+        )
+
+
+def calculate_scene_scores(content: str, genre: Optional[str] = None) -> dict:
     """Calculate emotion and importance scores for scene content."""
-    emotion_keywords = [
-        "death",
-        "love",
-        "betrayal",
-        "victory",
-        "tragedy",
-        "슬픔",
-        "기쁨",
-        "분노",
-        "사랑",
-        "죽음",
-    ]
-    importance_keywords = [
-        "choice",
-        "decision",
-        "discovery",
-        "revelation",
-        "선택",
-        "결정",
-        "발견",
-        "전환점",
-    ]
-
-    content_lower = content.lower()
-
-    emotion_count = sum(1 for kw in emotion_keywords if kw in content_lower)
-    importance_count = sum(1 for kw in importance_keywords if kw in content_lower)
-
-    emotion_score = min(emotion_count / 3, 1.0)  # Normalize to 0-1
-    importance_score = min(importance_count / 2, 1.0)
-
-    return {
-        "emotion_score": emotion_score,
-        "importance_score": importance_score,
-        "should_generate_image": emotion_score > 0.5 or importance_score > 0.6,
-        "should_generate_bgm": emotion_score > 0.3,
-    }
+    return get_scoring_engine().score(content, genre)
+
+
+def _validate_bulk(scenes: List[BulkSceneCreate], used_sequences: set) -> List[dict]:
+    """Per-item validation errors for a bulk import (empty when it can be written)."""
+    errors = []
+    keys = {scene.key for scene in scenes}
+    seen_keys, seen_sequences = set(), set()
+
+    for index, scene in enumerate(scenes):
+
+        def fail(message: str):
+            errors.append({"index": index, "key": scene.key, "error": message})
+
+        if scene.key in seen_keys:
+            fail("duplicate key")
+        seen_keys.add(scene.key)
+
+        if scene.sequence in used_sequences:
+            fail(f"sequence {scene.sequence} already exists in this story")
+        elif scene.sequence in seen_sequences:
+            fail(f"duplicate sequence {scene.sequence}")
+        seen_sequences.add(scene.sequence)
+
+        choice_sequences = set()
+        for choice in scene.choices or []:
+            if choice.sequence in choice_sequences:
+                fail(f"duplicate choice sequence {choice.sequence}")
+            choice_sequences.add(choice.sequence)
+
+            if choice.next_scene_key and choice.next_scene_id:
+                fail("choice has both next_scene_key and next_scene_id")
+            elif choice.next_scene_key and choice.next_scene_key not in keys:
+                fail(f"unknown next_scene_key '{choice.next_scene_key}'")
+
+    return errors
+
+
+async def _run_bulk_import(
+    client, story_id: UUID, scenes: List[BulkSceneCreate], genre: Optional[str]
+) -> AsyncIterator[dict]:
+    """Score, insert (one RPC) and report progress/results as events."""
+    try:
+        engine = get_scoring_engine()
+        rows = [scene.model_dump(mode="json", exclude_none=True) for scene in scenes]
+        chunk_size = 200
+        for start in range(0, len(rows), chunk_size):
+            chunk = [
+                {"id": index, "content": row["content"]}
+                for index, row in enumerate(rows[start : start + chunk_size], start)
+            ]
+            # CPU bound: keep the event loop free for other requests
+            for scored in await asyncio.to_thread(engine.score_batch, chunk, genre):
+                row = rows[scored["id"]]
+                row["emotion_score"] = scored["emotion_score"]
+                row["importance_score"] = scored["importance_score"]
+                row["has_generated_bgm"] = scored["should_generate_bgm"]
+            yield {
+                "event": "scored",
+                "done": min(start + chunk_size, len(rows)),
+                "total": len(rows),
+            }
+
+        yield {"event": "inserting", "total": len(rows)}
+        response = await execute(
+            client.rpc(
+                "bulk_insert_scenes", {"p_story_id": str(story_id), "p_scenes": rows}
+            )
+        )
+        scene_ids = {row["client_key"]: row["new_scene_id"] for row in response.data}
+        get_scene_generator().invalidate_story(str(story_id))
+        get_story_graph_cache().invalidate(str(story_id))
+        get_response_cache().invalidate("story", str(story_id))
+    except Exception as e:
+        yield {"event": "error", "detail": str(e)}
+        return
+
+    for index, scene in enumerate(scenes):
+        yield {
+            "event": "result",
+            "index": index,
+            "key": scene.key,
+            "scene_id": scene_ids.get(scene.key),
+        }
+    yield {"event": "done", "inserted": len(scene_ids)}
+
+
+async def _append_scene(client, story_id: UUID, row: dict) -> dict:
+    """
+    Insert a scene after the story's last one. (story_id, sequence) is unique,
+    so a concurrent append that took the same number makes the insert fail;
+    re-read the last sequence and try again.
+    """
+    attempts = 0
+    while True:
+        last_response = await execute(
+            client.table("scenes")
+            .select("sequence")
+            .eq("story_id", str(story_id))
+            .order("sequence", desc=True)
+            .limit(1)
+        )
+        last = last_response.data[0]["sequence"] if last_response.data else 0
+        try:
+            response = await execute(
+                client.table("scenes").insert({**row, "sequence": last + 1})
+            )
+            return response.data[0]
+        except APIError as e:
+            attempts += 1
+            if e.code != UNIQUE_VIOLATION or attempts >= APPEND_ATTEMPTS:
+                raise
+
+
+async def _taken_sequences(client, story_id: UUID, sequences: List[int]) -> Set[int]:
+    """Which of `sequences` the story already uses (only those are read)."""
+    unique = sorted(set(sequences))
+    # Chunked so the in.(...) filter keeps the URL short
+    responses = await asyncio.gather(
+        *(
+            execute(
+                client.table("scenes")
+                .select("sequence")
+                .eq("story_id", str(story_id))
+                .in_("sequence", unique[i : i + SEQUENCE_LOOKUP_CHUNK])
+            )
+            for i in range(0, len(unique), SEQUENCE_LOOKUP_CHUNK)
+        )
+    )
+    return {row["sequence"] for response in responses for row in response.data or []}
+
+
+async def _story_genre(client, story_id: UUID) -> Optional[str]:
+    response = await execute(
+        client.table("stories").select("genre").eq("id", str(story_id)).limit(1)
+    )
+    return response.data[0]["genre"] if response.data else None
@@ -1,8 +1,21 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import List, Literal, Optional
 from uuid import UUID
 
-from app.services.supabase_client import get_supabase_client
+from supabase import Client
+
+from app.api.deps import get_supabase
+from app.services.supabase_client import execute
+from app.api.caching import cached_resource
+from app.api.pagination import CREATED_AT_KEYS, fetch_page
+from app.api.projection import CHARACTER, STORY, Projection, project
+from app.api.responses import ok_response
+from app.services.vector_index import get_story_vector_index
+from app.services.scene_generator import get_scene_generator
+from app.services.entity_matcher import get_story_entity_matcher
+from app.services.story_graph import get_story_graph_cache
+from app.services.response_cache import get_response_cache
+from app.services.progress_buffer import get_progress_buffer
 from app.schemas.models import (
     Story,
     StoryCreate,
@@ -20,37 +33,44 @@ async def list_stories(
     genre: Optional[str] = None,
     status: Optional[str] = None,
     limit: int = Query(default=10, ge=1, le=100),
-    offset: int = Query(default=0, ge=0),
+    cursor: Optional[str] = None,
+    count: Optional[Literal["exact", "planned"]] = None,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    client: Client = Depends(get_supabase),
 ):
-    """List all stories with optional filtering."""
+    """List all stories with optional filtering, newest first (cursor paginated)."""
     try:
-        client = get_supabase_client()
-        query = client.table("stories").select("*")
+        projection = project(STORY, fields, exclude, list_view=True)
+        query = client.table("stories").select(projection.select(), count=count)
 
         if genre:
             query = query.eq("genre", genre)
         if status:
             query = query.eq("status", status)
 
-        response = query.range(offset, offset + limit - 1).execute()
+        stories, meta = await fetch_page(query, CREATED_AT_KEYS, limit, cursor)
 
-        return ApiResponse.ok(
-            data=response.data,
-            meta={"total": len(response.data), "limit": limit, "offset": offset},
-        )
+        return ok_response(stories, meta)
+    except HTTPException:
+        raise
     except Exception as e:
         return ApiResponse.fail(str(e))
 
 
+@router.get("/speculation", response_model=ApiResponse)
+async def speculation_stats():
+    """Speculative next-scene generation: hit rate, wasted tokens, latency saved."""
+    return ApiResponse.ok(data=get_scene_generator().stats())
+
+
 @router.post("", response_model=ApiResponse)
-async def create_story(story: StoryCreate):
+async def create_story(story: StoryCreate, client: Client = Depends(get_supabase)):
     """Create a new story."""
     try:
-        client = get_supabase_client()
-
         # Insert story
         story_data = story.model_dump(exclude={"character_ids"})
-        story_response = client.table("stories").insert(story_data).execute()
+        story_response = await execute(client.table("stories").insert(story_data))
 
         if not story_response.data:
             raise HTTPException(status_code=500, detail="Failed to create story")
@@ -64,70 +84,127 @@ async def create_story(story: StoryCreate):
                 {"story_id": story_id, "character_id": char_id}
                 for char_id in story.character_ids
             ]
-            client.table("story_characters").insert(character_links).execute()
+            await execute(client.table("story_characters").insert(character_links))
 
         return ApiResponse.ok(data=created_story)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create story: {str(e)}")
 
 
+@router.get("/response-cache", response_model=ApiResponse)
+async def response_cache_stats():
+    """Story/scene/character response cache: size and hit ratios per resource."""
+    return ApiResponse.ok(data=get_response_cache().stats())
+
+
+@router.get("/progress-buffer", response_model=ApiResponse)
+async def progress_buffer_stats():
+    """Reader progress write-behind: pending keys, coalesced updates, flush lag."""
+    return ApiResponse.ok(data=get_progress_buffer().stats())
+
+
 @router.get("/{story_id}", response_model=ApiResponse)
-async def get_story(story_id: UUID):
-    """Get a specific story with its characters."""
+async def get_story(
+    story_id: UUID,
+    request: Request,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    client: Client = Depends(get_supabase),
+):
+    """Get a specific story with its characters (cached, conditional GET)."""
     try:
-        client = get_supabase_client()
-
-        # Get story
-        story_response = (
-            client.table("stories")
-            .select("*")
-            .eq("id", str(story_id))
-            .single()
-            .execute()
+        projection = project(STORY, fields, exclude)
+        response, _ = await cached_resource(
+            request,
+            "story",
+            str(story_id),
+            lambda: _load_story(client, story_id, projection),
+            # Character edits change the embedded cards
+            tags=lambda story: [
+                ("character", str(character["id"]))
+                for character in story.get("characters", [])
+            ],
+            variant=projection.variant,
         )
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch story: {str(e)}")
 
-        if not story_response.data:
-            raise HTTPException(status_code=404, detail="Story not found")
 
-        story = story_response.data
+async def _load_story(client: Client, story_id: UUID, projection: Projection) -> dict:
+    # Get story
+    story_response = await execute(
+        client.table("stories")
+        .select(projection.select())
+        .eq("id", str(story_id))
+        .single()
+    )
 
-        # Get linked characters
-        characters_response = (
-            client.table("story_characters")
-            .select("character_id, role_in_story, characters(*)")
-            .eq("story_id", str(story_id))
-            .execute()
-        )
+    if not story_response.data:
+        raise HTTPException(status_code=404, detail="Story not found")
+
+    story = story_response.data
+    if not projection.includes("characters"):
+        return story
 
-        story["characters"] = (
-            [item["characters"] for item in characters_response.data]
-            if characters_response.data
-            else []
+    # Get linked characters (their default projection: no embedding)
+    characters_response = await execute(
+        client.table("story_characters")
+        .select(
+            f"character_id, role_in_story, characters({project(CHARACTER).select()})"
         )
+        .eq("story_id", str(story_id))
+    )
 
-        return ApiResponse.ok(data=story)
+    story["characters"] = (
+        [item["characters"] for item in characters_response.data]
+        if characters_response.data
+        else []
+    )
+
+    return story
+
+
+@router.get("/{story_id}/graph", response_model=ApiResponse)
+async def get_story_graph(story_id: UUID):
+    """
+    The story's branching structure without scene text: columnar nodes (id,
+    sequence, type, scores), edges as node indices, and precomputed
+    reachability / dead-end / orphan analysis.
+    """
+    try:
+        graph = await get_story_graph_cache().get(str(story_id))
+
+        if graph is None:
+            raise HTTPException(status_code=404, detail="Story not found")
+
+        return ApiResponse.ok(data=graph)
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch story: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Failed to build story graph: {str(e)}"
+        )
 
 
 @router.patch("/{story_id}", response_model=ApiResponse)
-async def update_story(story_id: UUID, story_update: dict):
+async def update_story(
+    story_id: UUID, story_update: dict, client: Client = Depends(get_supabase)
+):
     """Update a story (partial update)."""
     try:
-        client = get_supabase_client()
-
-        response = (
-            client.table("stories")
-            .update(story_update)
-            .eq("id", str(story_id))
-            .execute()
+        response = await execute(
+            client.table("stories").update(story_update).eq("id", str(story_id))
         )
 
         if not response.data:
             raise HTTPException(status_code=404, detail="Story not found")
 
+        get_scene_generator().invalidate_story(str(story_id))
+        get_response_cache().invalidate("story", str(story_id))
+
         return ApiResponse.ok(data=response.data[0])
     except HTTPException:
         raise
@@ -136,16 +213,25 @@ async def update_story(story_id: UUID, story_update: dict):
 
 
 @router.delete("/{story_id}", response_model=ApiResponse)
-async def delete_story(story_id: UUID):
+async def delete_story(story_id: UUID, client: Client = Depends(get_supabase)):
     """Delete a story and all related data."""
     try:
-        client = get_supabase_client()
-
-        response = client.table("stories").delete().eq("id", str(story_id)).execute()
+        response = await execute(
+            client.table("stories").delete().eq("id", str(story_id))
+        )
 
         if not response.data:
             raise HTTPException(status_code=404, detail="Story not found")
 
+        story_index = get_story_vector_index()
+        if story_index is not None:
+            story_index.invalidate(str(story_id))
+        get_scene_generator().invalidate_story(str(story_id))
+        get_story_entity_matcher().invalidate(str(story_id))
+        get_story_graph_cache().invalidate(str(story_id))
+        get_response_cache().invalidate("story", str(story_id))
+        get_response_cache().invalidate("story_scenes", str(story_id))
+
         return ApiResponse.ok(data={"deleted": True, "story_id": str(story_id)})
     except HTTPException:
         raise
@@ -154,18 +240,24 @@ async def delete_story(story_id: UUID):
 
 
 @router.post("/{story_id}/characters", response_model=ApiResponse)
-async def add_character_to_story(story_id: UUID, link: StoryCharacterLink):
+async def add_character_to_story(
+    story_id: UUID, link: StoryCharacterLink, client: Client = Depends(get_supabase)
+):
     """Add a character to a story."""
     try:
-        client = get_supabase_client()
-
         link_data = {
             "story_id": str(story_id),
             "character_id": str(link.character_id),
             "role_in_story": link.role_in_story,
         }
 
-        response = client.table("story_characters").insert(link_data).execute()
+        response = await execute(client.table("story_characters").insert(link_data))
+
+        story_index = get_story_vector_index()
+        if story_index is not None:
+            story_index.invalidate(str(story_id), reload=True)
+        get_story_entity_matcher().invalidate(str(story_id))
+        get_response_cache().invalidate("story", str(story_id))
 
         return ApiResponse.ok(data=response.data[0])
     except Exception as e:
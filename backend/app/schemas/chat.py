@@ -1,4 +1,14 @@
 from pydantic import BaseModel
+from typing import List, Literal, Optional
+from uuid import UUID
+
+class ChatMessage(BaseModel):
+    role: Literal["user", "assistant"]
+    content: str
 
 class ChatRequest(BaseModel):
     message: str
+    story_id: Optional[UUID] = None  # RAG를 해당 스토리의 캐릭터로 한정
+    session_id: Optional[str] = None  # 서버 세션 (대화 기록 + 누적 요약)
+    user_id: Optional[UUID] = None  # 새 세션을 이 사용자에게 귀속
+    history: List[ChatMessage] = []  # session_id 없이 호출할 때만 사용하는 지난 대화
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Union
 from datetime import datetime
 from uuid import UUID
 
@@ -32,6 +32,8 @@ class User(UserBase):
 class CharacterBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
     description: str = Field(..., min_length=1, max_length=2000)
+    aliases: Optional[List[str]] = None  # Nicknames/titles readers use in chat
+    key_terms: Optional[List[str]] = None  # Items/places tied to the character
     personality_traits: Optional[List[str]] = None
     background_story: Optional[str] = Field(None, max_length=5000)
     appearance_description: Optional[str] = Field(None, max_length=1000)
@@ -176,6 +178,22 @@ class SceneWithChoices(Scene):
     choices: List[Choice] = []
 
 
+class BulkChoiceCreate(ChoiceCreate):
+    # Link to a scene in the same upload (by its key) or to an existing scene
+    next_scene_key: Optional[str] = None
+    next_scene_id: Optional[UUID] = None
+
+
+class BulkSceneCreate(SceneBase):
+    key: str = Field(..., min_length=1, max_length=100)  # Client-side id
+    chapter_id: Optional[UUID] = None
+    choices: Optional[List[BulkChoiceCreate]] = None
+
+
+class BulkSceneImport(BaseModel):
+    scenes: List[BulkSceneCreate] = Field(..., min_length=1, max_length=5000)
+
+
 class SceneScore(BaseModel):
     emotion_score: float = Field(..., ge=0, le=1)
     importance_score: float = Field(..., ge=0, le=1)
@@ -237,6 +255,15 @@ class UserProgress(UserProgressBase):
         from_attributes = True
 
 
+class ProgressEvent(BaseModel):
+    """A reader reached a scene (and possibly picked one of its choices)."""
+
+    user_id: UUID
+    scene_id: UUID
+    choice_id: Optional[UUID] = None
+    is_completed: bool = False
+
+
 # ============================================
 # STORY GENERATION MODELS
 # ============================================
@@ -265,7 +292,8 @@ T = type("T", (), {})
 
 class ApiResponse(BaseModel):
     success: bool
-    data: Optional[dict] = None
+    # Lists come from the list endpoints
+    data: Optional[Union[dict, list]] = None
     error: Optional[str] = None
     meta: Optional[dict] = None
 
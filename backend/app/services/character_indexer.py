@@ -0,0 +1,295 @@
+"""Background embedding indexer for characters.
+
+Usage (backfill existing rows):
+    python -m app.services.character_indexer backfill [--force]
+"""
+
+import asyncio
+import hashlib
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.services.embedding_backend import get_embedding_backend
+from app.services.response_cache import get_response_cache
+from app.services.supabase_client import get_supabase_client, execute
+from app.services.vector_index import get_story_vector_index
+
+# Columns the embedding text is built from
+INDEXED_COLUMNS = (
+    "name",
+    "description",
+    "personality_traits",
+    "appearance_description",
+    "background_story",
+)
+
+# Character indexer instance
+character_indexer: Optional["CharacterIndexer"] = None
+
+
+def build_character_text(character: dict) -> str:
+    """Build the text that represents a character in vector space."""
+    parts = [f"{character['name']}: {character['description']}"]
+
+    if character.get("personality_traits"):
+        parts.append("성격: " + ", ".join(character["personality_traits"]))
+    if character.get("appearance_description"):
+        parts.append("외모: " + character["appearance_description"])
+    if character.get("background_story"):
+        parts.append("배경: " + character["background_story"])
+
+    return "\n".join(parts)
+
+
+def content_hash(model_id: str, text: str) -> str:
+    return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).hexdigest()
+
+
+class CharacterIndexer:
+    """
+    Embeds new and changed characters off the request path.
+
+    Routes call enqueue() with the row they just wrote; a single worker task
+    drains the queue in batches (one embedding call + one RPC per batch).
+    Rows whose content hash matches the stored `embedding_hash` are skipped,
+    so PATCHes that don't touch the indexed columns cost nothing.
+    A failed batch is requeued with exponential backoff; a row is dropped
+    (and left for the next backfill) after `max_attempts` failures.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 16,
+        flush_interval: float = 1.0,
+        max_attempts: int = 5,
+        retry_base_seconds: float = 2.0,
+        retry_max_seconds: float = 60.0,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.backend = get_embedding_backend()
+
+        # character_id -> (enqueued_at, row); repeated edits coalesce
+        self._pending: Dict[str, Tuple[float, dict]] = {}
+        # character_id -> failed attempts so far
+        self._attempts: Dict[str, int] = {}
+        self._retry_at = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.indexed = 0
+        self.skipped = 0
+        self.retried = 0
+        self.failed = 0
+        self.last_batch_seconds = 0.0
+        self.last_lag_seconds = 0.0
+
+    def enqueue(self, character: dict) -> bool:
+        """Schedule a character for (re-)embedding. Returns False if it is up to date."""
+        text = build_character_text(character)
+        digest = content_hash(self.backend.model_id, text)
+
+        if digest == character.get("embedding_hash"):
+            self.skipped += 1
+            return False
+
+        character_id = str(character["id"])
+        enqueued_at = self._pending.get(character_id, (time.time(), None))[0]
+        self._pending[character_id] = (enqueued_at, character)
+
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def discard(self, character_id: str) -> None:
+        self._pending.pop(str(character_id), None)
+        self._attempts.pop(str(character_id), None)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            # Fresh event per start: an Event is bound to the loop it first waited on
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the worker after draining what is already queued."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            timeout = max(self.flush_interval, self._retry_at - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            # While stopping, ignore the backoff; max_attempts still bounds it
+            while self._pending and (
+                self._stopping or time.monotonic() >= self._retry_at
+            ):
+                await self._flush_once()
+
+    async def _flush_once(self) -> None:
+        ids = list(self._pending)[: self.batch_size]
+        batch = [
+            (character_id, *self._pending.pop(character_id)) for character_id in ids
+        ]
+
+        try:
+            await self.index_batch([row for _, _, row in batch])
+        except Exception as e:
+            self._requeue(batch)
+            print(f"Character indexing failed: {e}")
+            return
+
+        for character_id in ids:
+            self._attempts.pop(character_id, None)
+        oldest = min(enqueued_at for _, enqueued_at, _ in batch)
+        self.last_lag_seconds = time.time() - oldest
+
+    def _requeue(self, batch: List[Tuple[str, float, dict]]) -> None:
+        """Put a failed batch back and push the next flush out with backoff."""
+        most_attempts = 0
+        for character_id, enqueued_at, row in batch:
+            if character_id in self._pending:
+                # Edited again meanwhile; the newer row is already queued
+                self._attempts.pop(character_id, None)
+                continue
+
+            attempts = self._attempts.get(character_id, 0) + 1
+            if attempts >= self.max_attempts:
+                # Stale hashes stay in the table, so the next backfill picks these up
+                self._attempts.pop(character_id, None)
+                self.failed += 1
+                continue
+
+            self._attempts[character_id] = attempts
+            self._pending[character_id] = (enqueued_at, row)
+            self.retried += 1
+            most_attempts = max(most_attempts, attempts)
+
+        if most_attempts:
+            delay = min(
+                self.retry_max_seconds,
+                self.retry_base_seconds * 2 ** (most_attempts - 1),
+            )
+            self._retry_at = time.monotonic() + delay
+
+    async def index_batch(self, characters: List[dict]) -> None:
+        """Embed a batch of characters and write vectors + hashes in one RPC."""
+        if not characters:
+            return
+
+        started = time.perf_counter()
+        texts = [build_character_text(c) for c in characters]
+        vectors = await self.backend.embed_batch(texts)
+
+        updates = [
+            {
+                "id": str(character["id"]),
+                "embedding": vector,
+                "embedding_hash": content_hash(self.backend.model_id, text),
+            }
+            for character, text, vector in zip(characters, texts, vectors)
+        ]
+
+        client = get_supabase_client()
+        await execute(client.rpc("update_character_embeddings", {"updates": updates}))
+
+        story_index = get_story_vector_index()
+        if story_index is not None:
+            for character, update in zip(characters, updates):
+                story_index.upsert_character({**character, "embedding": update["embedding"]})
+        # Cached character/story responses embed the row
+        for update in updates:
+            get_response_cache().invalidate("character", update["id"])
+
+        self.indexed += len(updates)
+        self.last_batch_seconds = time.perf_counter() - started
+
+    async def backfill(self, force: bool = False, page_size: int = 200) -> int:
+        """
+        Embed every existing character whose stored hash is missing or stale.
+        Pages through the table by id; returns the number of rows embedded.
+        """
+        client = get_supabase_client()
+        columns = ",".join(("id", "embedding_hash") + INDEXED_COLUMNS)
+        last_id = None
+        total = 0
+
+        while True:
+            query = client.table("characters").select(columns).order("id").limit(page_size)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            response = await execute(query)
+
+            rows = response.data or []
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+
+            stale = [
+                row
+                for row in rows
+                if force
+                or row.get("embedding_hash")
+                != content_hash(self.backend.model_id, build_character_text(row))
+            ]
+            for i in range(0, len(stale), self.batch_size):
+                await self.index_batch(stale[i : i + self.batch_size])
+            total += len(stale)
+
+        return total
+
+    def stats(self) -> dict:
+        now = time.time()
+        oldest = min((t for t, _ in self._pending.values()), default=None)
+        return {
+            "pending": len(self._pending),
+            "oldest_pending_seconds": now - oldest if oldest else 0.0,
+            "last_lag_seconds": self.last_lag_seconds,
+            "last_batch_seconds": self.last_batch_seconds,
+            "indexed": self.indexed,
+            "skipped": self.skipped,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+def get_character_indexer() -> CharacterIndexer:
+    """Get or create the character indexer."""
+    global character_indexer
+
+    if character_indexer is None:
+        character_indexer = CharacterIndexer()
+
+    return character_indexer
+
+
+async def _main(argv: List[str]) -> None:
+    if not argv or argv[0] != "backfill":
+        print(__doc__)
+        return
+
+    indexer = get_character_indexer()
+    total = await indexer.backfill(force="--force" in argv)
+    print(f"Backfill complete: {total} characters embedded")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    asyncio.run(_main(sys.argv[1:]))
@@ -1,24 +1,179 @@
-from groq import AsyncGroq
+import asyncio
 import os
-from typing import List, Dict
+import time
+from collections import Counter
+from typing import AsyncIterator, List, Dict, Optional
 from app.services.rag_service import RagService
-from app.services.memory_service import MemoryService
+from app.services.memory_service import MemoryService, count_message_tokens
+from app.services.session_store import ChatSession, get_session_store
+from app.services.entity_matcher import get_story_entity_matcher
+from app.services.text_matcher import AhoCorasick
+from app.services.llm_scheduler import get_llm_scheduler
+from app.services.metrics import observe_stage, stage
+
+# 벡터 검색을 태울 '열린 질문' 신호 (캐릭터 이름이 없을 때만 적용)
+OPEN_QUESTION_WORDS = (
+    "누구",
+    "무엇",
+    "뭐",
+    "어떤",
+    "어떻게",
+    "어디",
+    "언제",
+    "왜",
+    "who",
+    "what",
+    "which",
+    "where",
+    "when",
+    "why",
+    "how",
+)
+_open_question_matcher = AhoCorasick((word, word) for word in OPEN_QUESTION_WORDS)
+
 
 class ChatService:
     def __init__(self):
-        self.client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"))
+        # 모든 LLM 호출은 스케줄러 대기열(우선순위, 동시성 제한)을 거침
+        self.llm = get_llm_scheduler()
         self.rag_service = RagService()
-        self.memory_service = MemoryService(max_buffer_size=10)
+        self.entity_matcher = get_story_entity_matcher()
+        # RAG 결정 경로별 횟수 (entity / vector / skip), 튜닝용
+        self.rag_decisions = Counter()
+        self.session_store = get_session_store()
+        self.memory_service = MemoryService(
+            max_buffer_size=10,
+            history_token_budget=int(os.getenv("HISTORY_TOKEN_BUDGET", "1500")),
+            summary_model=os.getenv("SUMMARY_MODEL", "llama-3.1-8b-instant"),
+        )
+        self.model_id = "llama-3.3-70b-versatile"
+        # 입력 프롬프트(시스템 + RAG + 요약 + 대화 + 현재 메시지) 토큰 상한
+        self.prompt_token_ceiling = int(os.getenv("PROMPT_TOKEN_CEILING", "3000"))
 
-    async def generate_response(self, user_message: str, history: List[Dict[str, str]] = []) -> str:
+    async def generate_response(
+        self,
+        user_message: str,
+        history: List[Dict[str, str]] = [],
+        story_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ) -> str:
         """
         RAG와 Memory가 결합된 최종 응답 생성 로직
+        session_id가 있으면 대화 기록은 서버 세션 저장소에서 불러오고
+        (history 인자는 무시), 이번 턴을 세션에 이어 붙입니다.
+        """
+        session = await self._open_session(session_id, user_id, story_id)
+        with stage("chat.build_messages"):
+            current_messages = await self._build_messages(
+                user_message, history, story_id, session
+            )
+
+        # 4. LLM 호출 (Groq Llama 3.3), 같은 요청이 진행 중이면 그 응답을 공유
+        response = await self.llm.complete(
+            "chat",
+            model=self.model_id,
+            messages=current_messages,
+            temperature=0.8,
+            max_tokens=1000,
+        )
+
+        reply = response.choices[0].message.content
+        await self._record_turn(session, user_message, reply)
+        return reply
+
+    async def stream_response(
+        self,
+        user_message: str,
+        history: List[Dict[str, str]] = [],
+        story_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ) -> AsyncIterator[Dict]:
+        """
+        generate_response의 스트리밍 버전.
+        토큰 단위로 {"type": "token"} 이벤트를 내보내고, 마지막에 전체 텍스트와
+        usage를 담은 {"type": "done"} 이벤트를 내보냅니다.
+        소비자가 중간에 멈추면(클라이언트 연결 종료) upstream 스트림을 닫아 생성을 중단합니다.
+        세션에는 끝까지 생성된 응답만 기록됩니다.
+        """
+        session = await self._open_session(session_id, user_id, story_id)
+        with stage("chat.build_messages"):
+            current_messages = await self._build_messages(
+                user_message, history, story_id, session
+            )
+
+        parts: List[str] = []
+        finish_reason = None
+        # 대기열에서 기다린 시간까지 포함한 첫 토큰 시간 (사용자가 체감하는 값)
+        started = time.perf_counter()
+        # 블록을 벗어나면(정상 종료든 취소든) 스케줄러가 Groq 스트림을 닫아 생성도 멈춤
+        async with self.llm.stream(
+            "chat",
+            model=self.model_id,
+            messages=current_messages,
+            temperature=0.8,
+            max_tokens=1000,
+            # SDK 버전에 따라 stream_options 인자가 없어서 body로 전달
+            extra_body={"stream_options": {"include_usage": True}},
+        ) as stream:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+
+                choice = chunk.choices[0]
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+
+                token = choice.delta.content
+                if token:
+                    if not parts:
+                        observe_stage("chat.first_token", time.perf_counter() - started)
+                    parts.append(token)
+                    yield {"type": "token", "content": token}
+        # usage는 마지막 chunk에만 실려 옴 (include_usage 또는 x_groq.usage)
+        usage = stream.usage
+
+        await self._record_turn(session, user_message, "".join(parts))
+
+        yield {
+            "type": "done",
+            "content": "".join(parts),
+            "finish_reason": finish_reason,
+            "usage": {
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "total_tokens": usage.total_tokens,
+            }
+            if usage
+            else None,
+        }
+
+    async def _build_messages(
+        self,
+        user_message: str,
+        history: List[Dict[str, str]],
+        story_id: Optional[str] = None,
+        session: Optional[ChatSession] = None,
+    ) -> List[Dict[str, str]]:
+        """
+        RAG 검색 결과와 대화 기록으로 LLM에 보낼 메시지 목록을 구성합니다.
+        전체 입력은 prompt_token_ceiling을 넘지 않도록, 고정 부분(시스템 프롬프트,
+        현재 메시지)을 뺀 나머지 예산 안에서 요약 + 최근 대화를 채웁니다.
         """
-        # 1. RAG: 관련 기억 검색 (최적화: 키워드 감지 시에만 호출)
+        offset = 0
+        if session is not None:
+            history = session.history()
+            offset = session.offset
+            story_id = story_id or session.story_id
+
+        # 1. RAG: 관련 기억 검색 (캐릭터 이름 언급 → 카드 직접 조회, 열린 질문 → 벡터 검색)
         rag_context = ""
         try:
-            if self._should_trigger_rag(user_message):
-                rag_context = await self.rag_service.search_relevant_context(user_message)
+            with stage("chat.retrieve_context"):
+                rag_context = await self._retrieve_context(
+                    user_message, story_id, session.session_id if session else None
+                )
         except Exception as e:
             print(f"RAG Error: {e}") 
             # RAG 실패해도 대화는 진행
@@ -30,41 +185,112 @@ class ChatService:
             "문체는 소설처럼 서술적이고 묘사가 풍부해야 합니다.\n"
         )
         
+        system_prompt = base_system_prompt
         if rag_context:
-            base_system_prompt += f"\n[참고할 캐릭터/설정 정보]\n{rag_context}\n"
-            
+            system_prompt += f"\n[참고할 캐릭터/설정 정보]\n{rag_context}\n"
+
+        user_msg = {"role": "user", "content": user_message}
+        fixed_tokens = count_message_tokens(
+            [{"role": "system", "content": system_prompt}, user_msg]
+        )
+        if rag_context and fixed_tokens > self.prompt_token_ceiling:
+            # 상한을 넘으면 RAG 컨텍스트부터 포기
+            system_prompt = base_system_prompt
+            fixed_tokens = count_message_tokens(
+                [{"role": "system", "content": system_prompt}, user_msg]
+            )
+
         # 3. Message 구성 (Memory 적용)
         # 현재 요청에 시스템 프롬프트가 없다면 추가
-        current_messages = [{"role": "system", "content": base_system_prompt}]
-        
-        # 이전 기록 추가 (User가 보낸 history가 있다면)
-        if history:
-            current_messages.extend(self.memory_service.format_history(history))
-            
+        current_messages = [{"role": "system", "content": system_prompt}]
+
+        # 이전 기록 추가 (예산 안의 최근 대화 + 세션 요약)
+        if history or session is not None:
+            current_messages.extend(
+                await self.memory_service.build_context(
+                    history,
+                    token_budget=max(0, self.prompt_token_ceiling - fixed_tokens),
+                    session_id=session.session_id if session else None,
+                    offset=offset,
+                )
+            )
+
         # 현재 사용자 메시지 추가
-        current_messages.append({"role": "user", "content": user_message})
+        current_messages.append(user_msg)
 
-        # 4. LLM 호출 (Groq Llama 3.3)
-        response = await self.client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=current_messages,
-            temperature=0.8,
-            max_tokens=1000,
-        )
-        
-        return response.choices[0].message.content
+        return current_messages
 
-    def _should_trigger_rag(self, message: str) -> bool:
+    async def _open_session(
+        self,
+        session_id: Optional[str],
+        user_id: Optional[str],
+        story_id: Optional[str],
+    ) -> Optional[ChatSession]:
+        if not session_id:
+            return None
+        return await self.session_store.get_or_create(session_id, user_id, story_id)
+
+    async def _record_turn(
+        self, session: Optional[ChatSession], user_message: str, reply: str
+    ) -> None:
+        if session is None:
+            return
+        try:
+            await self.session_store.append(
+                session,
+                [
+                    {"role": "user", "content": user_message},
+                    {"role": "assistant", "content": reply},
+                ],
+            )
+        except Exception as e:
+            # 응답은 이미 생성됨: 기록 실패로 요청을 실패시키지 않음
+            print(f"Session append failed: {e}")
+
+    async def _retrieve_context(
+        self, user_message: str, story_id: Optional[str], session_id: Optional[str]
+    ) -> str:
         """
-        RAG 호출 여부를 결정합니다.
-        모든 대화에 RAG를 쓰면 느리고 비싸므로, '질문'이나 '명사'가 있을 때만 호출합니다.
+        RAG 호출 여부와 방식을 결정합니다.
+        1) 스토리 캐릭터의 이름/별칭이 언급되면 해당 캐릭터 카드를 id로 조회 (임베딩 없음)
+        2) 언급이 없고 열린 질문이면 벡터 검색
+        3) 그 외에는 RAG 생략
         """
-        # 1. 명백한 질문
-        if "?" in message or "누구" in message or "어떤" in message or "왜" in message:
-            return True
-        
-        # 2. 길이가 긴 문장 (복잡한 묘사나 지시일 가능성)
-        if len(message) > 20:
+        entities = []
+        if story_id:
+            try:
+                entities = await asyncio.wait_for(
+                    self.entity_matcher.match(story_id, user_message),
+                    self.rag_service.search_timeout,
+                )
+            except Exception as e:
+                print(f"Entity matcher failed: {e!r}")
+
+            if entities:
+                self.rag_decisions["entity"] += 1
+                print(
+                    f"RAG decision: entity story={story_id} "
+                    f"matched={[e['name'] for e in entities]}"
+                )
+                return await self.rag_service.character_context(
+                    entities, story_id=story_id, session_id=session_id
+                )
+
+        if self._looks_like_open_question(user_message):
+            self.rag_decisions["vector"] += 1
+            print(f"RAG decision: vector story={story_id}")
+            # 자체 deadline/circuit breaker가 있어 느린 RAG가 턴 전체를 붙잡지 않음
+            return await self.rag_service.search_relevant_context(
+                user_message, story_id=story_id, session_id=session_id
+            )
+
+        self.rag_decisions["skip"] += 1
+        print(f"RAG decision: skip story={story_id}")
+        return ""
+
+    def _looks_like_open_question(self, message: str) -> bool:
+        """특정 캐릭터를 지목하지 않은 '열린 질문'인지 (벡터 검색 대상)."""
+        if "?" in message or "？" in message:
             return True
-            
-        return False
+
+        return next(_open_question_matcher.iter_matches(message), None) is not None
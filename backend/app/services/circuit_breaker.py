@@ -0,0 +1,147 @@
+"""Circuit breaker and stage timing helpers for optional upstream calls."""
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Optional, TypeVar
+
+from app.services.metrics import get_metrics
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """The breaker is open; the call was skipped."""
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After `failure_threshold` consecutive failures
+    (errors or timeouts) it opens and rejects calls immediately for
+    `reset_timeout` seconds, then lets a single trial call through
+    (half-open): success closes it again, failure re-opens it.
+    """
+
+    def __init__(
+        self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+
+        # half-open: exactly one trial call at a time
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self._failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    async def call(
+        self,
+        awaitable: Awaitable[T],
+        timeout: Optional[float] = None,
+        timer: Optional["StageTimer"] = None,
+    ) -> T:
+        """Await `awaitable` under the breaker with a deadline; timeouts count as failures."""
+        if not self.allow():
+            self.rejected += 1
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            self.record_failure()
+            if timer is not None:
+                timer.record(time.monotonic() - started, outcome="timeout")
+            raise
+        except asyncio.CancelledError:
+            # Cancelled by an outer deadline: says nothing about upstream health
+            self._trial_in_flight = False
+            raise
+        except Exception:
+            self.record_failure()
+            if timer is not None:
+                timer.record(time.monotonic() - started, outcome="error")
+            raise
+
+        self.record_success()
+        if timer is not None:
+            timer.record(time.monotonic() - started)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+class StageTimer:
+    """
+    Latency samples (last `window` calls) and outcome counters for one stage.
+    A named timer also feeds the novelaine_stage_seconds histogram.
+    """
+
+    def __init__(self, window: int = 500, name: Optional[str] = None):
+        self._samples: deque = deque(maxlen=window)
+        self.counts = {"ok": 0, "timeout": 0, "error": 0}
+        self.name = name
+
+    def record(self, seconds: float, outcome: str = "ok") -> None:
+        self._samples.append(seconds * 1000)
+        self.counts[outcome] += 1
+        if self.name is not None:
+            get_metrics().stage_seconds.observe(
+                seconds, stage=self.name, outcome=outcome
+            )
+
+    def stats(self) -> dict:
+        samples = sorted(self._samples)
+        return {
+            **self.counts,
+            "p50_ms": _percentile(samples, 0.50),
+            "p95_ms": _percentile(samples, 0.95),
+            "p99_ms": _percentile(samples, 0.99),
+        }
+
+
+def _percentile(sorted_samples: list, q: float) -> Optional[float]:
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, int(q * len(sorted_samples)))
+    return round(sorted_samples[index], 2)
@@ -0,0 +1,149 @@
+"""Application-lifespan service container."""
+
+import asyncio
+import os
+from typing import Optional
+
+from app.services.character_indexer import get_character_indexer
+from app.services.chat_service import ChatService
+from app.services.embedding_backend import get_embedding_backend
+from app.services.image_service import get_image_service
+from app.services.job_queue import get_job_queue
+from app.services.llm_scheduler import get_llm_scheduler
+from app.services.memory_service import tokenizer_status
+from app.services.metrics import get_metrics, watch_event_loop
+from app.services.progress_buffer import get_progress_buffer
+from app.services.response_cache import get_response_cache
+from app.services.scene_generator import get_scene_generator
+from app.services.story_graph import get_story_graph_cache
+from app.services.supabase_client import (
+    check_connection,
+    close_supabase_client,
+    get_supabase_client,
+)
+from app.services.upstream_clients import (
+    close_upstream_clients,
+    get_groq_client,
+    get_hf_client,
+)
+from app.services.vector_index import get_story_vector_index
+
+
+class ServiceContainer:
+    """
+    Owns the long-lived services and the pooled upstream clients behind them
+    (one keep-alive pool each for Groq, HuggingFace and Supabase). Created in
+    the FastAPI lifespan and exposed to routes as `app.state.services`
+    (see app/api/deps.py).
+    """
+
+    def __init__(self):
+        self.groq = get_groq_client()
+        self.hf = get_hf_client()
+        self.supabase = get_supabase_client()
+        self.llm = get_llm_scheduler()
+        self.chat = ChatService()
+        self.images = get_image_service()
+        self.jobs = get_job_queue()
+        self.indexer = get_character_indexer()
+        self.scenes = get_scene_generator()
+        self.progress = get_progress_buffer()
+        self._loop_watcher: Optional[asyncio.Task] = None
+        self._register_metrics()
+
+    async def start(self) -> None:
+        tokenizer_error = tokenizer_status()
+        if tokenizer_error is not None:
+            print(
+                "Warning: tiktoken unavailable, token budgets use the "
+                f"character-count estimate ({tokenizer_error})"
+            )
+
+        if os.getenv("WARM_UP", "1") == "1":
+            await self.warm_up(timeout=float(os.getenv("WARM_UP_TIMEOUT", "15")))
+
+        self.indexer.start()
+        self.jobs.start()
+        self.progress.start()
+
+        lag_interval = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+        if lag_interval > 0:
+            self._loop_watcher = asyncio.create_task(watch_event_loop(lag_interval))
+
+    async def stop(self) -> None:
+        if self._loop_watcher is not None:
+            self._loop_watcher.cancel()
+        await self.jobs.stop()
+        # Writes out buffered reader progress
+        await self.progress.stop()
+        await self.scenes.stop()
+        await self.indexer.stop()
+        await self.chat.memory_service.flush()
+        await close_upstream_clients()
+        close_supabase_client()
+
+    async def warm_up(self, timeout: float = 15.0) -> None:
+        """
+        Open connections (DNS + TLS) to every upstream and run one dummy
+        embedding before the worker accepts traffic, so the first real request
+        doesn't pay for it. Failures are logged, never fatal.
+        """
+        steps = {
+            "groq": self.groq.models.list(),
+            "embedding": get_embedding_backend().embed("warm up"),
+            "supabase": check_connection(),
+        }
+        results = await asyncio.gather(
+            *(asyncio.wait_for(step, timeout) for step in steps.values()),
+            return_exceptions=True,
+        )
+        for name, result in zip(steps, results):
+            if isinstance(result, BaseException):
+                print(f"Warm-up failed ({name}): {result!r}")
+
+    def _register_metrics(self) -> None:
+        """Expose the services' own counters on /metrics (read at scrape time)."""
+        get_metrics().register_collector(
+            "novelaine_cache_requests_total",
+            "counter",
+            "Cache lookups by cache and result",
+            self._cache_samples,
+        )
+        get_metrics().register_collector(
+            "novelaine_llm_queue_depth",
+            "gauge",
+            "LLM requests waiting for a scheduler slot, by priority",
+            self.llm.queue_samples,
+        )
+        get_metrics().register_collector(
+            "novelaine_llm_concurrency",
+            "gauge",
+            "LLM scheduler concurrency limit and slots in use",
+            self.llm.concurrency_samples,
+        )
+
+    def _cache_samples(self):
+        name = "novelaine_cache_requests_total"
+        embedding = self.chat.rag_service.cache.stats()
+        counts = {
+            "story_graph": get_story_graph_cache().stats(),
+            "session": self.chat.session_store.stats(),
+            "speculative_scene": self.scenes.stats(),
+            "image": self.images.cache_stats(),
+            "embedding": {
+                "hits": embedding["memory_hits"] + embedding["persistent_hits"],
+                "misses": embedding["misses"],
+            },
+        }
+        index = get_story_vector_index()
+        if index is not None:
+            counts["vector_index"] = index.stats()
+
+        for cache, stats in counts.items():
+            yield name, {"cache": cache, "result": "hit"}, stats["hits"]
+            yield name, {"cache": cache, "result": "miss"}, stats["misses"]
+
+        for resource, stats in get_response_cache().stats()["resources"].items():
+            labels = {"cache": "response", "resource": resource}
+            yield name, {**labels, "result": "hit"}, stats["hits"]
+            yield name, {**labels, "result": "miss"}, stats["misses"]
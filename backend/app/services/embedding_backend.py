@@ -0,0 +1,255 @@
+"""Pluggable embedding backends (local CPU model or HuggingFace Inference API)."""
+
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from app.services.metrics import stage, upstream
+from app.services.upstream_clients import get_hf_client, hf_model
+
+# all-MiniLM-L6-v2 -> matches `embedding vector(384)` in schema.sql
+EMBEDDING_DIM = 384
+DEFAULT_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Embedding backend instance
+embedding_backend: Optional["EmbeddingBackend"] = None
+
+
+class EmbeddingBackend(ABC):
+    """Interface every embedding backend implements."""
+
+    model_id: str = DEFAULT_MODEL_ID
+
+    async def embed(self, text: str) -> List[float]:
+        return (await self.embed_batch([text]))[0]
+
+    @abstractmethod
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """One embedding per text, in order."""
+
+
+class HuggingFaceEmbeddingBackend(EmbeddingBackend):
+    """Remote feature extraction through the HuggingFace Inference API."""
+
+    def __init__(self, model_id: str = DEFAULT_MODEL_ID):
+        self.model_id = model_id
+
+    @property
+    def client(self):
+        # Resolved per call: the shared client is replaced after each app shutdown
+        return get_hf_client()
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # feature_extraction returns an ndarray of shape (len(texts), dim)
+        with upstream("huggingface", "feature_extraction"):
+            embeddings = await self.client.feature_extraction(
+                texts, model=hf_model(self.model_id, "feature-extraction")
+            )
+        # Ensure elements are native Python floats for JSON serialization
+        return [[float(x) for x in row] for row in embeddings]
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent submit() calls into a single process_batch() call.
+    A batch is flushed when it reaches max_batch_size or max_wait_ms after
+    its first item arrived, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5,
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def submit(self, item: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            results = await self.process_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """
+    In-process CPU inference with sentence-transformers, loaded from a local
+    model directory (e.g. a downloaded all-MiniLM-L6-v2, torch or ONNX export).
+    Forward passes run on a small thread pool; concurrent requests are
+    coalesced by a MicroBatcher so N callers share one forward pass.
+    A failed load is remembered: calls fail fast until the retry delay
+    (doubling from `load_retry_seconds` up to an hour) has passed.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        model_id: str = DEFAULT_MODEL_ID,
+        runtime: str = "torch",
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5,
+        workers: int = 1,
+        load_retry_seconds: float = 30,
+    ):
+        self.model_dir = model_dir
+        self.model_id = model_id
+        self.runtime = runtime
+        self.load_retry_seconds = load_retry_seconds
+        self._model = None
+        self._load_lock = asyncio.Lock()
+        self._load_error: Optional[Exception] = None
+        self._load_failures = 0
+        self._retry_load_at = 0.0
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="embedding"
+        )
+        self._batcher = MicroBatcher(self._encode, max_batch_size, max_wait_ms)
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return list(await asyncio.gather(*(self._batcher.submit(t) for t in texts)))
+
+    async def load(self) -> None:
+        """Load the model on the worker thread (idempotent)."""
+        async with self._load_lock:
+            if self._model is not None:
+                return
+            if self._load_error is not None and time.monotonic() < self._retry_load_at:
+                raise RuntimeError(
+                    f"Local embedding model unavailable: {self._load_error}"
+                )
+
+            loop = asyncio.get_running_loop()
+            try:
+                self._model = await loop.run_in_executor(self._executor, self._load_model)
+            except Exception as e:
+                self._load_error = e
+                self._load_failures += 1
+                delay = min(
+                    3600, self.load_retry_seconds * 2 ** (self._load_failures - 1)
+                )
+                self._retry_load_at = time.monotonic() + delay
+                print(
+                    f"Local embedding model failed to load (retry in {delay:.0f}s): {e}"
+                )
+                raise
+            self._load_error = None
+            self._load_failures = 0
+
+    def _load_model(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_BACKEND=local requires the sentence-transformers package"
+            ) from e
+
+        model = SentenceTransformer(self.model_dir, device="cpu", backend=self.runtime)
+        dim = model.get_sentence_embedding_dimension()
+        if dim != EMBEDDING_DIM:
+            raise ValueError(
+                f"Local embedding model has dimension {dim}, expected {EMBEDDING_DIM}"
+            )
+        return model
+
+    async def _encode(self, texts: List[str]) -> List[List[float]]:
+        await self.load()
+        loop = asyncio.get_running_loop()
+        with stage("embedding.local_encode"):
+            return await loop.run_in_executor(self._executor, self._encode_sync, texts)
+
+    def _encode_sync(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+        return vectors.astype("float32").tolist()
+
+
+class FallbackEmbeddingBackend(EmbeddingBackend):
+    """Uses the primary backend and falls back to the secondary when it fails."""
+
+    def __init__(self, primary: EmbeddingBackend, fallback: EmbeddingBackend):
+        self.primary = primary
+        self.fallback = fallback
+        self.model_id = primary.model_id
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        try:
+            return await self.primary.embed_batch(texts)
+        except Exception as e:
+            print(f"Primary embedding backend failed, falling back: {e}")
+            return await self.fallback.embed_batch(texts)
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """
+    Get or create the embedding backend.
+    EMBEDDING_BACKEND=local uses the model in EMBEDDING_MODEL_DIR with the
+    HuggingFace API as fallback; anything else uses the HuggingFace API only.
+    """
+    global embedding_backend
+
+    if embedding_backend is None:
+        model_id = os.getenv("EMBEDDING_MODEL_ID", DEFAULT_MODEL_ID)
+        remote = HuggingFaceEmbeddingBackend(model_id=model_id)
+
+        model_dir = os.getenv("EMBEDDING_MODEL_DIR")
+        if os.getenv("EMBEDDING_BACKEND", "hf") == "local" and model_dir:
+            local = LocalEmbeddingBackend(
+                model_dir,
+                model_id=model_id,
+                runtime=os.getenv("EMBEDDING_LOCAL_RUNTIME", "torch"),
+                max_batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+                max_wait_ms=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5")),
+                workers=int(os.getenv("EMBEDDING_WORKERS", "1")),
+                load_retry_seconds=float(
+                    os.getenv("EMBEDDING_LOAD_RETRY_SECONDS", "30")
+                ),
+            )
+            embedding_backend = FallbackEmbeddingBackend(local, remote)
+        else:
+            embedding_backend = remote
+
+    return embedding_backend
@@ -0,0 +1,210 @@
+"""Two-tier cache for query embeddings (in-process LRU + optional SQLite file)."""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# Embedding cache instance
+embedding_cache: Optional["EmbeddingCache"] = None
+
+
+class EmbeddingCache:
+    """
+    Embeddings are keyed by model id + a hash of the normalized text and kept
+    as packed float32 buffers (1.5 KB for a 384-dim vector).
+
+    - Memory tier: LRU bounded by entry count and TTL.
+    - Persistent tier (optional): SQLite file, survives restarts and is
+      shared by every worker on the host. Rows expire after
+      `persist_ttl_seconds`; every `PRUNE_EVERY` writes the expired rows are
+      deleted and the oldest beyond `max_persisted` are evicted.
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_seconds: float = 3600,
+        persist_path: Optional[str] = None,
+        persist_ttl_seconds: float = 30 * 86400,
+        max_persisted: int = 100_000,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_ttl_seconds = persist_ttl_seconds
+        self.max_persisted = max_persisted
+        self._writes = 0
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute("pragma journal_mode=wal")
+            self._db.execute(
+                "create table if not exists embeddings ("
+                " key text primary key,"
+                " model_id text not null,"
+                " vector blob not null,"
+                " created_at real not null,"
+                " expires_at real)"
+            )
+            try:
+                # Files written before rows carried an expiry
+                self._db.execute("alter table embeddings add column expires_at real")
+            except sqlite3.OperationalError:
+                pass
+            self._db.execute(
+                "update embeddings set expires_at = created_at + ?"
+                " where expires_at is null",
+                (persist_ttl_seconds,),
+            )
+            self._db.execute(
+                "create index if not exists embeddings_expires_at"
+                " on embeddings (expires_at)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """NFKC, case-fold and collapse whitespace so trivially different queries share a key."""
+        return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+    @classmethod
+    def make_key(cls, model_id: str, text: str) -> str:
+        normalized = cls.normalize(text)
+        return hashlib.sha256(f"{model_id}\0{normalized}".encode("utf-8")).hexdigest()
+
+    async def get(self, model_id: str, text: str) -> Optional[List[float]]:
+        key = self.make_key(model_id, text)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, packed = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return _unpack(packed)
+            del self._entries[key]
+
+        if self._db is not None:
+            packed = await asyncio.to_thread(self._db_get, key)
+            if packed is not None:
+                self._remember(key, packed)
+                self.persistent_hits += 1
+                return _unpack(packed)
+
+        self.misses += 1
+        return None
+
+    async def set(self, model_id: str, text: str, embedding: List[float]) -> None:
+        if not embedding:
+            return
+
+        key = self.make_key(model_id, text)
+        packed = array("f", embedding).tobytes()
+        self._remember(key, packed)
+
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, key, model_id, packed)
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                await asyncio.to_thread(self._db_prune)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        if self._db is not None:
+            await asyncio.to_thread(self._db_clear)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        hits = self.memory_hits + self.persistent_hits
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "persistent": self._db is not None,
+        }
+
+    def _remember(self, key: str, packed: bytes) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, packed)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _db_get(self, key: str) -> Optional[bytes]:
+        with self._db_lock:
+            row = self._db.execute(
+                "select vector from embeddings where key = ? and expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _db_set(self, key: str, model_id: str, packed: bytes) -> None:
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(
+                "insert or replace into embeddings"
+                " (key, model_id, vector, created_at, expires_at)"
+                " values (?, ?, ?, ?, ?)",
+                (key, model_id, packed, now, now + self.persist_ttl_seconds),
+            )
+            self._db.commit()
+
+    def _db_prune(self) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "delete from embeddings where expires_at <= ?", (time.time(),)
+            )
+            # Soonest to expire = oldest written
+            self._db.execute(
+                "delete from embeddings where key in ("
+                " select key from embeddings order by expires_at desc"
+                " limit -1 offset ?)",
+                (self.max_persisted,),
+            )
+            self._db.commit()
+
+    def _db_clear(self) -> None:
+        with self._db_lock:
+            self._db.execute("delete from embeddings")
+            self._db.commit()
+
+
+def _unpack(packed: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(packed)
+    return vector.tolist()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get or create the process-wide embedding cache."""
+    global embedding_cache
+
+    if embedding_cache is None:
+        embedding_cache = EmbeddingCache(
+            max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+            ttl_seconds=float(os.getenv("EMBEDDING_CACHE_TTL", "3600")),
+            persist_path=os.getenv("EMBEDDING_CACHE_PATH") or None,
+            persist_ttl_seconds=float(
+                os.getenv("EMBEDDING_CACHE_PERSIST_TTL", str(30 * 86400))
+            ),
+            max_persisted=int(os.getenv("EMBEDDING_CACHE_PERSIST_MAX", "100000")),
+        )
+
+    return embedding_cache
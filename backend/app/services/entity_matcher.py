@@ -0,0 +1,157 @@
+"""Per-story character-name matchers for the RAG trigger."""
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.services.supabase_client import get_supabase_client, execute
+from app.services.text_matcher import AhoCorasick
+
+# Story entity matcher instance
+story_entity_matcher: Optional["StoryEntityMatcher"] = None
+
+# Names to match, plus a minimal card used if the full card lookup fails
+CARD_COLUMNS = "id, name, description, aliases, key_terms"
+
+
+def character_terms(character: dict) -> List[str]:
+    """
+    Terms a reader may use for a character: full name, name parts, aliases
+    and key terms (a signature item, place or title).
+    """
+    name = (character.get("name") or "").strip()
+    terms = [name] if name else []
+    # "Elena Voss" -> also "Elena", "Voss" (single-syllable parts are too noisy)
+    parts = name.split()
+    if len(parts) > 1:
+        terms.extend(part for part in parts if len(part) > 1)
+    terms.extend(alias.strip() for alias in character.get("aliases") or [] if alias)
+    terms.extend(term.strip() for term in character.get("key_terms") or [] if term)
+    return terms
+
+
+class _StoryEntities:
+    def __init__(self, cards: Dict[str, dict]):
+        # character_id -> card
+        self.cards = cards
+        self._automaton: Optional[AhoCorasick] = None
+
+    @property
+    def automaton(self) -> AhoCorasick:
+        # Compiled lazily; character changes only reset it for this story
+        if self._automaton is None:
+            self._automaton = AhoCorasick(
+                (term, character_id)
+                for character_id, card in self.cards.items()
+                for term in character_terms(card)
+            )
+        return self._automaton
+
+    def reset(self) -> None:
+        self._automaton = None
+
+
+class StoryEntityMatcher:
+    """
+    Keeps a compiled Aho-Corasick automaton over the character names, aliases
+    and key terms of each active story (LRU, `max_stories`). A message that names a
+    character resolves to that character's card without any embedding call.
+    Character edits patch the resident stories that contain the character
+    and recompile only those.
+    """
+
+    def __init__(self, max_stories: int = 500):
+        self.max_stories = max_stories
+        self._stories: "OrderedDict[str, _StoryEntities]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def match(self, story_id: str, text: str) -> List[dict]:
+        """Cards of the characters named in `text`, in order of mention."""
+        story = await self._get(str(story_id))
+        return [
+            story.cards[character_id]
+            for character_id in story.automaton.find_values(text)
+        ]
+
+    def upsert_character(self, character: dict) -> None:
+        """Refresh a character's names in the resident stories that contain it."""
+        character_id = str(character["id"])
+        for story in self._stories.values():
+            if character_id in story.cards:
+                story.cards[character_id] = {
+                    **story.cards[character_id],
+                    **_card(character),
+                }
+                story.reset()
+
+    def remove_character(self, character_id: str) -> None:
+        for story in self._stories.values():
+            if story.cards.pop(str(character_id), None) is not None:
+                story.reset()
+
+    def invalidate(self, story_id: str) -> None:
+        self._stories.pop(str(story_id), None)
+
+    def stats(self) -> dict:
+        return {
+            "stories": len(self._stories),
+            "max_stories": self.max_stories,
+            "patterns": sum(
+                story.automaton.size
+                for story in self._stories.values()
+                if story._automaton is not None
+            ),
+        }
+
+    async def _get(self, story_id: str) -> _StoryEntities:
+        story = self._stories.get(story_id)
+        if story is not None:
+            self._stories.move_to_end(story_id)
+            return story
+
+        # One load per story even when several turns arrive at once
+        lock = self._locks.setdefault(story_id, asyncio.Lock())
+        async with lock:
+            story = self._stories.get(story_id)
+            if story is None:
+                story = await self._load(story_id)
+                self._stories[story_id] = story
+                while len(self._stories) > self.max_stories:
+                    self._stories.popitem(last=False)
+        self._locks.pop(story_id, None)
+        return story
+
+    async def _load(self, story_id: str) -> _StoryEntities:
+        client = get_supabase_client()
+        response = await execute(
+            client.table("story_characters")
+            .select(f"character_id, characters({CARD_COLUMNS})")
+            .eq("story_id", story_id)
+        )
+        cards = {}
+        for item in response.data or []:
+            character = item.get("characters")
+            if character:
+                cards[str(character["id"])] = _card(character)
+        return _StoryEntities(cards)
+
+
+def _card(character: dict) -> dict:
+    return {
+        key: character[key]
+        for key in ("id", "name", "description", "aliases", "key_terms")
+        if key in character
+    }
+
+
+def get_story_entity_matcher() -> StoryEntityMatcher:
+    """Get or create the story entity matcher."""
+    global story_entity_matcher
+
+    if story_entity_matcher is None:
+        story_entity_matcher = StoryEntityMatcher(
+            max_stories=int(os.getenv("ENTITY_MATCHER_STORIES", "500"))
+        )
+
+    return story_entity_matcher
@@ -0,0 +1,86 @@
+"""Multi-size WebP/AVIF renditions for generated scene images."""
+
+import io
+import os
+from typing import List
+
+from PIL import Image, features
+
+# (name, longest edge in px; None = original size)
+RENDITION_SIZES = (("thumb", 256), ("medium", 768), ("full", None))
+
+CONTENT_TYPES = {"webp": "image/webp", "avif": "image/avif", "png": "image/png"}
+
+
+def rendition_formats() -> List[str]:
+    """Formats from IMAGE_RENDITION_FORMATS (default webp) this Pillow build can encode."""
+    requested = os.getenv("IMAGE_RENDITION_FORMATS", "webp").split(",")
+    formats = [
+        f.strip()
+        for f in requested
+        if f.strip() in CONTENT_TYPES and features.check(f.strip())
+    ]
+    return formats or ["png"]
+
+
+def encode_renditions(
+    image: Image.Image, formats: List[str], quality: int = 80
+) -> List[dict]:
+    """
+    Resize and encode every (size, format) pair. CPU bound: run on a worker
+    thread. Each rendition's bytes stay in their own BytesIO so the upload
+    can stream from it without another full-buffer copy.
+    """
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+
+    renditions = []
+    for name, edge in RENDITION_SIZES:
+        resized = image
+        if edge is not None and max(image.size) > edge:
+            resized = image.copy()
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+
+        for fmt in formats:
+            options = {"quality": quality} if fmt != "png" else {"optimize": True}
+            if fmt == "webp":
+                options["method"] = 4  # encoder effort: good size/speed trade-off
+
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt.upper(), **options)
+            buffer.seek(0)
+            renditions.append(
+                {
+                    "name": name,
+                    "format": fmt,
+                    "width": resized.width,
+                    "height": resized.height,
+                    "bytes": buffer.getbuffer().nbytes,
+                    "buffer": buffer,
+                }
+            )
+
+    return renditions
+
+
+def build_manifest(renditions: List[dict]) -> dict:
+    """srcset-style manifest so clients can pick the smallest adequate size."""
+    manifest = {"renditions": [], "srcset": {}}
+
+    for r in renditions:
+        manifest["renditions"].append(
+            {
+                key: r[key]
+                for key in ("name", "format", "width", "height", "bytes", "path", "url")
+            }
+        )
+
+    for fmt in {r["format"] for r in renditions}:
+        candidates = sorted(
+            (r for r in renditions if r["format"] == fmt), key=lambda r: r["width"]
+        )
+        manifest["srcset"][fmt] = ", ".join(
+            f"{r['url']} {r['width']}w" for r in candidates
+        )
+
+    return manifest
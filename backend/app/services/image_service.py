@@ -1,20 +1,49 @@
+import hashlib
+import io
+import json
 import os
+import re
 import asyncio
-from huggingface_hub import AsyncInferenceClient
-from app.services.supabase_client import get_supabase_client
-from typing import Optional
+import unicodedata
+from app.services.supabase_client import get_supabase_client, execute, run_sync
+from app.services.upstream_clients import get_hf_client, hf_model
+from app.services.response_cache import get_response_cache
+from app.services.metrics import stage, upstream
+from app.services.image_renditions import (
+    CONTENT_TYPES,
+    build_manifest,
+    encode_renditions,
+    rendition_formats,
+)
+from typing import Dict, Optional
+
+# Image service instance
+image_service: Optional["ImageService"] = None
+
 
 class ImageService:
     def __init__(self):
         # Use HuggingFace Inference API (Free tier supports basic generation)
         # Recommended Model: stabilityai/stable-diffusion-xl-base-1.0 or appropriate fast model
-        self.api_key = os.getenv("HF_TOKEN")
-        self.client = AsyncInferenceClient(token=self.api_key)
-        self.supabase = get_supabase_client()
         # SDXL is large, might hit timeouts on free tier. 
         # 'runwayml/stable-diffusion-v1-5' or 'stabilityai/stable-diffusion-2-1' might be safer for free inference.
         # Let's try SD-2-1 for better quality than v1.5
         self.model_id = "stabilityai/stable-diffusion-2-1" 
+        # Extra text_to_image arguments; part of the generation cache key
+        self.generation_params: dict = {}
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    # Resolved per call: the shared clients are replaced after each app shutdown
+    @property
+    def client(self):
+        return get_hf_client()
+
+    @property
+    def supabase(self):
+        return get_supabase_client()
 
     async def generate_scene_image(self, prompt: str, scene_id: str) -> Optional[str]:
         """
@@ -22,40 +51,214 @@ class ImageService:
         Returns the public URL of the generated image.
         """
         try:
-            # 1. Generate Image
-            # The API returns a PIL Image object
-            image = await self.client.text_to_image(prompt, model=self.model_id)
-            
-            # 2. Save to temporary buffer
-            import io
-            buffer = io.BytesIO()
-            image.save(buffer, format="PNG")
-            image_bytes = buffer.getvalue()
-
-            # 3. Upload to Cloud Storage (Supabase Storage)
-            # Define file path: scenes/{scene_id}_{timestamp}.png
-            filename = f"scenes/{scene_id}_{os.urandom(4).hex()}.png"
-            
-            # Upload
-            # Note: You need to create a bucket named 'images' in Supabase beforehand
-            try:
-                self.supabase.storage.from_("images").upload(
-                    path=filename,
-                    file=image_bytes,
-                    file_options={"content-type": "image/png"}
-                )
-                
-                # Get Public URL
-                public_url_response = self.supabase.storage.from_("images").get_public_url(filename)
-                # supabase-py v2 returns a string directly or a response? 
-                # According to recent docs, get_public_url returns a string URL.
-                return public_url_response
-
-            except Exception as e:
-                print(f"Storage upload failed: {e}")
-                # Fallback: Can't return URL if storage fails.
-                return None
-
+            result = await self.run_scene_image_job(
+                {"scene_id": scene_id, "payload": {"prompt": prompt}}
+            )
+            return result["image_url"]
         except Exception as e:
             print(f"Image generation failed: {e}")
             return None
+
+    async def render_scene_image(self, prompt: str, scene_id: str) -> dict:
+        """
+        Same as generate_scene_image but raises on failure (used by the job queue
+        so it can retry). Returns {"image_url", "storage_path", "manifest"}.
+        """
+        # 1. Generate Image
+        # The API returns a PIL Image object
+        with upstream("huggingface", "text_to_image"):
+            image = await self.client.text_to_image(
+                prompt,
+                model=hf_model(self.model_id, "text-to-image"),
+                **self.generation_params,
+            )
+
+        # 2. Encode thumb/medium/full renditions off the event loop
+        with stage("image.encode_renditions"):
+            renditions = await asyncio.to_thread(
+                encode_renditions, image, rendition_formats()
+            )
+
+        # 3. Upload to Cloud Storage (Supabase Storage), all renditions concurrently
+        # Define file path: scenes/{scene_id}_{random}/{name}.{format}
+        prefix = f"scenes/{scene_id}_{os.urandom(4).hex()}"
+        for rendition in renditions:
+            rendition["path"] = f"{prefix}/{rendition['name']}.{rendition['format']}"
+
+        # Note: You need to create a bucket named 'images' in Supabase beforehand
+        results = await asyncio.gather(
+            *(self._upload(r) for r in renditions), return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            # Don't leave orphaned renditions behind; the job retries with a new prefix
+            uploaded = [r["path"] for r in renditions if "url" in r]
+            if uploaded:
+                try:
+                    await run_sync(
+                        self.supabase.storage.from_("images").remove, uploaded
+                    )
+                except Exception as e:
+                    print(f"Error removing partial upload {prefix}: {e}")
+            raise errors[0]
+
+        manifest = build_manifest(renditions)
+        # The largest rendition in the preferred format is the canonical image
+        full = next(r for r in renditions if r["name"] == "full")
+        return {
+            "image_url": full["url"],
+            "storage_path": full["path"],
+            "manifest": manifest,
+        }
+
+    async def _upload(self, rendition: dict) -> None:
+        bucket = self.supabase.storage.from_("images")
+        # BufferedReader lets httpx stream straight from the BytesIO (no getvalue() copy)
+        with upstream("supabase", "storage.upload"):
+            await run_sync(
+                bucket.upload,
+                path=rendition["path"],
+                file=io.BufferedReader(rendition.pop("buffer")),
+                file_options={
+                    "content-type": CONTENT_TYPES[rendition["format"]],
+                    "cache-control": "31536000",
+                },
+            )
+        # According to recent docs, get_public_url returns a string URL.
+        rendition["url"] = bucket.get_public_url(rendition["path"])
+
+    async def run_scene_image_job(self, job: dict) -> dict:
+        """
+        Job handler for kind="scene_image".
+        Reuses a cached image for the same prompt when possible, otherwise
+        renders one; records it in generated_images and flags the scene.
+        """
+        scene_id = job["scene_id"]
+        prompt = job["payload"]["prompt"]
+
+        rendered = await self.get_or_render(prompt, scene_id)
+
+        image_response = await execute(
+            self.supabase.table("generated_images").insert(
+                {
+                    "scene_id": scene_id,
+                    "prompt": prompt,
+                    "image_url": rendered["image_url"],
+                    "storage_path": rendered["storage_path"],
+                    "model_used": self.model_id,
+                    "generation_params": rendered["manifest"],
+                    "cache_key": rendered["cache_key"],
+                }
+            )
+        )
+        await execute(
+            self.supabase.table("scenes")
+            .update({"has_generated_image": True})
+            .eq("id", scene_id)
+        )
+        get_response_cache().invalidate("scene", scene_id)
+
+        return {
+            "image_url": rendered["image_url"],
+            "generated_image_id": image_response.data[0]["id"],
+            "manifest": rendered["manifest"],
+            "cache_hit": rendered["cache_hit"],
+        }
+
+    async def get_or_render(self, prompt: str, scene_id: str) -> dict:
+        """
+        Generation cache: (model id, normalized prompt, generation params) ->
+        an image already in storage. Concurrent misses for the same key share
+        one Stable Diffusion run.
+        """
+        cache_key = self.cache_key(prompt)
+
+        cached = await self._lookup(cache_key)
+        if cached is not None:
+            self.cache_hits += 1
+            return {**cached, "cache_key": cache_key, "cache_hit": True}
+
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            self.cache_hits += 1
+            rendered = await asyncio.shield(inflight)
+            return {**rendered, "cache_key": cache_key, "cache_hit": True}
+
+        self.cache_misses += 1
+        task = asyncio.ensure_future(self.render_scene_image(prompt, scene_id))
+        self._inflight[cache_key] = task
+        try:
+            rendered = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(cache_key, None)
+
+        return {**rendered, "cache_key": cache_key, "cache_hit": False}
+
+    def cache_key(self, prompt: str) -> str:
+        params = {**self.generation_params, "formats": rendition_formats()}
+        raw = json.dumps(
+            [self.model_id, normalize_prompt(prompt), params],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def purge_cache(self, model_id: Optional[str] = None) -> int:
+        """
+        Forget cache keys so the next generation re-renders. Stored images and
+        the scenes using them are left alone. Returns the number of rows purged.
+        """
+        query = (
+            self.supabase.table("generated_images")
+            .update({"cache_key": None})
+            .not_.is_("cache_key", "null")
+        )
+        if model_id:
+            query = query.eq("model_used", model_id)
+
+        response = await execute(query)
+        return len(response.data or [])
+
+    def cache_stats(self) -> dict:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_ratio": self.cache_hits / lookups if lookups else 0.0,
+            "inflight": len(self._inflight),
+        }
+
+    async def _lookup(self, cache_key: str) -> Optional[dict]:
+        response = await execute(
+            self.supabase.table("generated_images")
+            .select("image_url, storage_path, generation_params")
+            .eq("cache_key", cache_key)
+            .order("created_at", desc=True)
+            .limit(1)
+        )
+        if not response.data:
+            return None
+
+        row = response.data[0]
+        return {
+            "image_url": row["image_url"],
+            "storage_path": row["storage_path"],
+            "manifest": row["generation_params"] or {},
+        }
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case, punctuation and whitespace differences don't change the image we want."""
+    text = unicodedata.normalize("NFKC", prompt).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def get_image_service() -> ImageService:
+    """Get or create the shared image service."""
+    global image_service
+
+    if image_service is None:
+        image_service = ImageService()
+
+    return image_service
@@ -0,0 +1,232 @@
+"""Durable background job queue for media generation (backed by `media_jobs`)."""
+
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from app.services.supabase_client import get_supabase_client, execute
+
+JobHandler = Callable[[dict], Awaitable[dict]]
+
+# Job queue instance
+job_queue: Optional["JobQueue"] = None
+
+
+class JobQueue:
+    """
+    Jobs are rows in `media_jobs`, so they survive restarts and can be picked
+    up by any worker process. Each provider gets its own poller and its own
+    concurrency limit (claimed with `claim_media_jobs`, which uses
+    `for update skip locked`). Failed jobs are retried with exponential
+    backoff; once `max_attempts` is reached they are dead-lettered
+    (status='dead') and can be requeued through the API.
+    """
+
+    def __init__(
+        self,
+        poll_interval: float = 2.0,
+        base_backoff: float = 5.0,
+        max_backoff: float = 600.0,
+    ):
+        self.poll_interval = poll_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        # kind -> (provider, handler)
+        self._handlers: Dict[str, tuple] = {}
+        # provider -> max concurrent jobs
+        self._concurrency: Dict[str, int] = {}
+        self._running: Dict[str, Set[asyncio.Task]] = {}
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._pollers: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+
+    def register(
+        self, kind: str, provider: str, handler: JobHandler, concurrency: int = 1
+    ) -> None:
+        self._handlers[kind] = (provider, handler)
+        self._concurrency[provider] = concurrency
+        self._running.setdefault(provider, set())
+        self._wakeups.setdefault(provider, asyncio.Event())
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        scene_id: Optional[str] = None,
+        max_attempts: int = 5,
+    ) -> dict:
+        """Persist a job and wake the local worker. Returns the job row."""
+        provider, _ = self._handlers[kind]
+        client = get_supabase_client()
+        response = await execute(
+            client.table("media_jobs").insert(
+                {
+                    "kind": kind,
+                    "provider": provider,
+                    "scene_id": scene_id,
+                    "payload": payload,
+                    "max_attempts": max_attempts,
+                }
+            )
+        )
+        self._wakeups[provider].set()
+        return response.data[0]
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        client = get_supabase_client()
+        response = await execute(
+            client.table("media_jobs").select("*").eq("id", job_id).limit(1)
+        )
+        return response.data[0] if response.data else None
+
+    async def requeue(self, job_id: str) -> Optional[dict]:
+        """Move a dead-lettered job back to pending with a fresh attempt budget."""
+        client = get_supabase_client()
+        response = await execute(
+            client.table("media_jobs")
+            .update(
+                {
+                    "status": "pending",
+                    "attempts": 0,
+                    "last_error": None,
+                    "run_after": _now().isoformat(),
+                }
+            )
+            .eq("id", job_id)
+            .eq("status", "dead")
+        )
+        if not response.data:
+            return None
+
+        self._wakeups[response.data[0]["provider"]].set()
+        return response.data[0]
+
+    def start(self) -> None:
+        self._stopping = False
+        for provider in self._concurrency:
+            if provider not in self._pollers:
+                # Fresh event per start: an Event is bound to the loop it first waited on
+                self._wakeups[provider] = asyncio.Event()
+                self._pollers[provider] = asyncio.create_task(self._poll(provider))
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """
+        Stop claiming new jobs and give running ones `timeout` seconds to finish.
+        Jobs still running after that are cancelled; claim_media_jobs reclaims
+        them once their lock expires.
+        """
+        self._stopping = True
+        for wakeup in self._wakeups.values():
+            wakeup.set()
+        await asyncio.gather(*self._pollers.values(), return_exceptions=True)
+        self._pollers.clear()
+
+        running = [task for tasks in self._running.values() for task in tasks]
+        if running:
+            _, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            provider: {
+                "running": len(self._running[provider]),
+                "concurrency": limit,
+            }
+            for provider, limit in self._concurrency.items()
+        }
+
+    async def _poll(self, provider: str) -> None:
+        wakeup = self._wakeups[provider]
+        running = self._running[provider]
+
+        while not self._stopping:
+            free = self._concurrency[provider] - len(running)
+            if free > 0:
+                try:
+                    jobs = await self._claim(provider, free)
+                except Exception as e:
+                    print(f"Job claim failed ({provider}): {e}")
+                    jobs = []
+
+                for job in jobs:
+                    task = asyncio.create_task(self._run_job(job))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+                    task.add_done_callback(lambda _: wakeup.set())
+
+                if len(jobs) == free:
+                    # There may be more work waiting; claim again right away
+                    continue
+
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+
+    async def _claim(self, provider: str, limit: int) -> list:
+        client = get_supabase_client()
+        response = await execute(
+            client.rpc("claim_media_jobs", {"p_provider": provider, "p_limit": limit})
+        )
+        return response.data or []
+
+    async def _run_job(self, job: dict) -> None:
+        _, handler = self._handlers[job["kind"]]
+
+        try:
+            result = await handler(job)
+            update = {"status": "succeeded", "result": result, "last_error": None}
+        except Exception as e:
+            print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+            update = self._failure_update(job, e)
+
+        try:
+            client = get_supabase_client()
+            await execute(client.table("media_jobs").update(update).eq("id", job["id"]))
+        except Exception as e:
+            # The row stays 'running' and is reclaimed after the lock timeout
+            print(f"Job {job['id']} status update failed: {e}")
+
+    def _failure_update(self, job: dict, error: Exception) -> dict:
+        # `attempts` was already incremented by claim_media_jobs
+        if job["attempts"] >= job["max_attempts"]:
+            return {"status": "dead", "last_error": str(error)}
+
+        delay = min(self.base_backoff * 2 ** (job["attempts"] - 1), self.max_backoff)
+        delay *= random.uniform(0.8, 1.2)
+        return {
+            "status": "pending",
+            "last_error": str(error),
+            "run_after": (_now() + timedelta(seconds=delay)).isoformat(),
+        }
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def get_job_queue() -> JobQueue:
+    """Get or create the job queue with the media handlers registered."""
+    global job_queue
+
+    if job_queue is None:
+        from app.services.image_service import get_image_service
+
+        job_queue = JobQueue(
+            poll_interval=float(os.getenv("JOB_POLL_INTERVAL", "2")),
+        )
+        image_service = get_image_service()
+        job_queue.register(
+            "scene_image",
+            provider="huggingface",
+            handler=image_service.run_scene_image_job,
+            concurrency=int(os.getenv("JOB_CONCURRENCY_HUGGINGFACE", "2")),
+        )
+
+    return job_queue
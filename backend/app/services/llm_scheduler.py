@@ -0,0 +1,627 @@
+"""
+Admission control in front of every Groq chat completion.
+
+Requests wait in one queue ordered by priority class: interactive (chat
+turns, the scene after a chosen choice), then background (rolling
+summaries), then speculative (drafts for choices not taken yet). Slots are
+handed out under an adaptive concurrency limit (AIMD): it grows by about one
+per round trip while the limit is what holds requests back, and shrinks
+multiplicatively on a 429, a 5xx or timeout, or an upstream latency spike.
+Optional token buckets per API key and model pace requests and tokens per
+minute to the account's rate limits.
+
+Identical non-streaming requests already in flight share one upstream call.
+A request that cannot start within its priority's queue deadline fails fast
+with SchedulerOverloaded (a 503 in the API) instead of piling up.
+
+The SDK's own retries are turned off for these calls so every 429 reaches
+the scheduler. It pauses the key for retry-after and retries through the
+queue.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import groq
+from groq import AsyncGroq
+
+from app.services.circuit_breaker import StageTimer
+from app.services.metrics import get_metrics, record_tokens, upstream
+from app.services.upstream_clients import get_groq_client
+
+# Priority class -> rank (lower runs first)
+PRIORITIES = {"interactive": 0, "background": 1, "speculative": 2}
+
+# What a request is for (also the token metrics' purpose label) -> priority class
+PURPOSES = {
+    "chat": "interactive",
+    "scene": "interactive",
+    "summary": "background",
+    "speculative": "speculative",
+}
+
+# Overload signals: shrink the limit, then retry through the queue
+_RETRYABLE = (groq.RateLimitError, groq.InternalServerError, groq.APIConnectionError)
+
+# LLM scheduler instance
+llm_scheduler: Optional["LLMScheduler"] = None
+
+
+class SchedulerOverloaded(Exception):
+    """The request could not start within its queue deadline."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    `per_minute` units refilled continuously, bursting up to a minute's
+    worth. 0 disables it.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        # A request bigger than the bucket goes through once it is full
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float) -> None:
+        # May go negative when actual usage exceeded the estimate
+        if self.rate > 0:
+            self._refill()
+            self.level -= amount
+
+    def give_back(self, amount: float) -> None:
+        if self.rate > 0:
+            self.level = min(self.capacity, self.level + amount)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class _RateLimit:
+    """Request and token buckets for one API key and model, plus a retry-after pause."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+
+    def delay(self, tokens: int) -> float:
+        return max(
+            0.0,
+            self.paused_until - time.monotonic(),
+            self.requests.delay(1),
+            self.tokens.delay(tokens),
+        )
+
+    def take(self, tokens: int) -> None:
+        self.requests.take(1)
+        self.tokens.take(tokens)
+
+
+class _Ticket:
+    """A queued request; `granted` resolves when it gets a slot."""
+
+    def __init__(self, priority: str, model: str, tokens: int, limit: _RateLimit):
+        self.priority = priority
+        self.model = model
+        self.tokens = tokens
+        self.limit = limit
+        self.enqueued = time.monotonic()
+        self.granted_at = 0.0
+        self.granted: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class _Flight:
+    """A non-streaming call shared by identical requests."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class ScheduledStream:
+    """A Groq chunk stream that notes time to first chunk and the final usage."""
+
+    def __init__(self, stream, started: float):
+        self._stream = stream
+        self._started = started
+        self.first_chunk_latency: Optional[float] = None
+        self.usage = None
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            if self.first_chunk_latency is None:
+                self.first_chunk_latency = time.monotonic() - self._started
+            # usage arrives on the last chunk (include_usage or x_groq.usage)
+            usage = chunk.usage or (chunk.x_groq.usage if chunk.x_groq else None)
+            if usage:
+                self.usage = usage
+            yield chunk
+
+    async def close(self) -> None:
+        await self._stream.close()
+
+
+class LLMScheduler:
+    """
+    Priority queue + AIMD concurrency limit + per-key pacing + single-flight
+    for Groq chat completions. See the module docstring.
+    """
+
+    def __init__(
+        self,
+        min_concurrency: int = 2,
+        max_concurrency: int = 32,
+        initial_concurrency: int = 8,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        queue_timeouts: Optional[Dict[str, float]] = None,
+        max_retries: int = 2,
+        latency_tolerance: float = 2.0,
+        backoff: float = 0.7,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(initial_concurrency)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.queue_timeouts = {
+            "interactive": 10.0,
+            "background": 60.0,
+            "speculative": 2.0,
+            **(queue_timeouts or {}),
+        }
+        self.max_retries = max_retries
+        # Short-term latency this many times the long-term average counts as overload
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+
+        self.in_flight = 0
+        # (rank, sequence, ticket); abandoned tickets are skipped when popped
+        self._queue: List[Tuple[int, int, _Ticket]] = []
+        self._sequence = itertools.count()
+        self._queued = Counter()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+        # (key fingerprint, model) -> buckets
+        self._limits: Dict[Tuple[str, str], _RateLimit] = {}
+        # (priority class, request fingerprint) -> shared call
+        self._flights: Dict[Tuple[str, str], _Flight] = {}
+        # (model, kind) -> (fast, slow) EWMA of upstream latency
+        self._latency: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        # EWMA of how long a slot is held; drives the queue-wait estimate
+        self._service_time = 1.0
+        self._last_decrease = 0.0
+        # Concurrency at the last overload; above it the limit probes 10x slower
+        self._ceiling = float(max_concurrency)
+
+        self._source: Optional[AsyncGroq] = None
+        self._client: Optional[AsyncGroq] = None
+        self._key = ""
+
+        self.wait_timers = {priority: StageTimer() for priority in PRIORITIES}
+        self.counts = Counter()
+        registry = get_metrics()
+        self._wait_seconds = registry.histogram(
+            "novelaine_llm_queue_wait_seconds",
+            "Time LLM requests waited for a scheduler slot",
+        )
+        self._events = registry.counter(
+            "novelaine_llm_scheduler_events_total",
+            "LLM scheduler decisions (shed, coalesced, throttled, retried, decreased)",
+        )
+
+    async def complete(self, purpose: str, **params):
+        """
+        `chat.completions.create(**params)` through the queue. Identical
+        requests of the same priority class in flight share one call (and its
+        response); a speculative call never holds back an interactive one.
+        """
+        key = (PURPOSES[purpose], _fingerprint(params))
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(self._complete(purpose, params)))
+            self._flights[key] = flight
+            flight.task.add_done_callback(
+                lambda _, key=key, flight=flight: (
+                    self._flights.pop(key) if self._flights.get(key) is flight else None
+                )
+            )
+        else:
+            self._count("coalesced")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            # The last caller to leave cancels the upstream call
+            if not flight.task.done():
+                flight.waiters -= 1
+                if flight.waiters == 0:
+                    flight.task.cancel()
+            raise
+
+    @asynccontextmanager
+    async def stream(self, purpose: str, **params) -> AsyncIterator[ScheduledStream]:
+        """
+        `chat.completions.create(stream=True, **params)` through the queue.
+        The slot is held until the block exits, which closes the stream.
+        Streams are never shared.
+        """
+        params = {**params, "stream": True}
+        ticket, raw = await self._create(purpose, params, "chat.completions.stream")
+        stream = ScheduledStream(raw, ticket.granted_at)
+        overloaded = False
+        try:
+            yield stream
+        except _RETRYABLE:
+            overloaded = True
+            raise
+        finally:
+            await stream.close()
+            record_tokens(params["model"], purpose, stream.usage)
+            self._release(
+                ticket,
+                overloaded=overloaded,
+                latency=stream.first_chunk_latency,
+                kind="stream",
+                usage=stream.usage,
+            )
+
+    def check_admission(self, purpose: str) -> None:
+        """Raise SchedulerOverloaded now if a request couldn't start in time."""
+        priority = PURPOSES[purpose]
+        expected = self._expected_wait(priority)
+        if expected > self.queue_timeouts[priority]:
+            self._shed(priority, 0.0)
+            raise SchedulerOverloaded(
+                f"LLM queue is full ({priority}, expected wait {expected:.1f}s)",
+                retry_after=expected,
+            )
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "min_concurrency": self.min_concurrency,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": {priority: self._queued[priority] for priority in PRIORITIES},
+            "queue_timeouts": self.queue_timeouts,
+            "service_time_seconds": round(self._service_time, 3),
+            "wait": {p: timer.stats() for p, timer in self.wait_timers.items()},
+            "events": dict(self.counts),
+            "rate_limits": {
+                model: {
+                    "paused_seconds": round(
+                        max(0.0, limit.paused_until - time.monotonic()), 2
+                    ),
+                    "requests_available": round(limit.requests.level, 1),
+                    "tokens_available": round(limit.tokens.level),
+                }
+                for (_, model), limit in self._limits.items()
+            },
+        }
+
+    def queue_samples(self):
+        """Queue depth per priority (a gauge collector for /metrics)."""
+        for priority in PRIORITIES:
+            labels = {"priority": priority}
+            yield "novelaine_llm_queue_depth", labels, self._queued[priority]
+
+    def concurrency_samples(self):
+        """Current limit and slots in use (a gauge collector for /metrics)."""
+        name = "novelaine_llm_concurrency"
+        yield name, {"state": "limit"}, int(self.limit)
+        yield name, {"state": "in_flight"}, self.in_flight
+
+    async def _complete(self, purpose: str, params: dict):
+        ticket, response = await self._create(purpose, params, "chat.completions")
+        record_tokens(params["model"], purpose, response.usage)
+        self._release(
+            ticket,
+            latency=time.monotonic() - ticket.granted_at,
+            kind="complete",
+            usage=response.usage,
+        )
+        return response
+
+    async def _create(
+        self, purpose: str, params: dict, operation: str
+    ) -> Tuple[_Ticket, object]:
+        """
+        Wait for a slot and call create(); throttled or failed attempts give
+        the slot back and queue again, up to `max_retries` times.
+        """
+        priority = PURPOSES[purpose]
+        client = self._groq()
+        limit = self._rate_limit(params["model"])
+        tokens = _estimate_tokens(params)
+
+        for attempt in itertools.count():
+            ticket = await self._acquire(priority, params["model"], tokens, limit)
+            try:
+                with upstream("groq", operation):
+                    result = await client.chat.completions.create(**params)
+            except _RETRYABLE as e:
+                self._release(ticket, overloaded=True)
+                if attempt >= self.max_retries:
+                    raise
+                await self._back_off(e, attempt, limit)
+                continue
+            except BaseException:
+                self._release(ticket)
+                raise
+            return ticket, result
+
+    async def _acquire(
+        self, priority: str, model: str, tokens: int, limit: _RateLimit
+    ) -> _Ticket:
+        timeout = self.queue_timeouts[priority]
+        expected = self._expected_wait(priority, tokens, limit)
+        if expected > timeout:
+            self._shed(priority, 0.0)
+            raise SchedulerOverloaded(
+                f"LLM queue is full ({priority}, expected wait {expected:.1f}s)",
+                retry_after=expected,
+            )
+
+        ticket = _Ticket(priority, model, tokens, limit)
+        heapq.heappush(
+            self._queue, (PRIORITIES[priority], next(self._sequence), ticket)
+        )
+        self._queued[priority] += 1
+        self._dispatch()
+
+        try:
+            await asyncio.wait([ticket.granted], timeout=timeout)
+        except asyncio.CancelledError:
+            self._abandon(ticket)
+            raise
+        if not ticket.granted.done():
+            self._abandon(ticket)
+            self._shed(priority, time.monotonic() - ticket.enqueued)
+            raise SchedulerOverloaded(
+                f"LLM queue wait exceeded {timeout:.0f}s ({priority})",
+                retry_after=self._expected_wait(priority),
+            )
+        return ticket
+
+    def _dispatch(self) -> None:
+        """
+        Grant slots to the best queued tickets while the limits allow. A ticket
+        whose key/model is paced stays queued (and so does everything behind
+        it on the same buckets); tickets for other models go ahead of it.
+        """
+        deferred = []
+        blocked = set()
+        wake = None
+        while self._queue and self.in_flight < max(1, int(self.limit)):
+            entry = heapq.heappop(self._queue)
+            ticket = entry[2]
+            if ticket.granted.done():
+                # Abandoned (timed out or cancelled) while queued
+                continue
+
+            if ticket.limit in blocked:
+                deferred.append(entry)
+                continue
+            delay = ticket.limit.delay(ticket.tokens)
+            if delay > 0:
+                blocked.add(ticket.limit)
+                deferred.append(entry)
+                wake = delay if wake is None else min(wake, delay)
+                continue
+
+            self._queued[ticket.priority] -= 1
+            ticket.limit.take(ticket.tokens)
+            self.in_flight += 1
+            ticket.granted_at = time.monotonic()
+            ticket.granted.set_result(None)
+
+            waited = ticket.granted_at - ticket.enqueued
+            self.wait_timers[ticket.priority].record(waited)
+            self._wait_seconds.observe(
+                waited, priority=ticket.priority, outcome="admitted"
+            )
+
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+        if wake is not None:
+            self._wake_in(wake)
+
+    def _abandon(self, ticket: _Ticket) -> None:
+        if not ticket.granted.done():
+            self._queued[ticket.priority] -= 1
+            ticket.granted.cancel()
+        elif not ticket.granted.cancelled():
+            # Granted in the same tick the caller gave up: hand the slot back
+            ticket.limit.tokens.give_back(ticket.tokens)
+            self.in_flight -= 1
+            self._dispatch()
+
+    def _release(
+        self,
+        ticket: _Ticket,
+        overloaded: bool = False,
+        latency: Optional[float] = None,
+        kind: str = "complete",
+        usage=None,
+    ) -> None:
+        self.in_flight -= 1
+        held = time.monotonic() - ticket.granted_at
+        self._service_time += 0.1 * (held - self._service_time)
+
+        # Settle the token reservation against what was actually used
+        if usage is not None and usage.total_tokens is not None:
+            difference = usage.total_tokens - ticket.tokens
+            if difference > 0:
+                ticket.limit.tokens.take(difference)
+            else:
+                ticket.limit.tokens.give_back(-difference)
+
+        if overloaded:
+            self._decrease()
+        elif latency is not None:
+            self._observe_latency(ticket.model, kind, latency)
+        self._dispatch()
+
+    def _observe_latency(self, model: str, kind: str, seconds: float) -> None:
+        fast, slow = self._latency.get((model, kind), (seconds, seconds))
+        fast += 0.2 * (seconds - fast)
+        slow += 0.02 * (seconds - slow)
+        self._latency[(model, kind)] = (fast, slow)
+
+        if fast > slow * self.latency_tolerance:
+            self._decrease()
+        elif self._queue or self.in_flight + 1 >= int(self.limit):
+            # Additive increase: about +1 per round trip, only while the limit binds
+            step = 1 / self.limit if self.limit < self._ceiling else 0.1 / self.limit
+            self.limit = min(self.max_concurrency, self.limit + step)
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        # At most once per round trip: calls already in flight saw the same overload
+        if now - self._last_decrease < self._service_time:
+            return
+        self._last_decrease = now
+        # The calls still in flight were fine; one more was too many
+        self._ceiling = max(self.min_concurrency, min(self.limit, self.in_flight))
+        self.limit = max(self.min_concurrency, self.limit * self.backoff)
+        self._count("decreased")
+
+    async def _back_off(self, error: Exception, attempt: int, limit: _RateLimit):
+        retry_after = _retry_after(error)
+        if retry_after is None:
+            retry_after = min(8.0, 0.5 * 2**attempt) * random.uniform(0.5, 1.0)
+
+        self._count("retried")
+        if isinstance(error, groq.RateLimitError):
+            # The whole key waits, not just this request; the retry queues behind it
+            self._count("throttled")
+            limit.paused_until = max(limit.paused_until, time.monotonic() + retry_after)
+        else:
+            await asyncio.sleep(retry_after)
+
+    def _expected_wait(
+        self,
+        priority: str,
+        tokens: int = 0,
+        limit: Optional[_RateLimit] = None,
+    ) -> float:
+        """Rough wait for a new request: the queue ahead of it plus any pacing."""
+        rank = PRIORITIES[priority]
+        ahead = sum(n for p, n in self._queued.items() if PRIORITIES[p] <= rank)
+        wait = limit.delay(tokens) if limit is not None else 0.0
+        if ahead or self.in_flight >= int(self.limit):
+            wait += (ahead + 1) * self._service_time / max(1, int(self.limit))
+        return wait
+
+    def _shed(self, priority: str, waited: float) -> None:
+        self._count("shed", priority=priority)
+        self.wait_timers[priority].record(waited, outcome="timeout")
+        self._wait_seconds.observe(waited, priority=priority, outcome="shed")
+
+    def _wake_in(self, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+        if self._wakeup is not None and self._wakeup.when() <= when:
+            return
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = loop.call_at(when, self._wake)
+
+    def _wake(self) -> None:
+        self._wakeup = None
+        self._dispatch()
+
+    def _groq(self) -> AsyncGroq:
+        # Follows the shared client (recreated after close_upstream_clients)
+        source = get_groq_client()
+        if source is not self._source:
+            self._source = source
+            self._client = source.with_options(max_retries=0)
+            self._key = hashlib.sha256((source.api_key or "").encode()).hexdigest()[:12]
+        return self._client
+
+    def _rate_limit(self, model: str) -> _RateLimit:
+        key = (self._key, model)
+        limit = self._limits.get(key)
+        if limit is None:
+            limit = self._limits[key] = _RateLimit(
+                self.requests_per_minute, self.tokens_per_minute
+            )
+        return limit
+
+    def _count(self, event: str, **labels) -> None:
+        self.counts[event] += 1
+        self._events.inc(event=event, **labels)
+
+
+def _fingerprint(params: dict) -> str:
+    body = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _estimate_tokens(params: dict) -> int:
+    """
+    Tokens to reserve: about one per prompt character (Korean is close to
+    that, ASCII much less) plus the completion cap. Settled against the
+    actual usage when the call ends.
+    """
+    prompt = sum(len(m.get("content") or "") for m in params.get("messages", []))
+    return prompt + int(params.get("max_tokens") or 1000)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Get or create the LLM scheduler."""
+    global llm_scheduler
+
+    if llm_scheduler is None:
+        llm_scheduler = LLMScheduler(
+            min_concurrency=int(os.getenv("LLM_MIN_CONCURRENCY", "2")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+            initial_concurrency=int(os.getenv("LLM_INITIAL_CONCURRENCY", "8")),
+            requests_per_minute=float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "0")),
+            tokens_per_minute=float(os.getenv("GROQ_TOKENS_PER_MINUTE", "0")),
+            queue_timeouts={
+                "interactive": float(os.getenv("LLM_QUEUE_TIMEOUT", "10")),
+                "background": float(os.getenv("LLM_BACKGROUND_QUEUE_TIMEOUT", "60")),
+                "speculative": float(os.getenv("LLM_SPECULATIVE_QUEUE_TIMEOUT", "2")),
+            },
+            max_retries=int(os.getenv("GROQ_MAX_RETRIES", "2")),
+        )
+
+    return llm_scheduler
@@ -1,25 +1,308 @@
-from typing import List, Dict
+import asyncio
+import math
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+
+from app.services.supabase_client import get_supabase_client, execute
+from app.services.llm_scheduler import get_llm_scheduler
+
+try:
+    import tiktoken
+
+    # Llama 3 토크나이저와 같은 계열(BPE)이라 cl100k 카운트가 근사치로 충분함
+    _encoding = tiktoken.get_encoding("cl100k_base")
+    _encoding_error: Optional[Exception] = None
+except Exception as e:
+    # 미설치이거나 BPE 파일을 받지 못한 경우 (오프라인) -> 휴리스틱으로 대체
+    _encoding = None
+    _encoding_error = e
+
+# 메시지마다 붙는 role/구분자 토큰 (chat template 오버헤드)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def count_tokens(text: str) -> int:
+    """
+    토큰 수 추정. tiktoken이 있으면 그대로 사용하고, 없으면 휴리스틱:
+    한글 등 비 ASCII 문자는 1자당 약 1토큰, ASCII는 4자당 약 1토큰.
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+
+    non_ascii = sum(1 for c in text if ord(c) > 127)
+    return non_ascii + math.ceil((len(text) - non_ascii) / 4)
+
+
+def tokenizer_status() -> Optional[str]:
+    """tiktoken을 쓸 수 없으면 그 이유, 쓸 수 있으면 None."""
+    if _encoding is None:
+        return f"{type(_encoding_error).__name__}: {_encoding_error}"
+    return None
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
 
 class MemoryService:
-    def __init__(self, max_buffer_size: int = 10):
-        # 실무에서는 Redis나 DB에 저장해야 하지만, 
-        # 지금은 간단히 메모리 내 리스트로 시뮬레이션 하거나,
-        # DB의 user_progress나 choices 테이블을 조회하는 방식으로 구현해야 합니다.
-        # 여기서는 "요청에 포함된 지난 대화"를 다루는 헬퍼 함수로 구성합니다.
+    """
+    Summary Buffer Memory.
+    최근 대화는 토큰 예산 안에서 원문 그대로 유지하고, 예산 밖으로 밀려난
+    대화는 세션별 누적 요약(rolling summary)에 합칩니다.
+    요약 갱신은 응답 경로 밖(백그라운드 태스크)에서 작은 모델로 수행하고
+    `chat_summaries` 테이블에 세션 단위로 저장합니다.
+    """
+
+    def __init__(
+        self,
+        max_buffer_size: int = 10,
+        history_token_budget: int = 1500,
+        summary_max_tokens: int = 300,
+        summary_chunk_tokens: int = 2000,
+        summary_model: str = "llama-3.1-8b-instant",
+        max_sessions: int = 10000,
+    ):
+        # 원문으로 유지할 최대 메시지 수 (토큰 예산과 함께 적용)
         self.max_buffer_size = max_buffer_size
+        self.history_token_budget = history_token_budget
+        self.summary_max_tokens = summary_max_tokens
+        # 요약 모델 한 번에 넣을 최대 대화 분량
+        self.summary_chunk_tokens = summary_chunk_tokens
+        self.summary_model = summary_model
+        self.max_sessions = max_sessions
+        # 요약은 background 우선순위: 대화 응답이 밀려 있으면 뒤로 양보
+        self.llm = get_llm_scheduler()
+
+        # session_id -> {"summary": str, "summarized_count": int}
+        # summarized_count: 대화 앞부분 중 요약에 반영된 메시지 수
+        # (최근 사용 세션만 메모리에 유지, 나머지는 DB에서 다시 읽음)
+        self._summaries: "OrderedDict[str, dict]" = OrderedDict()
+        # session_id -> (offset, 요약해야 할 앞부분 대화); 실행 중인 태스크가 이어서 처리
+        self._pending: Dict[str, Tuple[int, List[Dict[str, str]]]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def format_history(
+        self,
+        messages: List[Dict[str, str]],
+        token_budget: Optional[int] = None,
+        summary: str = "",
+    ) -> List[Dict[str, str]]:
+        """
+        토큰 예산 안에 들어가는 최근 대화만 원문으로 유지하고,
+        그 앞에 누적 요약을 시스템 메시지로 붙입니다.
+        """
+        context, _, _ = self._select(messages, token_budget, summary)
+        return context
 
-    def format_history(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    async def build_context(
+        self,
+        messages: List[Dict[str, str]],
+        token_budget: Optional[int] = None,
+        session_id: Optional[str] = None,
+        offset: int = 0,
+    ) -> List[Dict[str, str]]:
         """
-        토큰 절약을 위해 최근 N개의 대화만 유지합니다.
-        (추후 요약 기능 추가 가능)
+        format_history + 세션 요약 적용.
+        예산 밖으로 밀려난 대화는 백그라운드에서 요약에 합쳐지며, 이번 턴은
+        기다리지 않고 현재까지의 요약으로 진행합니다.
+        offset: messages[0]이 세션 전체 대화에서 몇 번째 메시지인지
+        (세션 저장소는 최근 메시지만 메모리에 들고 있음)
         """
-        if not messages:
-            return []
-            
-        # 시스템 프롬프트는 유지하고, 나머지 대화 중 최근 N개만 슬라이싱
+        if not session_id:
+            return self.format_history(messages, token_budget)
+
+        state = await self.get_summary(session_id)
+        context, chat_msgs, keep_from = self._select(
+            messages, token_budget, state["summary"]
+        )
+        self.schedule_summary_update(session_id, chat_msgs, keep_from, offset)
+        return context
+
+    def _select(
+        self,
+        messages: List[Dict[str, str]],
+        token_budget: Optional[int],
+        summary: str,
+    ) -> Tuple[List[Dict[str, str]], List[Dict[str, str]], int]:
+        # 시스템 프롬프트는 유지하고, 나머지 대화 중 예산 안의 최근 메시지만 유지
         system_msgs = [m for m in messages if m["role"] == "system"]
         chat_msgs = [m for m in messages if m["role"] != "system"]
-        
-        recent_chat = chat_msgs[-self.max_buffer_size:]
-        
-        return system_msgs + recent_chat
+
+        budget = self.history_token_budget
+        if token_budget is not None:
+            budget = min(budget, token_budget)
+        budget -= count_message_tokens(system_msgs)
+
+        summary_msgs = []
+        if summary:
+            summary_msg = {
+                "role": "system",
+                "content": f"[이전 줄거리 요약]\n{summary}",
+            }
+            # 요약조차 예산에 못 들어가면 생략 (상한 우선)
+            if count_message_tokens([summary_msg]) <= budget:
+                summary_msgs.append(summary_msg)
+                budget -= count_message_tokens(summary_msgs)
+        keep_from = self.split_recent(chat_msgs, budget)
+
+        return system_msgs + summary_msgs + chat_msgs[keep_from:], chat_msgs, keep_from
+
+    def split_recent(
+        self, chat_msgs: List[Dict[str, str]], token_budget: Optional[int] = None
+    ) -> int:
+        """예산 안에 들어가는 최근 메시지의 시작 인덱스 (앞부분은 요약 대상)."""
+        if token_budget is None:
+            token_budget = self.history_token_budget
+        oldest = max(0, len(chat_msgs) - self.max_buffer_size)
+
+        keep_from = len(chat_msgs)
+        used = 0
+        for i in range(len(chat_msgs) - 1, oldest - 1, -1):
+            used += count_tokens(chat_msgs[i]["content"]) + MESSAGE_OVERHEAD_TOKENS
+            if used > token_budget:
+                break
+            keep_from = i
+
+        return keep_from
+
+    async def get_summary(self, session_id: str) -> dict:
+        """세션의 누적 요약 (메모리 → DB 순으로 조회)."""
+        state = self._summaries.get(session_id)
+        if state is not None:
+            self._summaries.move_to_end(session_id)
+            return state
+
+        state = {"summary": "", "summarized_count": 0}
+        try:
+            client = get_supabase_client()
+            response = await execute(
+                client.table("chat_summaries")
+                .select("summary, summarized_count")
+                .eq("session_id", session_id)
+                .limit(1)
+            )
+            if response.data:
+                state = response.data[0]
+        except Exception as e:
+            # 조회 실패 시 요약 없이 진행 (캐시하지 않고 다음 턴에 재시도)
+            print(f"Summary load failed: {e}")
+            return state
+
+        self._remember(session_id, state)
+        return state
+
+    def schedule_summary_update(
+        self,
+        session_id: str,
+        chat_msgs: List[Dict[str, str]],
+        keep_from: int,
+        offset: int = 0,
+    ) -> None:
+        """
+        chat_msgs[:keep_from] 중 아직 요약되지 않은 부분을 백그라운드에서 요약에 합칩니다.
+        세션당 태스크는 하나만 돌고, 그동안 들어온 요청은 최신 것 하나로 합쳐집니다.
+        """
+        state = self._summaries.get(session_id)
+        if state is None or offset + keep_from <= state["summarized_count"]:
+            return
+
+        self._pending[session_id] = (offset, chat_msgs[:keep_from])
+        if session_id not in self._tasks:
+            self._tasks[session_id] = asyncio.create_task(
+                self._run_summary_updates(session_id)
+            )
+
+    async def flush(self, timeout: float = 10.0) -> None:
+        """진행 중인 요약 갱신을 기다림 (앱 종료 시)."""
+        tasks = list(self._tasks.values())
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    async def _run_summary_updates(self, session_id: str) -> None:
+        try:
+            while session_id in self._pending:
+                offset, evicted = self._pending.pop(session_id)
+                state = await self.get_summary(session_id)
+                summary = state["summary"]
+
+                unsummarized = evicted[max(0, state["summarized_count"] - offset) :]
+                for chunk in self._chunks(unsummarized):
+                    summary = await self._summarize(summary, chunk)
+
+                state = {
+                    "summary": summary,
+                    "summarized_count": offset + len(evicted),
+                }
+                self._remember(session_id, state)
+                await self._persist(session_id, state)
+        except Exception as e:
+            # 실패한 구간은 다음 턴의 schedule_summary_update에서 다시 시도됨
+            print(f"Summary update failed: {e}")
+        finally:
+            self._tasks.pop(session_id, None)
+
+    def _remember(self, session_id: str, state: dict) -> None:
+        self._summaries[session_id] = state
+        self._summaries.move_to_end(session_id)
+        while len(self._summaries) > self.max_sessions:
+            self._summaries.popitem(last=False)
+
+    def _chunks(self, messages: List[Dict[str, str]]) -> List[List[Dict[str, str]]]:
+        chunks: List[List[Dict[str, str]]] = []
+        current: List[Dict[str, str]] = []
+        used = 0
+        for m in messages:
+            cost = count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS
+            if current and used + cost > self.summary_chunk_tokens:
+                chunks.append(current)
+                current, used = [], 0
+            current.append(m)
+            used += cost
+
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def _summarize(
+        self, previous_summary: str, messages: List[Dict[str, str]]
+    ) -> str:
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = (
+            f"[기존 요약]\n{previous_summary or '(없음)'}\n\n"
+            f"[이후 대화]\n{transcript}\n\n"
+            "기존 요약에 이후 대화의 내용을 합쳐 갱신된 요약만 출력하세요."
+        )
+
+        response = await self.llm.complete(
+            "summary",
+            model=self.summary_model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "당신은 인터랙티브 소설의 줄거리를 기록하는 편집자입니다.\n"
+                        "등장인물, 관계 변화, 주요 사건, 사용자의 선택, 풀리지 않은 복선을 "
+                        "빠짐없이 보존하면서 간결한 한국어 요약으로 정리하세요."
+                    ),
+                },
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0.3,
+            max_tokens=self.summary_max_tokens,
+        )
+        return response.choices[0].message.content.strip()
+
+    async def _persist(self, session_id: str, state: dict) -> None:
+        client = get_supabase_client()
+        await execute(
+            client.table("chat_summaries").upsert(
+                {
+                    "session_id": session_id,
+                    "summary": state["summary"],
+                    "summarized_count": state["summarized_count"],
+                },
+                on_conflict="session_id",
+            )
+        )
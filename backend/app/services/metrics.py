@@ -0,0 +1,294 @@
+"""
+Process-wide metrics in Prometheus text format, plus optional OpenTelemetry
+spans.
+
+Services time their work with `stage("rag.search")` (internal steps) or
+`upstream("groq", "chat.completions")` (calls leaving the process); both are
+context managers that work around awaits. LLM token usage goes through
+`record_tokens()`. Counters the services already keep (cache hits and
+misses, ...) are read at scrape time by collectors registered with
+`register_collector()` rather than counted twice.
+
+OTEL_EXPORT=console prints every span to stdout (no collector needed);
+OTEL_EXPORT=otlp ships them to the standard OTEL_EXPORTER_OTLP_* endpoint.
+Both need opentelemetry-sdk (and the OTLP exporter for otlp); without them
+only the Prometheus metrics are recorded.
+"""
+
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Seconds; covers a cache hit (ms) to an image generation (tens of seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Event-loop lag is normally well under a millisecond
+LAG_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+# (name, labels, value) rows produced by a collector at scrape time
+Sample = Tuple[str, Dict[str, str], float]
+
+Collect = Callable[[], Iterable[Sample]]
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Metrics registry instance
+metrics_registry: Optional["MetricsRegistry"] = None
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(labels, (('le', le),))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total[0]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        # name -> (type, help, collect)
+        self._collectors: Dict[str, Tuple[str, str, Collect]] = {}
+
+        self.stage_seconds = self.histogram(
+            "novelaine_stage_seconds", "Duration of internal processing stages"
+        )
+        self.upstream_seconds = self.histogram(
+            "novelaine_upstream_seconds",
+            "Duration of calls to upstream services (Groq, HuggingFace, Supabase)",
+        )
+        self.request_seconds = self.histogram(
+            "novelaine_http_request_seconds",
+            "HTTP request duration until the response starts, per route",
+        )
+        self.event_loop_lag = self.histogram(
+            "novelaine_event_loop_lag_seconds",
+            "How late the event loop woke a sleeping task",
+            LAG_BUCKETS,
+        )
+        self.llm_tokens = self.counter(
+            "novelaine_llm_tokens_total", "LLM tokens reported by response.usage"
+        )
+
+        self._tracer = _init_tracer(os.getenv("OTEL_EXPORT", "").lower())
+
+    def counter(self, name: str, help: str) -> Counter:
+        if name not in self._metrics:
+            self._metrics[name] = Counter(name, help)
+        return self._metrics[name]
+
+    def histogram(
+        self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, help, buckets)
+        return self._metrics[name]
+
+    def register_collector(
+        self,
+        name: str,
+        type: str,
+        help: str,
+        collect: Collect,
+    ) -> None:
+        """
+        `collect()` runs at every scrape; its samples are rendered under
+        `name`. Registering the same name again replaces the collector.
+        """
+        self._collectors[name] = (type, help, collect)
+
+    @contextmanager
+    def timed(self, histogram: Histogram, span_name: str, **labels) -> Iterator[None]:
+        """Observe the block's duration (outcome=ok|error|cancelled) inside a span."""
+        started = time.perf_counter()
+        outcome = "ok"
+        with ExitStack() as stack:
+            if self._tracer is not None:
+                stack.enter_context(
+                    self._tracer.start_as_current_span(
+                        span_name, attributes={k: str(v) for k, v in labels.items()}
+                    )
+                )
+            try:
+                yield
+            except (asyncio.CancelledError, GeneratorExit):
+                # Client went away / outer deadline / consumer stopped iterating:
+                # not the stage's fault
+                outcome = "cancelled"
+                raise
+            except BaseException:
+                outcome = "error"
+                raise
+            finally:
+                histogram.observe(
+                    time.perf_counter() - started, outcome=outcome, **labels
+                )
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        for name, (type, help, collect) in self._collectors.items():
+            try:
+                samples = list(collect())
+            except Exception as e:
+                print(f"Metrics collector {name} failed: {e}")
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {type}")
+            for sample_name, labels, value in samples:
+                lines.append(
+                    f"{sample_name}{_format_labels(_labels(labels))} {value:g}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+
+def stage(name: str, **labels):
+    """Time an internal step: `with stage("chat.build_messages"): ...`"""
+    registry = get_metrics()
+    return registry.timed(registry.stage_seconds, name, stage=name, **labels)
+
+
+def observe_stage(name: str, seconds: float, **labels) -> None:
+    """Record a stage measured by hand (e.g. time to first streamed token)."""
+    get_metrics().stage_seconds.observe(seconds, stage=name, outcome="ok", **labels)
+
+
+def upstream(service: str, operation: str):
+    """Time a call leaving the process: `with upstream("groq", "chat.completions"): ...`"""
+    registry = get_metrics()
+    return registry.timed(
+        registry.upstream_seconds,
+        f"{service} {operation}",
+        upstream=service,
+        operation=operation,
+    )
+
+
+def record_tokens(model: str, purpose: str, usage) -> None:
+    """Count prompt/completion tokens from a Groq `response.usage` (None is ignored)."""
+    if usage is None:
+        return
+    counter = get_metrics().llm_tokens
+    counter.inc(usage.prompt_tokens or 0, model=model, purpose=purpose, kind="prompt")
+    counter.inc(
+        usage.completion_tokens or 0, model=model, purpose=purpose, kind="completion"
+    )
+
+
+async def watch_event_loop(interval: float) -> None:
+    """
+    Sleep `interval` seconds in a loop and record how much later than that
+    the task actually resumed. Anything blocking the loop (sync I/O, heavy
+    CPU in a handler) shows up here.
+    """
+    lag = get_metrics().event_loop_lag
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag.observe(max(0.0, loop.time() - started - interval))
+
+
+def _init_tracer(exporter: str):
+    if exporter not in ("console", "otlp"):
+        return None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import (
+            BatchSpanProcessor,
+            ConsoleSpanExporter,
+        )
+
+        if exporter == "otlp":
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+                OTLPSpanExporter,
+            )
+
+            span_exporter = OTLPSpanExporter()
+        else:
+            span_exporter = ConsoleSpanExporter()
+    except ImportError as e:
+        print(f"OpenTelemetry export disabled ({e}); install opentelemetry-sdk")
+        return None
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": "novelaine-backend"})
+    )
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    return trace.get_tracer("novelaine")
+
+
+def get_metrics() -> MetricsRegistry:
+    """Get or create the metrics registry."""
+    global metrics_registry
+
+    if metrics_registry is None:
+        metrics_registry = MetricsRegistry()
+
+    return metrics_registry
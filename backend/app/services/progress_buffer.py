@@ -0,0 +1,385 @@
+"""Write-behind buffer for reader progress (user_progress)."""
+
+import asyncio
+import base64
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from postgrest.exceptions import APIError
+
+from app.services.supabase_client import get_supabase_client, execute
+
+# Progress buffer instance
+progress_buffer: Optional["ProgressBuffer"] = None
+
+PROGRESS_COLUMNS = (
+    "current_scene_id, completed_bitmap, choices_made, is_completed, last_read_at"
+)
+
+
+class ProgressBufferFull(Exception):
+    """Too many (user, story) deltas are waiting to be written; retry later."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def encode_bitmap(sequences: Iterable[int]) -> bytes:
+    """Scene sequences -> bitmap (bit n = sequence n, LSB first within a byte)."""
+    sequences = [n for n in sequences if n >= 0]
+    if not sequences:
+        return b""
+    bitmap = bytearray(max(sequences) // 8 + 1)
+    for n in sequences:
+        bitmap[n >> 3] |= 1 << (n & 7)
+    return bytes(bitmap)
+
+
+def decode_bitmap(bitmap: bytes) -> List[int]:
+    return [
+        i * 8 + bit
+        for i, byte in enumerate(bitmap)
+        if byte
+        for bit in range(8)
+        if byte & (1 << bit)
+    ]
+
+
+def parse_bytea(value: Optional[str]) -> bytes:
+    # PostgREST returns bytea as "\x<hex>"
+    if not value:
+        return b""
+    return bytes.fromhex(value[2:] if value.startswith("\\x") else value)
+
+
+class _Delta:
+    """Progress for one (user, story) not yet written to the table."""
+
+    __slots__ = (
+        "current_scene_id",
+        "completed",
+        "choices",
+        "is_completed",
+        "last_read_at",
+        "since",
+    )
+
+    def __init__(self):
+        self.current_scene_id: Optional[str] = None
+        self.completed: set = set()
+        self.choices: Dict[str, str] = {}
+        self.is_completed = False
+        self.last_read_at: Optional[str] = None
+        self.since = time.monotonic()
+
+    def absorb(self, other: "_Delta") -> None:
+        """Fold an older delta (e.g. a failed flush) in under this one."""
+        self.current_scene_id = self.current_scene_id or other.current_scene_id
+        self.completed |= other.completed
+        self.choices = {**other.choices, **self.choices}
+        self.is_completed = self.is_completed or other.is_completed
+        self.last_read_at = max(
+            filter(None, (self.last_read_at, other.last_read_at)), default=None
+        )
+        self.since = min(self.since, other.since)
+
+    def to_row(self, user_id: str, story_id: str) -> dict:
+        return {
+            "user_id": user_id,
+            "story_id": story_id,
+            "current_scene_id": self.current_scene_id,
+            "completed": base64.b64encode(encode_bitmap(self.completed)).decode(),
+            "choices": self.choices,
+            "is_completed": self.is_completed,
+            "last_read_at": self.last_read_at,
+        }
+
+
+class ProgressBuffer:
+    """
+    Page turns are the hottest write path, so they never touch the database
+    directly. record() folds each event into a per-(user, story) delta in
+    memory; a worker flushes all dirty deltas every `flush_interval` seconds
+    (or sooner once `max_pending` keys are dirty) with one
+    merge_user_progress RPC per `batch_size` keys. The RPC ORs the
+    completed-scene bitmap into the stored one, so a flush writes a few
+    bytes however long the story is. Reads merge whatever is still buffered.
+
+    A batch the database rejects is split in halves until the offending row
+    is found; that row is dropped and the rest written. Connection failures
+    keep the whole batch for the next tick. New keys are refused once
+    `max_buffered` are waiting (updates to buffered keys still coalesce).
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = 2.0,
+        batch_size: int = 500,
+        max_pending: int = 5000,
+        max_buffered: int = 50000,
+        known_users_size: int = 10000,
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_buffered = max_buffered
+        self.known_users_size = known_users_size
+
+        self._pending: Dict[Tuple[str, str], _Delta] = {}
+        # Taken for a flush that hasn't committed yet (still visible to reads)
+        self._inflight: Dict[Tuple[str, str], _Delta] = {}
+        # User ids seen in the users table (LRU), so validation is one read per user
+        self._known_users: "OrderedDict[str, None]" = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.last_flush_seconds = 0.0
+        self.last_lag_seconds = 0.0
+
+    def record(
+        self,
+        user_id: str,
+        story_id: str,
+        scene_id: str,
+        sequence: int,
+        choice_id: Optional[str] = None,
+        is_completed: bool = False,
+    ) -> None:
+        """
+        Reader reached `scene_id` (and optionally picked `choice_id` there).
+        Raises ProgressBufferFull if this would buffer one key too many.
+        """
+        key = (str(user_id), str(story_id))
+        delta = self._pending.get(key)
+        if delta is None:
+            if len(self._pending) >= self.max_buffered:
+                self.rejected += 1
+                self._wakeup.set()
+                raise ProgressBufferFull(
+                    f"Progress buffer is full ({len(self._pending)} waiting)",
+                    retry_after=self.flush_interval,
+                )
+            delta = self._pending[key] = _Delta()
+
+        delta.current_scene_id = str(scene_id)
+        delta.completed.add(sequence)
+        if choice_id:
+            delta.choices[str(scene_id)] = str(choice_id)
+        delta.is_completed = delta.is_completed or is_completed
+        delta.last_read_at = datetime.now(timezone.utc).isoformat()
+        self.recorded += 1
+
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def forget_sequence(self, story_id: str, sequence: int) -> None:
+        """
+        A scene of the story was deleted: drop its bit from buffered deltas so
+        a later flush doesn't mark whatever scene takes the sequence next as
+        read (the stored bits are cleared by a trigger on scenes).
+        """
+        story_id = str(story_id)
+        for buffered in (self._pending, self._inflight):
+            for (_, key_story_id), delta in buffered.items():
+                if key_story_id == story_id:
+                    delta.completed.discard(sequence)
+
+    async def user_exists(self, user_id: str) -> bool:
+        """Whether `user_id` is a user (positive answers are cached)."""
+        user_id = str(user_id)
+        if user_id in self._known_users:
+            self._known_users.move_to_end(user_id)
+            return True
+
+        client = get_supabase_client()
+        response = await execute(
+            client.table("users").select("id").eq("id", user_id).limit(1)
+        )
+        if not response.data:
+            return False
+
+        self._known_users[user_id] = None
+        while len(self._known_users) > self.known_users_size:
+            self._known_users.popitem(last=False)
+        return True
+
+    async def get(self, user_id: str, story_id: str) -> Optional[dict]:
+        """Stored progress with buffered updates merged in (None if there is none)."""
+        key = (str(user_id), str(story_id))
+        # Taken before the read: a flush committing meanwhile is then counted
+        # twice at worst, which the merge below tolerates
+        buffered = [d for d in (self._inflight.get(key), self._pending.get(key)) if d]
+
+        client = get_supabase_client()
+        response = await execute(
+            client.table("user_progress")
+            .select(PROGRESS_COLUMNS)
+            .eq("user_id", key[0])
+            .eq("story_id", key[1])
+            .limit(1)
+        )
+
+        stored = response.data[0] if response.data else None
+        if stored is None and not buffered:
+            return None
+
+        stored = stored or {}
+        completed = set(decode_bitmap(parse_bytea(stored.get("completed_bitmap"))))
+        progress = {
+            "current_scene_id": stored.get("current_scene_id"),
+            "choices_made": dict(stored.get("choices_made") or {}),
+            "is_completed": bool(stored.get("is_completed")),
+            "last_read_at": stored.get("last_read_at"),
+        }
+        # Oldest first: in-flight, then pending
+        for delta in buffered:
+            completed |= delta.completed
+            progress["current_scene_id"] = delta.current_scene_id
+            progress["choices_made"].update(delta.choices)
+            progress["is_completed"] = progress["is_completed"] or delta.is_completed
+            progress["last_read_at"] = delta.last_read_at
+
+        progress["completed_sequences"] = sorted(completed)
+        progress["completed_count"] = len(completed)
+        progress["buffered"] = bool(buffered)
+        return progress
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            # Fresh event per start: an Event is bound to the loop it first waited on
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the worker after flushing everything buffered."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+        # Shutdown: one last attempt for what's left
+        await self.flush()
+        if self._pending:
+            print(f"Progress flush at shutdown lost {len(self._pending)} updates")
+
+    async def flush(self) -> None:
+        """Write every dirty (user, story) now, `batch_size` per RPC."""
+        keys = list(self._pending)
+        for start in range(0, len(keys), self.batch_size):
+            if not await self._flush_batch(keys[start : start + self.batch_size]):
+                # Leave the rest for the next tick instead of hammering a failing DB
+                return
+
+    async def _flush_batch(self, keys: List[Tuple[str, str]]) -> bool:
+        batch = {key: self._pending.pop(key) for key in keys}
+        self._inflight.update(batch)
+        started = time.monotonic()
+
+        try:
+            dropped = await self._write(batch)
+        except Exception as e:
+            # Put it back under anything recorded meanwhile; retried next tick
+            self.failed += len(batch)
+            for key, delta in batch.items():
+                newer = self._pending.get(key)
+                if newer is not None:
+                    newer.absorb(delta)
+                else:
+                    self._pending[key] = delta
+            print(f"Progress flush failed ({len(batch)} rows): {e}")
+            return False
+        finally:
+            for key in batch:
+                self._inflight.pop(key, None)
+
+        self.written += len(batch) - dropped
+        self.batches += 1
+        self.last_flush_seconds = time.monotonic() - started
+        self.last_lag_seconds = started - min(delta.since for delta in batch.values())
+        return True
+
+    async def _write(self, batch: Dict[Tuple[str, str], _Delta]) -> int:
+        """
+        One merge_user_progress RPC for the batch. If the database rejects it,
+        write each half separately so one bad row can't hold back the others;
+        a single rejected row is dropped. Returns the number of rows dropped.
+        """
+        try:
+            client = get_supabase_client()
+            await execute(
+                client.rpc(
+                    "merge_user_progress",
+                    {"updates": [delta.to_row(*key) for key, delta in batch.items()]},
+                )
+            )
+            return 0
+        except APIError as e:
+            if len(batch) == 1:
+                key = next(iter(batch))
+                self.dropped += 1
+                print(f"Progress row rejected, dropped {key}: {e}")
+                return 1
+
+        items = list(batch.items())
+        middle = len(items) // 2
+        return await self._write(dict(items[:middle])) + await self._write(
+            dict(items[middle:])
+        )
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "inflight": len(self._inflight),
+            "recorded": self.recorded,
+            "written": self.written,
+            # Page turns absorbed by coalescing instead of becoming writes
+            "coalesced": self.recorded
+            - self.written
+            - self.dropped
+            - len(self._pending)
+            - len(self._inflight),
+            "batches": self.batches,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "last_flush_seconds": round(self.last_flush_seconds, 3),
+            "last_lag_seconds": round(self.last_lag_seconds, 3),
+        }
+
+
+def get_progress_buffer() -> ProgressBuffer:
+    """Get or create the progress buffer."""
+    global progress_buffer
+
+    if progress_buffer is None:
+        progress_buffer = ProgressBuffer(
+            flush_interval=float(os.getenv("PROGRESS_FLUSH_INTERVAL", "2")),
+            batch_size=int(os.getenv("PROGRESS_BATCH_SIZE", "500")),
+            max_pending=int(os.getenv("PROGRESS_MAX_PENDING", "5000")),
+            max_buffered=int(os.getenv("PROGRESS_MAX_BUFFERED", "50000")),
+        )
+
+    return progress_buffer
@@ -1,61 +1,251 @@
+import asyncio
 import os
-from huggingface_hub import AsyncInferenceClient
-from app.services.supabase_client import get_supabase_client
-from typing import List
+import time
+from collections import OrderedDict
+
+from app.services.supabase_client import (
+    execute,
+    get_rag_executor,
+    get_rag_supabase_client,
+)
+from app.services.embedding_cache import get_embedding_cache
+from app.services.embedding_backend import get_embedding_backend
+from app.services.vector_index import get_story_vector_index
+from app.services.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    StageTimer,
+)
+from typing import List, Optional
 
 class RagService:
     def __init__(self):
-        # HuggingFace Inference API (Free Tier or Pro)
+        # Local CPU model or HuggingFace Inference API (see embedding_backend.py)
         # using 'sentence-transformers/all-MiniLM-L6-v2' which is standard for RAG
-        self.api_key = os.getenv("HF_TOKEN")
-        self.client = AsyncInferenceClient(token=self.api_key)
-        self.supabase = get_supabase_client()
-        self.model_id = "sentence-transformers/all-MiniLM-L6-v2"
+        self.backend = get_embedding_backend()
+        self.model_id = self.backend.model_id
+        self.cache = get_embedding_cache()
+        self.story_index = get_story_vector_index()
+
+        # RAG is optional enrichment: it gets a latency budget, never the whole turn
+        self.timeout = float(os.getenv("RAG_TIMEOUT", "1.0"))
+        self.embedding_timeout = float(os.getenv("RAG_EMBEDDING_TIMEOUT", "0.7"))
+        self.search_timeout = float(os.getenv("RAG_SEARCH_TIMEOUT", "0.5"))
+        failure_threshold = int(os.getenv("RAG_BREAKER_FAILURES", "5"))
+        reset_timeout = float(os.getenv("RAG_BREAKER_RESET", "30"))
+        self.embedding_breaker = CircuitBreaker(
+            "embedding", failure_threshold, reset_timeout
+        )
+        self.search_breaker = CircuitBreaker("search", failure_threshold, reset_timeout)
+        self.timers = {
+            "embedding": StageTimer(name="rag.embedding"),
+            "search": StageTimer(name="rag.search"),
+            "total": StageTimer(name="rag.total"),
+        }
+
+        # Last good retrieval per session/story, served when RAG is skipped or fails
+        self.max_fallbacks = int(os.getenv("RAG_FALLBACK_SIZE", "1000"))
+        self._last_good: "OrderedDict[str, str]" = OrderedDict()
+        self.fallbacks_served = 0
+
+    # 전용 클라이언트/스레드 풀: 시간 초과된 쿼리가 공용 풀을 점유하지 않도록.
+    # 앱 종료 시 닫히고 새로 만들어지므로 호출할 때마다 가져옴
+    @property
+    def supabase(self):
+        return get_rag_supabase_client(timeout=self.search_timeout)
+
+    @property
+    def executor(self):
+        return get_rag_executor()
 
     async def generate_embedding(self, text: str) -> List[float]:
         """
-        Generate embeddings using HuggingFace Feature Extraction API.
+        Generate embeddings with the configured embedding backend.
+        Repeated (normalized-identical) queries are served from the embedding cache.
         """
+        cached = await self.cache.get(self.model_id, text)
+        if cached is not None:
+            return cached
+
         try:
-            # feature_extraction returns a list of floats (embedding)
-            embedding = await self.client.feature_extraction(text, model=self.model_id)
-            # The API might return a list of lists or a single list depending on input
-            # We assume single input, so we expect a 1D array (list of floats)
-            # Ensure elements are native Python floats for JSON serialization
-            return [float(x) for x in embedding]
+            vector = await self.backend.embed(text)
+            await self.cache.set(self.model_id, text, vector)
+            return vector
         except Exception as e:
             print(f"Embedding generation failed: {e}")
             return []
 
-    async def search_relevant_context(self, query: str, threshold: float = 0.4, limit: int = 3) -> str:
+    async def search_relevant_context(
+        self,
+        query: str,
+        threshold: float = 0.4,
+        limit: int = 3,
+        story_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> str:
         """
-        Search for relevant context in Supabase.
+        Search for relevant context within the RAG latency budget.
+        Stories resident in the in-process vector index are answered locally;
+        everything else goes through the Supabase RPC. On timeout, failure or
+        an open circuit, the last good result for the session/story is served
+        (or nothing).
         """
-        embedding = await self.generate_embedding(query)
-        
-        if not embedding:
-            return ""
-
+        started = time.monotonic()
         try:
-            # Call Supabase RPC
-            response = self.supabase.rpc(
-                "search_similar_characters",
-                {
-                    "query_embedding": embedding,
-                    "match_threshold": threshold,
-                    "match_count": limit
-                }
-            ).execute()
-            
-            if not response.data:
-                return ""
-
-            context_text = "\n[관련 캐릭터 기억]\n"
-            for item in response.data:
-                context_text += f"- {item['name']}: {item['description']}\n"
-            
-            return context_text
-            
+            context = await asyncio.wait_for(
+                self._search(query, threshold, limit, story_id), self.timeout
+            )
+        except asyncio.TimeoutError:
+            self.timers["total"].record(time.monotonic() - started, outcome="timeout")
+            print("RAG Search timed out, serving last good result")
+            return self._fallback(session_id, story_id)
+        except CircuitOpenError:
+            # Upstream known to be unhealthy: skip RAG without paying for it
+            return self._fallback(session_id, story_id)
         except Exception as e:
+            self.timers["total"].record(time.monotonic() - started, outcome="error")
             print(f"RAG Search failed: {e}")
-            return ""
+            return self._fallback(session_id, story_id)
+
+        self.timers["total"].record(time.monotonic() - started)
+        self._remember(session_id, story_id, context)
+        return context
+
+    async def character_context(
+        self,
+        characters: List[dict],
+        story_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> str:
+        """
+        Context for characters the user named directly: their cards are
+        fetched by id (no embedding, no vector search). If the lookup fails
+        the matcher's name/description cards are used as they are.
+        """
+        ids = [str(character["id"]) for character in characters]
+        started = time.monotonic()
+        try:
+            response = await self.search_breaker.call(
+                execute(
+                    self.supabase.table("characters")
+                    .select(
+                        "id, name, description, personality_traits, "
+                        "appearance_description"
+                    )
+                    .in_("id", ids),
+                    executor=self.executor,
+                ),
+                timeout=self.search_timeout,
+                timer=self.timers["search"],
+            )
+            by_id = {str(row["id"]): row for row in response.data or []}
+            cards = [by_id[i] for i in ids if i in by_id]
+            self.timers["total"].record(time.monotonic() - started)
+        except Exception as e:
+            if not isinstance(e, CircuitOpenError):
+                print(f"Character card lookup failed: {e}")
+            cards = characters
+
+        context_text = _format_context(cards)
+        self._remember(session_id, story_id, context_text)
+        return context_text
+
+    def stats(self) -> dict:
+        return {
+            "breakers": {
+                "embedding": self.embedding_breaker.stats(),
+                "search": self.search_breaker.stats(),
+            },
+            "stages": {name: timer.stats() for name, timer in self.timers.items()},
+            "deadlines_ms": {
+                "total": self.timeout * 1000,
+                "embedding": self.embedding_timeout * 1000,
+                "search": self.search_timeout * 1000,
+            },
+            "fallbacks_served": self.fallbacks_served,
+            "fallback_entries": len(self._last_good),
+        }
+
+    async def _search(
+        self, query: str, threshold: float, limit: int, story_id: Optional[str]
+    ) -> str:
+        """Raises on failure so the caller can fall back."""
+        embedding = await self.cache.get(self.model_id, query)
+        if embedding is None:
+            embedding = await self.embedding_breaker.call(
+                self.backend.embed(query),
+                timeout=self.embedding_timeout,
+                timer=self.timers["embedding"],
+            )
+            await self.cache.set(self.model_id, query, embedding)
+
+        matches = None
+        if story_id and self.story_index is not None:
+            matches = self.story_index.search(story_id, embedding, threshold, limit)
+            if matches is None:
+                # Not resident yet: load in the background, use the RPC this time
+                self.story_index.schedule_load(story_id)
+
+        if matches is None:
+            # Call Supabase RPC
+            response = await self.search_breaker.call(
+                execute(
+                    self.supabase.rpc(
+                        "search_similar_characters",
+                        {
+                            "query_embedding": embedding,
+                            "match_threshold": threshold,
+                            "match_count": limit
+                        }
+                    ),
+                    executor=self.executor,
+                ),
+                timeout=self.search_timeout,
+                timer=self.timers["search"],
+            )
+            matches = response.data
+
+        return _format_context(matches)
+
+    def _remember(
+        self, session_id: Optional[str], story_id: Optional[str], context: str
+    ) -> None:
+        if not context:
+            return
+        for key in _fallback_keys(session_id, story_id):
+            self._last_good[key] = context
+            self._last_good.move_to_end(key)
+        while len(self._last_good) > self.max_fallbacks:
+            self._last_good.popitem(last=False)
+
+    def _fallback(self, session_id: Optional[str], story_id: Optional[str]) -> str:
+        for key in _fallback_keys(session_id, story_id):
+            context = self._last_good.get(key)
+            if context:
+                self.fallbacks_served += 1
+                return context
+        return ""
+
+
+def _format_context(characters: List[dict]) -> str:
+    if not characters:
+        return ""
+
+    context_text = "\n[관련 캐릭터 기억]\n"
+    for item in characters:
+        context_text += f"- {item['name']}: {item['description']}\n"
+        if item.get("personality_traits"):
+            context_text += f"  성격: {', '.join(item['personality_traits'])}\n"
+        if item.get("appearance_description"):
+            context_text += f"  외모: {item['appearance_description']}\n"
+
+    return context_text
+
+
+def _fallback_keys(session_id: Optional[str], story_id: Optional[str]) -> List[str]:
+    keys = []
+    if session_id:
+        keys.append(f"session:{session_id}")
+    if story_id:
+        keys.append(f"story:{story_id}")
+    return keys
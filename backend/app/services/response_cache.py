@@ -0,0 +1,236 @@
+"""Read-through cache of serialized single-resource responses (story, scene, character)."""
+
+import gzip
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# (resource, id), e.g. ("scene", "<uuid>")
+Key = Tuple[str, str]
+
+# Response cache instance
+response_cache: Optional["ResponseCache"] = None
+
+
+class CachedResponse:
+    """
+    One serialized response body with its strong ETag. Compressed variants
+    are produced on first request for that encoding and kept with the entry;
+    each gets its own ETag (suffixed with the encoding), since a strong ETag
+    names one exact byte sequence.
+    """
+
+    def __init__(self, data: dict, body: bytes, compress_min_bytes: int = 1024):
+        self.data = data
+        self.body = body
+        self.compress_min_bytes = compress_min_bytes
+        self.etag = _etag(data, body)
+        self._encoded: Dict[str, bytes] = {}
+
+    def content_encoding(self, encoding: Optional[str]) -> Optional[str]:
+        """The encoding actually used for a negotiated one (None if too small to bother)."""
+        if encoding is None or len(self.body) < self.compress_min_bytes:
+            return None
+        return encoding
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """ETag of the representation sent for `encoding` (see content_encoding)."""
+        encoding = self.content_encoding(encoding)
+        if encoding is None:
+            return self.etag
+        return f'{self.etag[:-1]}-{encoding}"'
+
+    def encoded(self, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """Body for the negotiated encoding, or the plain body if too small to bother."""
+        encoding = self.content_encoding(encoding)
+        if encoding is None:
+            return self.body, None
+
+        if encoding not in self._encoded:
+            if encoding == "br":
+                self._encoded[encoding] = brotli.compress(self.body, quality=5)
+            else:
+                # mtime=0: identical bytes for identical bodies
+                self._encoded[encoding] = gzip.compress(self.body, 6, mtime=0)
+        return self._encoded[encoding], encoding
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(body) for body in self._encoded.values())
+
+
+class ResponseCache:
+    """
+    LRU (`max_entries`) + TTL cache of CachedResponse per (resource, id) and
+    projection variant (the fields a request selected). Writers invalidate
+    explicitly, which drops every variant. An entry can also be tagged with
+    other keys it embeds (a story with its characters, a scene with its
+    story's scene set) so invalidating those drops it too.
+
+    Invalidations are remembered for `ttl_seconds`, long enough for any load
+    that raced them to try its put(); older records are pruned.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2000,
+        ttl_seconds: float = 300,
+        compress_min_bytes: int = 1024,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.compress_min_bytes = compress_min_bytes
+
+        # (resource, id, variant) -> (stored_at, response, tags)
+        self._entries: "OrderedDict[tuple, Tuple[float, CachedResponse, tuple]]" = (
+            OrderedDict()
+        )
+        # tag -> entries that embed it (each entry is also tagged with its own key)
+        self._tagged: Dict[Key, Set[tuple]] = defaultdict(set)
+        # Invalidation counter; generation() hands out its current value, and
+        # a key's record says when it was last invalidated, so a load that
+        # raced a write isn't stored
+        self._clock = 0
+        # key -> (clock, monotonic time) of its last invalidation, oldest first
+        self._generations: "OrderedDict[Key, Tuple[int, float]]" = OrderedDict()
+        # Highest clock among pruned records
+        self._pruned_through = 0
+
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+        self.not_modified = 0
+
+    def get(self, key: Key, variant: str = "") -> Optional[CachedResponse]:
+        entry_key = key + (variant,)
+        entry = self._entries.get(entry_key)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+            self._entries.move_to_end(entry_key)
+            self.hits[key[0]] += 1
+            return entry[1]
+
+        if entry is not None:
+            self._drop(entry_key)
+        self.misses[key[0]] += 1
+        return None
+
+    def generation(self, key: Key) -> int:
+        """Token for put(): read it before loading `key`."""
+        return self._clock
+
+    def put(
+        self,
+        key: Key,
+        variant: str,
+        response: CachedResponse,
+        generation: int,
+        tags: Iterable[Key] = (),
+    ) -> None:
+        """
+        Store `response` unless `key` or one of its tags was invalidated since
+        `generation` was read.
+        """
+        if generation < self._pruned_through:
+            # Older than the invalidations we still remember: can't tell
+            return
+        tags = (key,) + tuple(tags)
+        for tag in tags:
+            invalidated = self._generations.get(tag)
+            if invalidated is not None and invalidated[0] > generation:
+                return
+
+        entry_key = key + (variant,)
+        self._drop(entry_key)
+        self._entries[entry_key] = (time.monotonic(), response, tags)
+        for tag in tags:
+            self._tagged[tag].add(entry_key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, resource: str, resource_id: str) -> None:
+        """Drop every variant of (resource, id) and every entry tagged with it."""
+        key = (resource, str(resource_id))
+        self._clock += 1
+        self._bump(key)
+        for entry_key in list(self._tagged.pop(key, ())):
+            base = entry_key[:2]
+            if base != key:
+                self._bump(base)
+            self._drop(entry_key)
+        self._prune_generations()
+
+    def _bump(self, key: Key) -> None:
+        self._generations[key] = (self._clock, time.monotonic())
+        self._generations.move_to_end(key)
+
+    def _prune_generations(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._generations:
+            key, (clock, invalidated_at) = next(iter(self._generations.items()))
+            if invalidated_at >= cutoff:
+                break
+            del self._generations[key]
+            self._pruned_through = max(self._pruned_through, clock)
+
+    def _drop(self, entry_key: tuple) -> None:
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(entry_key)
+                if not keys:
+                    del self._tagged[tag]
+
+    def stats(self) -> dict:
+        resources = sorted(set(self.hits) | set(self.misses))
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "invalidations_tracked": len(self._generations),
+            "bytes": sum(entry[1].size for entry in self._entries.values()),
+            "not_modified": self.not_modified,
+            "brotli": brotli is not None,
+            "resources": {
+                resource: {
+                    "hits": self.hits[resource],
+                    "misses": self.misses[resource],
+                    "hit_ratio": round(
+                        self.hits[resource]
+                        / max(1, self.hits[resource] + self.misses[resource]),
+                        3,
+                    ),
+                }
+                for resource in resources
+            },
+        }
+
+
+def _etag(data: dict, body: bytes) -> str:
+    # updated_at names the row version; the digest covers embedded rows
+    # (a story's characters, a scene's choices) that don't bump it
+    version = re.sub(r"\D", "", str(data.get("updated_at") or ""))
+    digest = hashlib.sha256(body).hexdigest()[:16]
+    return f'"{version}-{digest}"' if version else f'"{digest}"'
+
+
+def get_response_cache() -> ResponseCache:
+    """Get or create the response cache."""
+    global response_cache
+
+    if response_cache is None:
+        response_cache = ResponseCache(
+            max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "2000")),
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+            compress_min_bytes=int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024")),
+        )
+
+    return response_cache
@@ -0,0 +1,317 @@
+"""Next-scene generation with optional speculative pre-generation per choice."""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from app.services.supabase_client import get_supabase_client, execute
+from app.services.llm_scheduler import get_llm_scheduler
+from app.services.memory_service import count_message_tokens
+
+# Scene generator instance
+scene_generator: Optional["SceneGenerator"] = None
+
+
+class _Draft:
+    """A continuation generated ahead of the reader's choice."""
+
+    def __init__(
+        self, story_id: str, scene_id: str, content: str, tokens: int, latency: float
+    ):
+        self.story_id = story_id
+        self.scene_id = scene_id
+        self.content = content
+        self.tokens = tokens
+        # seconds the generation took (what a hit saves the reader)
+        self.latency = latency
+        self.created_at = time.monotonic()
+
+
+class SceneGenerator:
+    """
+    Writes the scene that follows a choice. With speculation enabled, serving
+    a choice scene starts drafting a continuation for each of its choices in
+    the background (bounded by `concurrency` and a rolling token budget).
+    Selecting a choice takes its draft (or awaits the in-flight draft for at
+    most `wait_seconds`, then writes the scene itself) and discards the
+    siblings; drafts expire after `ttl_seconds` and are dropped whenever their
+    story changes.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        concurrency: int = 2,
+        max_choices: int = 4,
+        token_budget_per_minute: int = 20000,
+        ttl_seconds: float = 600,
+        wait_seconds: float = 5.0,
+        model_id: str = "llama-3.3-70b-versatile",
+    ):
+        self.enabled = enabled
+        self.max_choices = max_choices
+        self.token_budget_per_minute = token_budget_per_minute
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+        self.model_id = model_id
+        self.llm = get_llm_scheduler()
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        # choice_id -> ready draft / in-flight draft task
+        self._drafts: Dict[str, _Draft] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # choice_id -> (story_id, scene_id) for drafts and tasks
+        self._owners: Dict[str, tuple] = {}
+        # choice_id -> prompt tokens of a draft whose LLM call is under way
+        self._prompt_tokens: Dict[str, int] = {}
+        # (timestamp, tokens) of recent speculative generations
+        self._spent: deque = deque()
+
+        self.prefetched = 0
+        self.skipped_budget = 0
+        self.hits = 0
+        self.misses = 0
+        self.wait_timeouts = 0
+        self.wasted_tokens = 0
+        self.latency_saved = 0.0
+
+    async def generate_next(
+        self, story: dict, scene: dict, choice: dict, purpose: str = "scene"
+    ) -> dict:
+        """
+        Generate the scene that follows `choice`. Returns content, tokens, latency.
+        `purpose` picks the scheduler priority and labels the token metrics
+        ("speculative" for drafts, which queue behind readers' requests).
+        """
+        started = time.monotonic()
+        response = await self.llm.complete(
+            purpose,
+            model=self.model_id,
+            messages=_continuation_messages(story, scene, choice),
+            temperature=0.8,
+            max_tokens=800,
+        )
+        return {
+            "content": response.choices[0].message.content,
+            "tokens": response.usage.total_tokens if response.usage else 0,
+            "latency": time.monotonic() - started,
+        }
+
+    def prefetch(self, story_id: str, scene: dict, choices: List[dict]) -> None:
+        """Start drafting continuations for a served scene's open choices."""
+        if not self.enabled:
+            return
+
+        story_id = str(story_id)
+        self._expire()
+        for choice in choices[: self.max_choices]:
+            choice_id = str(choice["id"])
+            if (
+                choice.get("next_scene_id")
+                or choice_id in self._drafts
+                or choice_id in self._tasks
+            ):
+                continue
+            if self._spent_last_minute() >= self.token_budget_per_minute:
+                self.skipped_budget += 1
+                return
+
+            self._owners[choice_id] = (story_id, str(scene["id"]))
+            task = asyncio.create_task(self._draft(story_id, scene, choice))
+            self._tasks[choice_id] = task
+            task.add_done_callback(
+                lambda t, choice_id=choice_id: (
+                    self._tasks.pop(choice_id)
+                    if self._tasks.get(choice_id) is t
+                    else None
+                )
+            )
+            self.prefetched += 1
+
+    async def take(self, choice_id: str) -> Optional[dict]:
+        """
+        The draft for a selected choice (awaiting it if still generating), or
+        None. Sibling drafts of the same scene are discarded.
+        """
+        if not self.enabled:
+            return None
+
+        choice_id = str(choice_id)
+        owner = self._owners.get(choice_id)
+        if owner is None:
+            self.misses += 1
+            return None
+
+        waited_from = time.monotonic()
+        draft = self._drafts.get(choice_id)
+        task = self._tasks.get(choice_id)
+        if draft is None and task is not None:
+            done, _ = await asyncio.wait([task], timeout=self.wait_seconds)
+            if done:
+                draft = None if task.cancelled() else task.result()
+            else:
+                # Still queued or generating: the caller writes the scene itself
+                self.wait_timeouts += 1
+                self._discard(choice_id)
+        waited = time.monotonic() - waited_from
+
+        self._discard_scene(owner[1], keep=choice_id)
+        self._drafts.pop(choice_id, None)
+        self._owners.pop(choice_id, None)
+
+        if draft is None or self._is_stale(draft):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.latency_saved += max(0.0, draft.latency - waited)
+        return {"content": draft.content, "tokens": draft.tokens}
+
+    def invalidate_story(self, story_id: str) -> None:
+        """Drop every draft (and in-flight draft) of a story that changed."""
+        story_id = str(story_id)
+        for choice_id, owner in list(self._owners.items()):
+            if owner[0] == story_id:
+                self._discard(choice_id)
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        served = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "prefetched": self.prefetched,
+            "skipped_budget": self.skipped_budget,
+            "in_flight": len(self._tasks),
+            "drafts": len(self._drafts),
+            "hits": self.hits,
+            "misses": self.misses,
+            "wait_timeouts": self.wait_timeouts,
+            "hit_rate": self.hits / served if served else 0.0,
+            "wasted_tokens": self.wasted_tokens,
+            "tokens_last_minute": self._spent_last_minute(),
+            "latency_saved_seconds": round(self.latency_saved, 3),
+        }
+
+    async def _draft(
+        self, story_id: str, scene: dict, choice: dict
+    ) -> Optional[_Draft]:
+        async with self._semaphore:
+            try:
+                client = get_supabase_client()
+                story_response = await execute(
+                    client.table("stories")
+                    .select("title, genre, description")
+                    .eq("id", story_id)
+                    .single()
+                )
+                self._prompt_tokens[str(choice["id"])] = count_message_tokens(
+                    _continuation_messages(story_response.data, scene, choice)
+                )
+                result = await self.generate_next(
+                    story_response.data, scene, choice, purpose="speculative"
+                )
+            except Exception as e:
+                print(f"Speculative generation failed: {e}")
+                self._owners.pop(str(choice["id"]), None)
+                return None
+            finally:
+                self._prompt_tokens.pop(str(choice["id"]), None)
+
+        self._spent.append((time.monotonic(), result["tokens"]))
+        draft = _Draft(
+            story_id,
+            str(scene["id"]),
+            result["content"],
+            result["tokens"],
+            result["latency"],
+        )
+        self._drafts[str(choice["id"])] = draft
+        return draft
+
+    def _discard_scene(self, scene_id: str, keep: Optional[str] = None) -> None:
+        for choice_id, owner in list(self._owners.items()):
+            if owner[1] == scene_id and choice_id != keep:
+                self._discard(choice_id)
+
+    def _discard(self, choice_id: str) -> None:
+        task = self._tasks.pop(choice_id, None)
+        if task is not None and not task.done():
+            # The prompt is billed once the call is under way; the partial
+            # completion of a cancelled call is not reported, so it is not counted
+            self.wasted_tokens += self._prompt_tokens.get(choice_id, 0)
+            task.cancel()
+
+        draft = self._drafts.pop(choice_id, None)
+        if draft is not None:
+            self.wasted_tokens += draft.tokens
+        self._owners.pop(choice_id, None)
+
+    def _expire(self) -> None:
+        for choice_id, draft in list(self._drafts.items()):
+            if self._is_stale(draft):
+                self._discard(choice_id)
+
+    def _is_stale(self, draft: _Draft) -> bool:
+        return time.monotonic() - draft.created_at > self.ttl_seconds
+
+    def _spent_last_minute(self) -> int:
+        cutoff = time.monotonic() - 60
+        while self._spent and self._spent[0][0] < cutoff:
+            self._spent.popleft()
+        return sum(tokens for _, tokens in self._spent)
+
+
+def _continuation_messages(story: dict, scene: dict, choice: dict) -> List[dict]:
+    return [
+        {
+            "role": "system",
+            "content": (
+                "당신은 몰입형 인터랙티브 스토리텔링 플랫폼 'NovelAIne'의 AI 스토리텔러입니다.\n"
+                "독자가 고른 선택지에 이어지는 다음 장면을 소설처럼 서술적으로 작성하세요.\n"
+                "장면 본문만 출력하세요."
+            ),
+        },
+        {
+            "role": "user",
+            "content": _continuation_prompt(story, scene, choice),
+        },
+    ]
+
+
+def _continuation_prompt(story: dict, scene: dict, choice: dict) -> str:
+    parts = [
+        f"[작품] {story.get('title', '')} ({story.get('genre') or '장르 미정'})",
+    ]
+    if story.get("description"):
+        parts.append(f"[줄거리] {story['description']}")
+    parts.append(f"[현재 장면]\n{scene['content']}")
+    parts.append(f"[독자의 선택] {choice['text']}")
+    if choice.get("consequence_summary"):
+        parts.append(f"[선택의 결과] {choice['consequence_summary']}")
+    return "\n\n".join(parts)
+
+
+def get_scene_generator() -> SceneGenerator:
+    """Get or create the scene generator (speculation opt-in: SPECULATIVE_GENERATION=1)."""
+    global scene_generator
+
+    if scene_generator is None:
+        scene_generator = SceneGenerator(
+            enabled=os.getenv("SPECULATIVE_GENERATION") == "1",
+            concurrency=int(os.getenv("SPECULATIVE_CONCURRENCY", "2")),
+            max_choices=int(os.getenv("SPECULATIVE_MAX_CHOICES", "4")),
+            token_budget_per_minute=int(
+                os.getenv("SPECULATIVE_TOKENS_PER_MINUTE", "20000")
+            ),
+            ttl_seconds=float(os.getenv("SPECULATIVE_TTL", "600")),
+            wait_seconds=float(os.getenv("SPECULATIVE_WAIT", "5")),
+        )
+
+    return scene_generator
@@ -0,0 +1,108 @@
+"""Scene emotion/importance scoring with weighted, per-genre lexicons."""
+
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+from app.services.text_matcher import AhoCorasick
+
+DEFAULT_LEXICON_PATH = os.path.join(
+    os.path.dirname(__file__), "lexicons", "scene_scoring.json"
+)
+
+DIMENSIONS = ("emotion", "importance")
+
+# Scoring engine instance
+scoring_engine: Optional["ScoringEngine"] = None
+
+
+class ScoringEngine:
+    """
+    Lexicons (see lexicons/scene_scoring.json) map terms to weights per
+    dimension; a genre's terms are merged over the defaults. Each genre is
+    compiled once into a single Aho-Corasick automaton, so scoring a scene is
+    one pass over its text regardless of lexicon size. Terms match as
+    substrings, so inflections count ("deaths", "decisions"). A dimension's
+    score is the summed weight of the distinct terms found, divided by its
+    normalization constant and capped at 1.
+    """
+
+    def __init__(self, config: dict):
+        self.normalization = config.get("normalization", {})
+        self.thresholds = config["thresholds"]
+        self._default = config.get("default", {})
+        self._genres = config.get("genres", {})
+        self._automata: Dict[Optional[str], AhoCorasick] = {}
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_LEXICON_PATH) -> "ScoringEngine":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def score(self, content: str, genre: Optional[str] = None) -> dict:
+        """Scores plus the image/BGM generation flags for one scene."""
+        weights = {dimension: 0.0 for dimension in DIMENSIONS}
+        seen = set()
+        automaton = self._automaton(genre)
+        for _, _, pattern, (dimension, weight) in automaton.iter_matches(content):
+            # Each distinct term counts once, however often it appears
+            if (pattern, dimension) not in seen:
+                seen.add((pattern, dimension))
+                weights[dimension] += weight
+
+        emotion_score = min(
+            weights["emotion"] / self.normalization.get("emotion", 1.0), 1.0
+        )
+        importance_score = min(
+            weights["importance"] / self.normalization.get("importance", 1.0), 1.0
+        )
+
+        return {
+            "emotion_score": emotion_score,
+            "importance_score": importance_score,
+            "should_generate_image": emotion_score > self.thresholds["image_emotion"]
+            or importance_score > self.thresholds["image_importance"],
+            "should_generate_bgm": emotion_score > self.thresholds["bgm_emotion"],
+        }
+
+    def score_batch(
+        self, scenes: Iterable[dict], genre: Optional[str] = None
+    ) -> List[dict]:
+        """Score many scenes ({"id", "content"}) with one compiled automaton."""
+        return [
+            {"id": scene["id"], **self.score(scene["content"], genre)}
+            for scene in scenes
+        ]
+
+    def _automaton(self, genre: Optional[str]) -> AhoCorasick:
+        key = genre if genre in self._genres else None
+        automaton = self._automata.get(key)
+        if automaton is None:
+            automaton = AhoCorasick(
+                (
+                    (term, (dimension, weight))
+                    for dimension in DIMENSIONS
+                    for term, weight in self._lexicon(key, dimension).items()
+                ),
+                word_boundaries=False,
+            )
+            self._automata[key] = automaton
+        return automaton
+
+    def _lexicon(self, genre: Optional[str], dimension: str) -> Dict[str, float]:
+        terms = dict(self._default.get(dimension, {}))
+        if genre is not None:
+            terms.update(self._genres[genre].get(dimension, {}))
+        return terms
+
+
+def get_scoring_engine(reload: bool = False) -> ScoringEngine:
+    """Get or create the scoring engine (SCORING_LEXICON_PATH overrides the bundled lexicon)."""
+    global scoring_engine
+
+    if scoring_engine is None or reload:
+        scoring_engine = ScoringEngine.from_file(
+            os.getenv("SCORING_LEXICON_PATH", DEFAULT_LEXICON_PATH)
+        )
+
+    return scoring_engine
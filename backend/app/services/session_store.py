@@ -0,0 +1,229 @@
+"""Server-side chat session store (in-memory LRU/TTL tier over Postgres)."""
+
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+from app.services.supabase_client import get_supabase_client, execute
+
+# Session store instance
+session_store: Optional["SessionStore"] = None
+
+
+class SessionBindingError(Exception):
+    """The session belongs to a different user or story."""
+
+
+class ChatSession:
+    """A session's binding plus its most recent messages (bounded)."""
+
+    def __init__(
+        self,
+        session_id: str,
+        user_id: Optional[str],
+        story_id: Optional[str],
+        messages: List[Dict[str, str]],
+        next_seq: int,
+        max_messages: int,
+    ):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.story_id = story_id
+        self.messages = deque(messages, maxlen=max_messages)
+        # seq of the next message to append (= total messages in the session)
+        self.next_seq = next_seq
+        self.last_access = time.monotonic()
+
+    @property
+    def offset(self) -> int:
+        """seq of the oldest message still held in memory."""
+        return self.next_seq - len(self.messages)
+
+    def history(self) -> List[Dict[str, str]]:
+        return list(self.messages)
+
+
+class SessionStore:
+    """
+    Chat transcripts live on the server so clients only send the new message.
+    Active sessions are cached in memory (LRU, idle TTL) holding at most
+    `max_messages` recent messages each; the full transcript is append-only
+    in `chat_messages` and written through on every turn. A session is bound
+    to the user and story it was created with.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl_seconds: float = 1800,
+        max_messages: int = 50,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    async def get(
+        self,
+        session_id: str,
+        user_id: Optional[str] = None,
+        story_id: Optional[str] = None,
+    ) -> Optional[ChatSession]:
+        """Load a session (memory, then DB); None if it doesn't exist."""
+        session = self._sessions.get(session_id)
+        if session is not None and self._expired(session):
+            del self._sessions[session_id]
+            session = None
+
+        if session is None:
+            self.misses += 1
+            session = await self._load(session_id)
+            if session is None:
+                return None
+            self._remember(session)
+        else:
+            self.hits += 1
+            self._sessions.move_to_end(session_id)
+
+        _check_binding(session, user_id, story_id)
+        session.last_access = time.monotonic()
+        return session
+
+    async def get_or_create(
+        self,
+        session_id: str,
+        user_id: Optional[str] = None,
+        story_id: Optional[str] = None,
+    ) -> ChatSession:
+        """Load a session or create it bound to user/story."""
+        session = await self.get(session_id, user_id, story_id)
+        if session is None:
+            session = await self._create(session_id, user_id, story_id)
+            self._remember(session)
+        return session
+
+    async def append(self, session: ChatSession, messages: List[Dict[str, str]]):
+        """
+        Append messages to the session (memory + `chat_messages`, one insert).
+        seqs are reserved before the write so concurrent turns in this process
+        never collide.
+        """
+        first_seq = session.next_seq
+        session.next_seq += len(messages)
+        session.messages.extend(messages)
+
+        rows = [
+            {
+                "session_id": session.session_id,
+                "seq": first_seq + i,
+                "role": m["role"],
+                "content": m["content"],
+            }
+            for i, m in enumerate(messages)
+        ]
+        try:
+            client = get_supabase_client()
+            await execute(client.table("chat_messages").insert(rows))
+        except Exception:
+            # e.g. another worker wrote the same seq: reload from DB next turn
+            self.evict(session.session_id)
+            raise
+
+    def evict(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def _load(self, session_id: str) -> Optional[ChatSession]:
+        client = get_supabase_client()
+        response = await execute(
+            client.table("chat_sessions")
+            .select("id, user_id, story_id")
+            .eq("id", session_id)
+            .limit(1)
+        )
+        if not response.data:
+            return None
+        row = response.data[0]
+
+        # Only the most recent window; older turns live in the rolling summary
+        response = await execute(
+            client.table("chat_messages")
+            .select("seq, role, content")
+            .eq("session_id", session_id)
+            .order("seq", desc=True)
+            .limit(self.max_messages)
+        )
+        rows = list(reversed(response.data or []))
+
+        return ChatSession(
+            session_id,
+            row.get("user_id"),
+            row.get("story_id"),
+            [{"role": r["role"], "content": r["content"]} for r in rows],
+            next_seq=rows[-1]["seq"] + 1 if rows else 0,
+            max_messages=self.max_messages,
+        )
+
+    async def _create(
+        self, session_id: str, user_id: Optional[str], story_id: Optional[str]
+    ) -> ChatSession:
+        client = get_supabase_client()
+        await execute(
+            client.table("chat_sessions").upsert(
+                {"id": session_id, "user_id": user_id, "story_id": story_id},
+                on_conflict="id",
+                ignore_duplicates=True,
+            )
+        )
+        # Re-read: a concurrent creator may have won the insert with another binding
+        session = await self._load(session_id)
+        if session is None:
+            raise RuntimeError(f"Session {session_id} disappeared after create")
+        _check_binding(session, user_id, story_id)
+        return session
+
+    def _expired(self, session: ChatSession) -> bool:
+        return time.monotonic() - session.last_access > self.ttl_seconds
+
+    def _remember(self, session: ChatSession) -> None:
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+
+def _check_binding(
+    session: ChatSession, user_id: Optional[str], story_id: Optional[str]
+) -> None:
+    if session.user_id:
+        if not user_id:
+            raise SessionBindingError("Session is bound to a user; user_id required")
+        if str(session.user_id) != str(user_id):
+            raise SessionBindingError("Session belongs to another user")
+    if story_id and session.story_id and str(session.story_id) != str(story_id):
+        raise SessionBindingError("Session is bound to another story")
+
+
+def get_session_store() -> SessionStore:
+    """Get or create the chat session store."""
+    global session_store
+
+    if session_store is None:
+        session_store = SessionStore(
+            max_sessions=int(os.getenv("SESSION_CACHE_SIZE", "1000")),
+            ttl_seconds=float(os.getenv("SESSION_TTL", "1800")),
+            max_messages=int(os.getenv("SESSION_MAX_MESSAGES", "50")),
+        )
+
+    return session_store
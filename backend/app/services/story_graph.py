@@ -0,0 +1,209 @@
+"""Whole-story branching graph: compact encoding, analysis and cache."""
+
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from app.services.supabase_client import get_supabase_client, execute
+
+# Story graph cache instance
+story_graph_cache: Optional["StoryGraphCache"] = None
+
+
+def build_graph(scenes: List[list], choices: List[list]) -> dict:
+    """
+    scenes:  [id, sequence, scene_type, emotion_score, importance_score] ordered by sequence
+    choices: [id, scene_id, next_scene_id, sequence]
+
+    Nodes and edges are columnar arrays; edges refer to nodes by index.
+    A scene without choices continues to the next scene by sequence (edge
+    without choice_id) unless it is an ending; a choice whose next scene
+    hasn't been written yet points to -1.
+    """
+    index = {scene[0]: i for i, scene in enumerate(scenes)}
+    nodes = {
+        "id": [scene[0] for scene in scenes],
+        "sequence": [scene[1] for scene in scenes],
+        "type": [scene[2] for scene in scenes],
+        "emotion": [scene[3] for scene in scenes],
+        "importance": [scene[4] for scene in scenes],
+    }
+
+    edges = {"from": [], "to": [], "choice_id": []}
+    has_choices = set()
+    for choice_id, scene_id, next_scene_id, _ in choices:
+        source = index.get(scene_id)
+        if source is None:
+            continue
+        has_choices.add(source)
+        edges["from"].append(source)
+        edges["to"].append(index.get(next_scene_id, -1))
+        edges["choice_id"].append(choice_id)
+
+    for i, scene in enumerate(scenes):
+        if i not in has_choices and scene[2] != "ending" and i + 1 < len(scenes):
+            edges["from"].append(i)
+            edges["to"].append(i + 1)
+            edges["choice_id"].append(None)
+
+    return {
+        "nodes": nodes,
+        "edges": edges,
+        "analysis": analyze(len(scenes), edges, nodes["type"]),
+    }
+
+
+def analyze(node_count: int, edges: dict, types: List[str]) -> dict:
+    """Reachability from the first scene, dead ends, orphans and unwritten choices."""
+    outgoing: List[List[int]] = [[] for _ in range(node_count)]
+    incoming = [0] * node_count
+    open_choices = []
+    for e, (source, target) in enumerate(zip(edges["from"], edges["to"])):
+        if target < 0:
+            open_choices.append(e)
+            continue
+        outgoing[source].append(target)
+        incoming[target] += 1
+
+    reachable = [False] * node_count
+    if node_count:
+        reachable[0] = True
+        queue = deque([0])
+        while queue:
+            for target in outgoing[queue.popleft()]:
+                if not reachable[target]:
+                    reachable[target] = True
+                    queue.append(target)
+
+    return {
+        "start": 0 if node_count else None,
+        "reachable_count": sum(reachable),
+        "unreachable": [i for i in range(node_count) if not reachable[i]],
+        # No way forward and not an ending
+        "dead_ends": [
+            i for i in range(node_count) if not outgoing[i] and types[i] != "ending"
+        ],
+        # Nothing leads here (except the start)
+        "orphans": [i for i in range(1, node_count) if incoming[i] == 0],
+        # Edge indices of choices whose next scene isn't written yet
+        "open_choices": open_choices,
+    }
+
+
+class StoryGraphCache:
+    """
+    Built graphs per story (LRU + TTL), dropped on any scene/choice write.
+    Invalidations are remembered for `ttl_seconds` so a build that raced one
+    isn't cached; older records are pruned.
+    """
+
+    def __init__(self, max_stories: int = 200, ttl_seconds: float = 600):
+        self.max_stories = max_stories
+        self.ttl_seconds = ttl_seconds
+        self._graphs: "OrderedDict[str, tuple]" = OrderedDict()
+        # Invalidation counter; a story's record says when it was last
+        # invalidated, so a build that raced a write isn't cached
+        self._clock = 0
+        # story_id -> (clock, monotonic time) of its last invalidation, oldest first
+        self._generations: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        # Highest clock among pruned records
+        self._pruned_through = 0
+        # story_id -> (graph, scene_id -> sequence), built on first lookup
+        self._sequences: Dict[str, tuple] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, story_id: str) -> Optional[dict]:
+        story_id = str(story_id)
+        entry = self._graphs.get(story_id)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+            self.hits += 1
+            self._graphs.move_to_end(story_id)
+            return entry[1]
+
+        self.misses += 1
+        generation = self._clock
+        client = get_supabase_client()
+        # Both set-based queries run inside one RPC (one round trip, no row cap)
+        response = await execute(
+            client.rpc("story_graph_rows", {"p_story_id": story_id})
+        )
+        rows = response.data
+        if rows is None:
+            # No such story
+            return None
+        graph = {
+            "story_id": story_id,
+            **build_graph(rows.get("scenes") or [], rows.get("choices") or []),
+        }
+
+        if self._unchanged_since(story_id, generation):
+            self._graphs[story_id] = (time.monotonic(), graph)
+            self._graphs.move_to_end(story_id)
+            while len(self._graphs) > self.max_stories:
+                evicted, _ = self._graphs.popitem(last=False)
+                self._sequences.pop(evicted, None)
+        return graph
+
+    async def scene_sequence(self, story_id: str, scene_id: str) -> Optional[int]:
+        """Sequence of a scene of the story (None if it isn't one), from the cached graph."""
+        story_id = str(story_id)
+        graph = await self.get(story_id)
+        if graph is None:
+            return None
+
+        indexed = self._sequences.get(story_id)
+        if indexed is None or indexed[0] is not graph:
+            nodes = graph["nodes"]
+            indexed = (graph, dict(zip(nodes["id"], nodes["sequence"])))
+            if story_id in self._graphs:
+                self._sequences[story_id] = indexed
+        return indexed[1].get(str(scene_id))
+
+    def invalidate(self, story_id: str) -> None:
+        story_id = str(story_id)
+        self._graphs.pop(story_id, None)
+        self._sequences.pop(story_id, None)
+        self._clock += 1
+        self._generations[story_id] = (self._clock, time.monotonic())
+        self._generations.move_to_end(story_id)
+        self._prune_generations()
+
+    def _unchanged_since(self, story_id: str, generation: int) -> bool:
+        if generation < self._pruned_through:
+            # Older than the invalidations we still remember: can't tell
+            return False
+        invalidated = self._generations.get(story_id)
+        return invalidated is None or invalidated[0] <= generation
+
+    def _prune_generations(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._generations:
+            story_id, (clock, invalidated_at) = next(iter(self._generations.items()))
+            if invalidated_at >= cutoff:
+                break
+            del self._generations[story_id]
+            self._pruned_through = max(self._pruned_through, clock)
+
+    def stats(self) -> dict:
+        return {
+            "stories": len(self._graphs),
+            "invalidations_tracked": len(self._generations),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def get_story_graph_cache() -> StoryGraphCache:
+    """Get or create the story graph cache."""
+    global story_graph_cache
+
+    if story_graph_cache is None:
+        story_graph_cache = StoryGraphCache(
+            max_stories=int(os.getenv("STORY_GRAPH_CACHE_SIZE", "200")),
+            ttl_seconds=float(os.getenv("STORY_GRAPH_TTL", "600")),
+        )
+
+    return story_graph_cache
@@ -1,32 +1,157 @@
 """Supabase client configuration and utilities."""
 
 from supabase import create_client, Client
+from supabase.lib.client_options import SyncClientOptions
+import asyncio
+import httpx
 import os
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
 from dotenv import load_dotenv
 
+from app.services.metrics import upstream
+
 load_dotenv()
 
+# supabase-py is synchronous. Every call goes through a bounded thread pool so a
+# slow PostgREST request never blocks the event loop; the pool size matches the
+# shared HTTP connection pool so each worker thread can hold a keep-alive connection.
+SUPABASE_MAX_WORKERS = int(os.getenv("SUPABASE_MAX_WORKERS", "16"))
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "30"))
+
+# RAG lookups run under a sub-second deadline. They get their own small pool and
+# client whose HTTP timeout matches that deadline, so a query the caller has given
+# up on cannot keep holding one of the shared workers or connections.
+RAG_MAX_WORKERS = int(os.getenv("RAG_MAX_WORKERS", "4"))
+
 # Supabase client instance
 supabase: Optional[Client] = None
 
+# Executor for blocking Supabase calls
+executor: Optional[ThreadPoolExecutor] = None
+
+# Client and executor reserved for RAG lookups
+rag_supabase: Optional[Client] = None
+rag_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _create_client(max_connections: int, timeout: float) -> Client:
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_KEY")
+
+    if not supabase_url or not supabase_key:
+        raise ValueError(
+            "SUPABASE_URL and SUPABASE_KEY environment variables must be set"
+        )
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        ),
+        timeout=timeout,
+        follow_redirects=True,
+    )
+    return create_client(
+        supabase_url,
+        supabase_key,
+        options=SyncClientOptions(httpx_client=http_client),
+    )
+
 
 def get_supabase_client() -> Client:
     """Get or create Supabase client instance."""
     global supabase
 
     if supabase is None:
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_KEY")
+        supabase = _create_client(SUPABASE_MAX_WORKERS, SUPABASE_TIMEOUT)
 
-        if not supabase_url or not supabase_key:
-            raise ValueError(
-                "SUPABASE_URL and SUPABASE_KEY environment variables must be set"
-            )
+    return supabase
 
-        supabase = create_client(supabase_url, supabase_key)
 
-    return supabase
+def get_rag_supabase_client(timeout: float) -> Client:
+    """Get or create the client for RAG lookups (HTTP timeout = the RAG deadline)."""
+    global rag_supabase
+
+    if rag_supabase is None:
+        rag_supabase = _create_client(RAG_MAX_WORKERS, timeout)
+
+    return rag_supabase
+
+
+def close_supabase_client() -> None:
+    """Close the pooled HTTP connections and the executors (app shutdown)."""
+    global supabase, executor, rag_supabase, rag_executor
+
+    if supabase is not None:
+        supabase.postgrest.session.close()
+        supabase = None
+
+    if rag_supabase is not None:
+        rag_supabase.postgrest.session.close()
+        rag_supabase = None
+
+    if executor is not None:
+        executor.shutdown(wait=True)
+        executor = None
+
+    if rag_executor is not None:
+        rag_executor.shutdown(wait=True)
+        rag_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get or create the thread pool used for blocking Supabase calls."""
+    global executor
+
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=SUPABASE_MAX_WORKERS, thread_name_prefix="supabase"
+        )
+
+    return executor
+
+
+def get_rag_executor() -> ThreadPoolExecutor:
+    """Get or create the thread pool used for RAG lookups."""
+    global rag_executor
+
+    if rag_executor is None:
+        rag_executor = ThreadPoolExecutor(
+            max_workers=RAG_MAX_WORKERS, thread_name_prefix="supabase-rag"
+        )
+
+    return rag_executor
+
+
+async def run_sync(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking Supabase call (table, RPC or storage) off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), lambda: fn(*args, **kwargs))
+
+
+async def execute(query, executor: Optional[ThreadPoolExecutor] = None) -> Any:
+    """
+    Execute a PostgREST request builder (table query or RPC) off the event loop,
+    on `executor` if given, else on the shared Supabase pool.
+    """
+    with upstream("supabase", _operation(query)):
+        if executor is None:
+            return await run_sync(query.execute)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, query.execute)
+
+
+def _operation(query) -> str:
+    """Metrics label for a request builder: "GET scenes", "POST rpc:story_graph_rows"."""
+    request = getattr(query, "request", None)
+    if request is None:
+        return "unknown"
+    path = str(request.path).rstrip("/")
+    name = path.rsplit("/", 1)[-1]
+    if path.rsplit("/", 2)[-2:-1] == ["rpc"]:
+        name = f"rpc:{name}"
+    return f"{request.http_method} {name}"
 
 
 async def check_connection() -> bool:
@@ -34,8 +159,8 @@ async def check_connection() -> bool:
     try:
         client = get_supabase_client()
         # Try a simple query
-        response = (
-            client.table("stories").select("count", count="exact").limit(1).execute()
+        response = await execute(
+            client.table("stories").select("count", count="exact").limit(1)
         )
         return True
     except Exception as e:
@@ -0,0 +1,103 @@
+"""Aho-Corasick multi-pattern matcher shared by entity detection and scoring."""
+
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """
+    Finds every occurrence of many patterns in one pass over the text,
+    independent of how many patterns there are. Patterns and text are
+    casefolded. By default ASCII-word patterns only match on word boundaries
+    ("Al" doesn't hit "Also"); other patterns (e.g. Korean names followed by
+    a particle, "민수는") match as substrings. With `word_boundaries=False`
+    every pattern matches as a substring ("death" hits "deaths").
+
+    Build once from (pattern, value) pairs; to change the pattern set build
+    a new automaton.
+    """
+
+    def __init__(
+        self, patterns: Iterable[Tuple[str, Any]] = (), word_boundaries: bool = True
+    ):
+        self.word_boundaries = word_boundaries
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # node -> [(pattern, value)] ending at that node (incl. via fail links)
+        self._out: List[List[Tuple[str, Any]]] = [[]]
+        self.size = 0
+
+        for pattern, value in patterns:
+            self._add(pattern, value)
+        self._build()
+
+    def _add(self, pattern: str, value: Any) -> None:
+        pattern = pattern.casefold().strip()
+        if not pattern:
+            return
+
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+        self._out[node].append((pattern, value))
+        self.size += 1
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, str, Any]]:
+        """Yields (start, end, pattern, value) for every match (see word_boundaries)."""
+        text = text.casefold()
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+
+            for pattern, value in self._out[node]:
+                start = i - len(pattern) + 1
+                if (
+                    self.word_boundaries
+                    and _is_ascii_word(pattern)
+                    and not _on_word_boundary(text, start, i + 1)
+                ):
+                    continue
+                yield start, i + 1, pattern, value
+
+    def find_values(self, text: str) -> List[Any]:
+        """Distinct matched values in order of first occurrence."""
+        seen = []
+        for _, _, _, value in self.iter_matches(text):
+            if value not in seen:
+                seen.append(value)
+        return seen
+
+
+def _is_ascii_word(pattern: str) -> bool:
+    return pattern.isascii() and (pattern[0].isalnum() or pattern[-1].isalnum())
+
+
+def _on_word_boundary(text: str, start: int, end: int) -> bool:
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not _is_ascii_alnum(before) and not _is_ascii_alnum(after)
+
+
+def _is_ascii_alnum(char: str) -> bool:
+    return char.isascii() and char.isalnum()
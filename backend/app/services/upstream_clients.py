@@ -0,0 +1,74 @@
+"""Shared, pooled clients for the Groq and HuggingFace upstreams."""
+
+import os
+from typing import Optional
+
+import httpx
+from groq import AsyncGroq, DefaultAsyncHttpxClient
+from huggingface_hub import AsyncInferenceClient
+
+# Groq client instance (one keep-alive connection pool for all LLM calls)
+groq_client: Optional[AsyncGroq] = None
+
+# HuggingFace client instance (embeddings + text-to-image share its connections)
+hf_client: Optional[AsyncInferenceClient] = None
+
+
+def get_groq_client() -> AsyncGroq:
+    """Get or create the shared Groq client."""
+    global groq_client
+
+    if groq_client is None:
+        max_connections = int(os.getenv("GROQ_MAX_CONNECTIONS", "50"))
+        groq_client = AsyncGroq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            timeout=float(os.getenv("GROQ_TIMEOUT", "60")),
+            max_retries=int(os.getenv("GROQ_MAX_RETRIES", "2")),
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=60,
+                ),
+            ),
+        )
+
+    return groq_client
+
+
+def get_hf_client() -> AsyncInferenceClient:
+    """Get or create the shared HuggingFace Inference client."""
+    global hf_client
+
+    if hf_client is None:
+        hf_client = AsyncInferenceClient(
+            token=os.getenv("HF_TOKEN"),
+            timeout=float(os.getenv("HF_TIMEOUT", "120")),
+        )
+
+    return hf_client
+
+
+def hf_model(model_id: str, task: str) -> str:
+    """
+    `model` argument for an AsyncInferenceClient call. With HF_INFERENCE_URL
+    set (a dedicated endpoint, or the stand-in in benchmarks/) requests go to
+    {HF_INFERENCE_URL}/models/{model_id}/pipeline/{task} instead of the router.
+    """
+    base_url = os.getenv("HF_INFERENCE_URL")
+    if not base_url:
+        return model_id
+    return f"{base_url.rstrip('/')}/models/{model_id}/pipeline/{task}"
+
+
+async def close_upstream_clients() -> None:
+    """Close the pooled upstream connections (app shutdown)."""
+    global groq_client, hf_client
+
+    if groq_client is not None:
+        await groq_client.close()
+        groq_client = None
+
+    if hf_client is not None:
+        await hf_client.close()
+        hf_client = None
@@ -0,0 +1,247 @@
+"""Story-scoped in-memory vector index for character retrieval."""
+
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from app.services.supabase_client import get_supabase_client, execute
+
+# Story vector index instance
+story_vector_index: Optional["StoryVectorIndex"] = None
+
+
+class _StoryMatrix:
+    """Unit-normalized float32 embeddings of one story's characters."""
+
+    def __init__(
+        self,
+        character_ids: List[str],
+        cards: List[dict],
+        matrix: np.ndarray,
+        unembedded: Set[str],
+    ):
+        self.character_ids = character_ids
+        self.cards = cards
+        self.matrix = matrix
+        # Linked characters the indexer hasn't embedded yet
+        self.unembedded = unembedded
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+
+class StoryVectorIndex:
+    """
+    Keeps one (n_characters x 384) matrix per active story so a top-k cosine
+    query is a single matrix-vector product instead of an embedding RPC over
+    every character of every user. Stories are loaded on first use and the
+    least recently queried ones are evicted once `max_bytes` is exceeded.
+    Stories that are not resident return None and callers fall back to the
+    `search_similar_characters` RPC.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._stories: "OrderedDict[str, _StoryMatrix]" = OrderedDict()
+        # character_id -> resident story ids that contain it
+        self._memberships: Dict[str, Set[str]] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def is_resident(self, story_id: str) -> bool:
+        return str(story_id) in self._stories
+
+    def search(
+        self, story_id: str, query: List[float], threshold: float = 0.4, limit: int = 3
+    ) -> Optional[List[dict]]:
+        """Top-k characters of a resident story by cosine similarity (None if not resident)."""
+        story = self._stories.get(str(story_id))
+        if story is None:
+            self.misses += 1
+            return None
+
+        self._stories.move_to_end(str(story_id))
+        self.hits += 1
+        if not story.character_ids:
+            return []
+
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm == 0:
+            return []
+
+        scores = story.matrix @ (q / norm)
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {**story.cards[i], "similarity": float(scores[i])}
+            for i in top
+            if scores[i] > threshold
+        ]
+
+    def schedule_load(self, story_id: str) -> None:
+        """Load a story in the background (deduplicated)."""
+        story_id = str(story_id)
+        if story_id in self._stories or story_id in self._loading:
+            return
+
+        task = asyncio.create_task(self.load(story_id))
+        self._loading[story_id] = task
+        task.add_done_callback(
+            lambda t: self._loading.pop(story_id)
+            if self._loading.get(story_id) is t
+            else None
+        )
+
+    async def load(self, story_id: str) -> None:
+        """Fetch a story's characters and embeddings from `story_characters`."""
+        story_id = str(story_id)
+        client = get_supabase_client()
+        query = (
+            client.table("story_characters")
+            .select("character_id, characters(id, name, description, embedding)")
+            .eq("story_id", story_id)
+        )
+        try:
+            response = await execute(query)
+        except Exception as e:
+            print(f"Story index load failed: {e}")
+            return
+
+        character_ids: List[str] = []
+        cards: List[dict] = []
+        vectors: List[np.ndarray] = []
+        unembedded: Set[str] = set()
+        for item in response.data or []:
+            character = item.get("characters")
+            if not character:
+                continue
+            vector = _parse_embedding(character.get("embedding"))
+            if vector is None:
+                unembedded.add(str(character["id"]))
+                continue
+            character_ids.append(str(character["id"]))
+            cards.append(_card(character))
+            vectors.append(vector)
+
+        matrix = (
+            _normalize_rows(np.vstack(vectors))
+            if vectors
+            else np.zeros((0, 0), dtype=np.float32)
+        )
+        self._put(story_id, _StoryMatrix(character_ids, cards, matrix, unembedded))
+
+    def upsert_character(self, character: dict) -> None:
+        """Refresh a character's card (and vector, if given) in every resident story."""
+        character_id = str(character["id"])
+        vector = _parse_embedding(character.get("embedding"))
+
+        for story_id in list(self._memberships.get(character_id, ())):
+            story = self._stories[story_id]
+            if character_id in story.unembedded:
+                # First embedding for this character: rebuild the story's matrix
+                if vector is not None:
+                    self.invalidate(story_id, reload=True)
+                continue
+
+            i = story.character_ids.index(character_id)
+            story.cards[i] = {**story.cards[i], **_card(character)}
+            if vector is not None:
+                story.matrix[i] = vector / (np.linalg.norm(vector) or 1.0)
+
+    def remove_character(self, character_id: str) -> None:
+        for story_id in list(self._memberships.get(str(character_id), ())):
+            self.invalidate(story_id)
+
+    def invalidate(self, story_id: str, reload: bool = False) -> None:
+        """Drop a story's matrix; optionally reload it in the background."""
+        story_id = str(story_id)
+
+        # A load that started before this change would resurrect stale rows
+        loading = self._loading.pop(story_id, None)
+        if loading is not None:
+            loading.cancel()
+
+        story = self._stories.pop(story_id, None)
+        if story is None:
+            if reload and loading is not None:
+                self.schedule_load(story_id)
+            return
+
+        self._bytes -= story.nbytes
+        for character_id in [*story.character_ids, *story.unembedded]:
+            stories = self._memberships.get(character_id)
+            if stories:
+                stories.discard(story_id)
+                if not stories:
+                    del self._memberships[character_id]
+
+        if reload:
+            self.schedule_load(story_id)
+
+    def stats(self) -> dict:
+        return {
+            "stories": len(self._stories),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _put(self, story_id: str, story: _StoryMatrix) -> None:
+        self.invalidate(story_id)
+        self._stories[story_id] = story
+        self._bytes += story.nbytes
+        for character_id in [*story.character_ids, *story.unembedded]:
+            self._memberships.setdefault(character_id, set()).add(story_id)
+
+        while self._bytes > self.max_bytes and len(self._stories) > 1:
+            cold_story_id = next(iter(self._stories))
+            self.invalidate(cold_story_id)
+            self.evictions += 1
+
+
+def _card(character: dict) -> dict:
+    return {
+        key: character[key]
+        for key in ("id", "name", "description")
+        if key in character
+    }
+
+
+def _parse_embedding(value) -> Optional[np.ndarray]:
+    # PostgREST serializes pgvector columns as a "[0.1,0.2,...]" string
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def get_story_vector_index() -> Optional[StoryVectorIndex]:
+    """Get or create the story vector index (None unless STORY_VECTOR_INDEX=1)."""
+    global story_vector_index
+
+    if story_vector_index is None and os.getenv("STORY_VECTOR_INDEX") == "1":
+        max_mb = float(os.getenv("STORY_VECTOR_INDEX_MAX_MB", "64"))
+        story_vector_index = StoryVectorIndex(max_bytes=int(max_mb * 1024 * 1024))
+
+    return story_vector_index
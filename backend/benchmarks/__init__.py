@@ -0,0 +1 @@
+"""Load tests against local stand-ins for Groq, HuggingFace and Supabase."""
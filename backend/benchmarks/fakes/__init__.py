@@ -0,0 +1 @@
+"""Local stand-ins for the Groq, HuggingFace and Supabase (PostgREST) APIs."""
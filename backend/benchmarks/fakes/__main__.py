@@ -0,0 +1,85 @@
+"""
+Serve the Groq, HuggingFace and Supabase stand-ins (one process, one loop).
+
+    python -m benchmarks.fakes --postgrest-port 54321 --groq-port 54322 --hf-port 54323
+
+GET /health on each reports call counters; GET /seed on the Supabase
+stand-in returns the seeded story/scene/character ids.
+"""
+
+import argparse
+import asyncio
+
+import uvicorn
+
+from benchmarks.fakes import groq, hf, postgrest
+from benchmarks.fakes.seed import seed
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fakes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--postgrest-port", type=int, default=54321)
+    parser.add_argument("--groq-port", type=int, default=54322)
+    parser.add_argument("--hf-port", type=int, default=54323)
+
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--groq-ttft-ms", type=float, default=300)
+    parser.add_argument("--groq-token-ms", type=float, default=10)
+    parser.add_argument("--groq-tokens", type=int, default=120)
+    parser.add_argument("--groq-max-concurrency", type=int, default=0)
+    parser.add_argument("--hf-embed-ms", type=float, default=50)
+    parser.add_argument("--hf-image-ms", type=float, default=2000)
+
+    parser.add_argument("--stories", type=int, default=20)
+    parser.add_argument("--scenes-per-story", type=int, default=30)
+    parser.add_argument("--characters-per-story", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args(argv)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    db = postgrest.Database()
+    fixtures = seed(
+        db,
+        stories=args.stories,
+        scenes_per_story=args.scenes_per_story,
+        characters_per_story=args.characters_per_story,
+        random_seed=args.seed,
+    )
+
+    supabase_app = postgrest.create_app(db, latency=args.db_latency_ms / 1000)
+    supabase_app.add_api_route("/seed", lambda: fixtures, methods=["GET"])
+
+    apps = {
+        args.postgrest_port: supabase_app,
+        args.groq_port: groq.create_app(
+            first_token_latency=args.groq_ttft_ms / 1000,
+            token_latency=args.groq_token_ms / 1000,
+            completion_tokens=args.groq_tokens,
+            max_concurrency=args.groq_max_concurrency,
+        ),
+        args.hf_port: hf.create_app(
+            embed_latency=args.hf_embed_ms / 1000,
+            image_latency=args.hf_image_ms / 1000,
+        ),
+    }
+    servers = [
+        uvicorn.Server(
+            uvicorn.Config(
+                app,
+                host=args.host,
+                port=port,
+                log_level="warning",
+                access_log=False,
+                # The app under test opens many keep-alive connections
+                backlog=4096,
+            )
+        )
+        for port, app in apps.items()
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(parse_args()))
@@ -0,0 +1,138 @@
+"""Groq (OpenAI-compatible) chat completions stand-in, with streaming."""
+
+import asyncio
+import json
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Korean filler; one "token" per word
+WORDS = ("그녀는", "조용히", "문을", "열었다.", "바람이", "차갑게", "스쳤고,", "멀리서")
+
+
+def _prompt_tokens(messages: list) -> int:
+    # Same order of magnitude as a BPE count, good enough for the usage stats
+    return sum(len(str(m.get("content", ""))) // 2 + 4 for m in messages)
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def create_app(
+    first_token_latency: float = 0.3,
+    token_latency: float = 0.01,
+    completion_tokens: int = 120,
+    max_concurrency: int = 0,
+) -> FastAPI:
+    """
+    Every completion takes `first_token_latency` + `completion_tokens` x
+    `token_latency` (capped by the request's max_tokens). With
+    `max_concurrency` > 0, requests beyond it get a 429 like a rate limit.
+    """
+    app = FastAPI(title="fake-groq")
+    app.state.active = 0
+    app.state.calls = {"completions": 0, "streams": 0, "rate_limited": 0}
+
+    @app.get("/health")
+    async def health():
+        return {**app.state.calls, "active": app.state.active}
+
+    @app.get("/openai/v1/models")
+    async def models():
+        return {
+            "object": "list",
+            "data": [{"id": "llama-3.3-70b-versatile", "object": "model"}],
+        }
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if max_concurrency and app.state.active >= max_concurrency:
+            app.state.calls["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "tokens"}},
+                status_code=429,
+                headers={"retry-after": "1"},
+            )
+
+        tokens = min(completion_tokens, body.get("max_tokens") or completion_tokens)
+        prompt_tokens = _prompt_tokens(body.get("messages", []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "fake")
+
+        if body.get("stream"):
+            app.state.calls["streams"] += 1
+            return StreamingResponse(
+                _stream(completion_id, model, prompt_tokens, tokens),
+                media_type="text/event-stream",
+            )
+
+        app.state.calls["completions"] += 1
+        app.state.active += 1
+        try:
+            await asyncio.sleep(first_token_latency + tokens * token_latency)
+        finally:
+            app.state.active -= 1
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": _text(tokens)},
+                    "finish_reason": "stop",
+                    "logprobs": None,
+                }
+            ],
+            "usage": _usage(prompt_tokens, tokens),
+        }
+
+    async def _stream(completion_id, model, prompt_tokens, tokens):
+        def chunk(**fields) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                **fields,
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        app.state.active += 1
+        try:
+            await asyncio.sleep(first_token_latency)
+            for i in range(tokens):
+                if i:
+                    await asyncio.sleep(token_latency)
+                yield chunk(
+                    choices=[
+                        {
+                            "index": 0,
+                            "delta": {"content": WORDS[i % len(WORDS)] + " "},
+                            "finish_reason": None,
+                        }
+                    ]
+                )
+            yield chunk(
+                choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                x_groq={"id": completion_id, "usage": _usage(prompt_tokens, tokens)},
+            )
+            yield chunk(choices=[], usage=_usage(prompt_tokens, tokens))
+            yield "data: [DONE]\n\n"
+        finally:
+            app.state.active -= 1
+
+    return app
+
+
+def _text(tokens: int) -> str:
+    return " ".join(WORDS[i % len(WORDS)] for i in range(tokens))
@@ -0,0 +1,68 @@
+"""HuggingFace Inference stand-in: feature extraction and text-to-image."""
+
+import asyncio
+import hashlib
+import io
+import re
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+from fastapi import FastAPI, Request, Response
+from PIL import Image
+
+EMBEDDING_DIM = 384
+
+
+@lru_cache(maxsize=65536)
+def _token_vector(token: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(token.encode("utf-8")).digest()[:8], "big")
+    return np.random.default_rng(seed).standard_normal(EMBEDDING_DIM)
+
+
+def embed(text: str) -> List[float]:
+    """
+    Deterministic bag-of-words embedding: texts sharing words (a character's
+    name, say) get a high cosine similarity, so RAG finds realistic matches.
+    """
+    tokens = re.findall(r"\w+", text.lower()) or [""]
+    vector = sum(_token_vector(token) for token in tokens)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+@lru_cache(maxsize=4)
+def _png(size: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), (90, 110, 160)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def create_app(
+    embed_latency: float = 0.05, image_latency: float = 2.0, image_size: int = 512
+) -> FastAPI:
+    app = FastAPI(title="fake-huggingface")
+    app.state.calls = {"feature-extraction": 0, "text-to-image": 0}
+
+    @app.get("/health")
+    async def health():
+        return app.state.calls
+
+    @app.post("/models/{model_id:path}/pipeline/feature-extraction")
+    async def feature_extraction(model_id: str, request: Request):
+        payload = await request.json()
+        app.state.calls["feature-extraction"] += 1
+        await asyncio.sleep(embed_latency)
+
+        inputs = payload["inputs"]
+        if isinstance(inputs, str):
+            return embed(inputs)
+        return [embed(text) for text in inputs]
+
+    @app.post("/models/{model_id:path}/pipeline/text-to-image")
+    async def text_to_image(model_id: str):
+        app.state.calls["text-to-image"] += 1
+        await asyncio.sleep(image_latency)
+        return Response(content=_png(image_size), media_type="image/png")
+
+    return app
@@ -0,0 +1,696 @@
+"""
+In-memory stand-in for the Supabase REST (PostgREST) and Storage APIs.
+
+Covers what the backend actually sends: select with column lists and
+embedded relations, eq/neq/gt/gte/lt/lte/in/is/like filters (also negated
+and inside or=/and=), order/limit/offset, exact counts, single-object
+responses, insert/upsert/update/delete with return=representation, and
+the RPCs in database/schema.sql. It is a load-test fixture, not a
+database: no types, no constraints beyond primary keys.
+"""
+
+import asyncio
+import base64
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+from fastapi import FastAPI, Request, Response
+
+# Columns filled in on insert when missing (mirrors the schema defaults)
+DEFAULTS: Dict[str, dict] = {
+    "stories": {
+        "description": None,
+        "status": "active",
+        "total_scenes": 0,
+        "current_scene_id": None,
+        "cover_image_url": None,
+    },
+    "scenes": {
+        "chapter_id": None,
+        "emotion_score": None,
+        "importance_score": None,
+        "has_generated_image": False,
+        "has_generated_bgm": False,
+        "scene_type": "narrative",
+        "current_choice_id": None,
+    },
+    "choices": {"next_scene_id": None, "consequence_summary": None},
+    "characters": {
+        "aliases": None,
+        "key_terms": None,
+        "personality_traits": None,
+        "background_story": None,
+        "appearance_description": None,
+        "image_url": None,
+        "embedding": None,
+        "embedding_hash": None,
+        "embedded_at": None,
+    },
+    "story_characters": {"role_in_story": "supporting"},
+    "generated_images": {
+        "storage_path": None,
+        "model_used": "dall-e-3",
+        "generation_params": None,
+        "cache_key": None,
+    },
+    "media_jobs": {
+        "scene_id": None,
+        "payload": {},
+        "status": "pending",
+        "attempts": 0,
+        "max_attempts": 5,
+        "locked_at": None,
+        "last_error": None,
+        "result": None,
+    },
+    "chat_summaries": {"summary": "", "summarized_count": 0},
+    "user_progress": {
+        "current_scene_id": None,
+        "completed_bitmap": "\\x",
+        "choices_made": {},
+        "is_completed": False,
+    },
+}
+
+# Primary keys other than a generated "id"
+PRIMARY_KEYS: Dict[str, Tuple[str, ...]] = {
+    "chat_messages": ("session_id", "seq"),
+    "chat_summaries": ("session_id",),
+}
+
+# Tables with an updated_at column
+UPDATED_AT = {
+    "stories",
+    "chapters",
+    "scenes",
+    "characters",
+    "media_jobs",
+    "chat_summaries",
+    "user_progress",
+}
+
+# on delete cascade: parent table -> [(child table, foreign key)]
+CASCADES: Dict[str, List[Tuple[str, str]]] = {
+    "stories": [
+        ("scenes", "story_id"),
+        ("chapters", "story_id"),
+        ("story_characters", "story_id"),
+        ("user_progress", "story_id"),
+    ],
+    "scenes": [
+        ("choices", "scene_id"),
+        ("generated_images", "scene_id"),
+        ("media_jobs", "scene_id"),
+    ],
+    "characters": [("story_characters", "character_id")],
+    "chat_sessions": [
+        ("chat_messages", "session_id"),
+        ("chat_summaries", "session_id"),
+    ],
+}
+
+Predicate = Callable[[dict], bool]
+
+
+def now() -> str:
+    # Fixed-width so timestamps compare correctly as strings
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+
+class PostgrestError(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class Database:
+    def __init__(self):
+        # table -> primary key -> row
+        self.tables: Dict[str, Dict[tuple, dict]] = {}
+        self.storage: Dict[str, int] = {}
+        self.requests = 0
+
+    def table(self, name: str) -> Dict[tuple, dict]:
+        return self.tables.setdefault(name, {})
+
+    def key(self, table: str, row: dict) -> tuple:
+        return tuple(row.get(column) for column in PRIMARY_KEYS.get(table, ("id",)))
+
+    # ---- writes -------------------------------------------------------------
+
+    def insert(
+        self,
+        table: str,
+        rows: List[dict],
+        on_conflict: Optional[str] = None,
+        resolution: Optional[str] = None,
+    ) -> List[dict]:
+        written = []
+        for values in rows:
+            row = {**DEFAULTS.get(table, {}), **values}
+            if "id" not in row and table not in PRIMARY_KEYS:
+                row["id"] = str(uuid.uuid4())
+            stamp = now()
+            row.setdefault("created_at", stamp)
+            if table in UPDATED_AT:
+                row.setdefault("updated_at", stamp)
+            if table == "media_jobs":
+                row.setdefault("run_after", stamp)
+
+            existing = self._find_conflict(table, row, on_conflict)
+            if existing is not None:
+                if resolution == "ignore-duplicates":
+                    continue
+                if resolution != "merge-duplicates":
+                    raise PostgrestError(
+                        409, "23505", f"duplicate key value violates {table}"
+                    )
+                existing.update(values)
+                if table in UPDATED_AT:
+                    existing["updated_at"] = stamp
+                written.append(existing)
+                continue
+
+            self.table(table)[self.key(table, row)] = row
+            written.append(row)
+        return written
+
+    def _find_conflict(
+        self, table: str, row: dict, on_conflict: Optional[str]
+    ) -> Optional[dict]:
+        if not on_conflict:
+            return self.table(table).get(self.key(table, row))
+        columns = [column.strip() for column in on_conflict.split(",")]
+        target = tuple(row.get(column) for column in columns)
+        for candidate in self.table(table).values():
+            if tuple(candidate.get(column) for column in columns) == target:
+                return candidate
+        return None
+
+    def update(self, table: str, where: List[Predicate], values: dict) -> List[dict]:
+        rows = self.select(table, where)
+        stamp = now()
+        for row in rows:
+            row.update(values)
+            if table in UPDATED_AT and "updated_at" not in values:
+                row["updated_at"] = stamp
+        return rows
+
+    def delete(self, table: str, where: List[Predicate]) -> List[dict]:
+        rows = self.select(table, where)
+        for row in rows:
+            self.table(table).pop(self.key(table, row), None)
+            for child, foreign_key in CASCADES.get(table, ()):
+                value = row.get(PRIMARY_KEYS.get(table, ("id",))[0])
+                self.delete(child, [lambda r, fk=foreign_key, v=value: r.get(fk) == v])
+        return rows
+
+    # ---- reads --------------------------------------------------------------
+
+    def select(self, table: str, where: List[Predicate]) -> List[dict]:
+        return [row for row in self.table(table).values() if all(p(row) for p in where)]
+
+    def get(self, table: str, row_id) -> Optional[dict]:
+        return self.table(table).get((row_id,))
+
+    # ---- RPCs (database/schema.sql) -----------------------------------------
+
+    def rpc(self, name: str, args: dict):
+        handler = getattr(self, f"rpc_{name}", None)
+        if handler is None:
+            raise PostgrestError(404, "PGRST202", f"Could not find function {name}")
+        return handler(**args)
+
+    def rpc_increment_story_scene_count(self, story_id):
+        story = self.get("stories", story_id)
+        if story:
+            story["total_scenes"] += 1
+
+    def rpc_decrement_story_scene_count(self, story_id):
+        story = self.get("stories", story_id)
+        if story:
+            story["total_scenes"] = max(story["total_scenes"] - 1, 0)
+
+    def rpc_search_similar_characters(
+        self, query_embedding, match_threshold, match_count
+    ):
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        matches = []
+        for character in self.table("characters").values():
+            if character.get("embedding") is None:
+                continue
+            vector = np.asarray(orjson.loads(character["embedding"]), dtype=np.float32)
+            similarity = float(vector @ query / (np.linalg.norm(vector) or 1.0))
+            if similarity > match_threshold:
+                matches.append(
+                    {
+                        "id": character["id"],
+                        "name": character["name"],
+                        "description": character["description"],
+                        "similarity": similarity,
+                    }
+                )
+        matches.sort(key=lambda m: -m["similarity"])
+        return matches[:match_count]
+
+    def rpc_update_character_embeddings(self, updates):
+        stamp = now()
+        for update in updates:
+            character = self.get("characters", update["id"])
+            if character:
+                # pgvector columns come back as "[...]" text
+                character["embedding"] = orjson.dumps(update["embedding"]).decode()
+                character["embedding_hash"] = update["embedding_hash"]
+                character["embedded_at"] = stamp
+
+    def rpc_update_scene_scores(self, updates):
+        for update in updates:
+            scene = self.get("scenes", update["id"])
+            if scene:
+                scene["emotion_score"] = update["emotion_score"]
+                scene["importance_score"] = update["importance_score"]
+
+    def rpc_bulk_insert_scenes(self, p_story_id, p_scenes):
+        keyed = {}
+        for item in p_scenes:
+            (scene,) = self.insert(
+                "scenes",
+                [
+                    {
+                        "story_id": p_story_id,
+                        "chapter_id": item.get("chapter_id"),
+                        "content": item["content"],
+                        "sequence": item["sequence"],
+                        "scene_type": item.get("scene_type") or "narrative",
+                        "emotion_score": item.get("emotion_score"),
+                        "importance_score": item.get("importance_score"),
+                        "has_generated_bgm": bool(item.get("has_generated_bgm")),
+                    }
+                ],
+            )
+            keyed[item["key"]] = scene["id"]
+
+        for item in p_scenes:
+            self.insert(
+                "choices",
+                [
+                    {
+                        "scene_id": keyed[item["key"]],
+                        "text": choice["text"],
+                        "consequence_summary": choice.get("consequence_summary"),
+                        "sequence": choice["sequence"],
+                        "next_scene_id": choice.get("next_scene_id")
+                        or keyed.get(choice.get("next_scene_key")),
+                    }
+                    for choice in item.get("choices") or []
+                ],
+            )
+
+        story = self.get("stories", p_story_id)
+        if story:
+            story["total_scenes"] += len(p_scenes)
+        return [{"client_key": k, "new_scene_id": v} for k, v in keyed.items()]
+
+    def rpc_story_graph_rows(self, p_story_id):
+        if self.get("stories", p_story_id) is None:
+            return None
+        scenes = sorted(
+            (s for s in self.table("scenes").values() if s["story_id"] == p_story_id),
+            key=lambda s: s["sequence"],
+        )
+        scene_ids = {s["id"] for s in scenes}
+        choices = sorted(
+            (c for c in self.table("choices").values() if c["scene_id"] in scene_ids),
+            key=lambda c: (c["scene_id"], c["sequence"]),
+        )
+        return {
+            "scenes": [
+                [
+                    s["id"],
+                    s["sequence"],
+                    s["scene_type"],
+                    s["emotion_score"],
+                    s["importance_score"],
+                ]
+                for s in scenes
+            ],
+            "choices": [
+                [c["id"], c["scene_id"], c["next_scene_id"], c["sequence"]]
+                for c in choices
+            ],
+        }
+
+    def rpc_merge_user_progress(self, updates):
+        for update in updates:
+            # Like the SQL function: skip rows for missing users/stories and
+            # drop a current scene that no longer exists
+            if (update["user_id"],) not in self.table("users") or (
+                update["story_id"],
+            ) not in self.table("stories"):
+                continue
+            if (update.get("current_scene_id"),) not in self.table("scenes"):
+                update = {**update, "current_scene_id": None}
+            key = (update["user_id"], update["story_id"])
+            completed = base64.b64decode(update.get("completed") or "")
+            existing = next(
+                (
+                    row
+                    for row in self.table("user_progress").values()
+                    if (row["user_id"], row["story_id"]) == key
+                ),
+                None,
+            )
+            if existing is None:
+                self.insert(
+                    "user_progress",
+                    [
+                        {
+                            "user_id": update["user_id"],
+                            "story_id": update["story_id"],
+                            "current_scene_id": update.get("current_scene_id"),
+                            "completed_bitmap": "\\x" + completed.hex(),
+                            "choices_made": update.get("choices") or {},
+                            "is_completed": bool(update.get("is_completed")),
+                            "last_read_at": update.get("last_read_at") or now(),
+                        }
+                    ],
+                )
+                continue
+
+            stored = bytes.fromhex(existing["completed_bitmap"][2:])
+            merged = bytearray(max(stored, completed, key=len))
+            for i, byte in enumerate(min(stored, completed, key=len)):
+                merged[i] |= byte
+            existing["completed_bitmap"] = "\\x" + merged.hex()
+            existing["current_scene_id"] = (
+                update.get("current_scene_id") or existing["current_scene_id"]
+            )
+            existing["choices_made"] = {
+                **existing["choices_made"],
+                **(update.get("choices") or {}),
+            }
+            existing["is_completed"] = existing["is_completed"] or bool(
+                update.get("is_completed")
+            )
+            existing["last_read_at"] = max(
+                existing["last_read_at"], update.get("last_read_at") or now()
+            )
+
+    def rpc_claim_media_jobs(self, p_provider, p_limit, p_lock_timeout=None):
+        stamp = now()
+        stale = (datetime.now(timezone.utc) - timedelta(minutes=10)).strftime(
+            "%Y-%m-%dT%H:%M:%S.%f+00:00"
+        )
+        runnable = sorted(
+            (
+                job
+                for job in self.table("media_jobs").values()
+                if job["provider"] == p_provider
+                and (
+                    (job["status"] == "pending" and job["run_after"] <= stamp)
+                    or (job["status"] == "running" and (job["locked_at"] or "") < stale)
+                )
+            ),
+            key=lambda job: job["run_after"],
+        )[:p_limit]
+        for job in runnable:
+            job["status"] = "running"
+            job["attempts"] += 1
+            job["locked_at"] = stamp
+        return runnable
+
+
+# ---- query string -> predicates ---------------------------------------------
+
+
+def _split(text: str, separator: str = ",") -> List[str]:
+    """Split on `separator` outside parentheses and double quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "\\" and quoted and i + 1 < len(text):
+            current.append(text[i : i + 2])
+            i += 2
+            continue
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        if char == separator and depth == 0 and not quoted:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def _coerce(raw: str, sample):
+    """Filter values arrive as text; compare them as the stored value's type."""
+    if isinstance(sample, bool):
+        return raw == "true"
+    if isinstance(sample, (int, float)):
+        return float(raw)
+    return raw
+
+
+def _compare(op: str, value: str) -> Predicate:
+    if op == "is":
+        expected = {"null": None, "true": True, "false": False}[value]
+        return lambda field: field is expected
+    if op == "in":
+        options = [_unquote(v) for v in _split(value.strip()[1:-1])]
+        return lambda field: field is not None and any(
+            field == _coerce(option, field) for option in options
+        )
+    if op in ("like", "ilike"):
+        pattern = re.compile(
+            re.escape(value).replace(r"\*", ".*").replace("%", ".*"),
+            re.IGNORECASE if op == "ilike" else 0,
+        )
+        return lambda field: field is not None and bool(pattern.fullmatch(str(field)))
+
+    test = {
+        "eq": lambda a, b: a == b,
+        "neq": lambda a, b: a != b,
+        "gt": lambda a, b: a > b,
+        "gte": lambda a, b: a >= b,
+        "lt": lambda a, b: a < b,
+        "lte": lambda a, b: a <= b,
+    }[op]
+    return lambda field: field is not None and test(field, _coerce(value, field))
+
+
+def _condition(column: str, expression: str) -> Predicate:
+    """`column` + "op.value" / "not.op.value" -> row predicate."""
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, value = expression.partition(".")
+    compare = _compare(op, _unquote(value))
+
+    if negate:
+        return lambda row: not compare(row.get(column))
+    return lambda row: compare(row.get(column))
+
+
+def _logical(kind: str, body: str) -> Predicate:
+    """or=(a.eq.1,and(b.gt.2,c.lt.3)) -> row predicate."""
+    terms = []
+    for term in _split(body.strip()[1:-1]):
+        nested = re.match(r"^(not\.)?(and|or)(\(.*\))$", term, re.DOTALL)
+        if nested:
+            inner = _logical(nested.group(2), nested.group(3))
+            terms.append(
+                (lambda p: lambda row: not p(row))(inner) if nested.group(1) else inner
+            )
+        else:
+            column, _, expression = term.partition(".")
+            terms.append(_condition(column, expression))
+
+    combine = any if kind == "or" else all
+    return lambda row: combine(term(row) for term in terms)
+
+
+def parse_filters(params: List[Tuple[str, str]]) -> List[Predicate]:
+    reserved = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+    where = []
+    for name, value in params:
+        if name in ("or", "and"):
+            where.append(_logical(name, value))
+        elif name not in reserved:
+            where.append(_condition(name, value))
+    return where
+
+
+def _sort(rows: List[dict], order: Optional[str]) -> List[dict]:
+    if not order:
+        return rows
+    # Stable sorts from the last key to the first
+    for term in reversed(_split(order)):
+        column, *modifiers = term.split(".")
+        descending = "desc" in modifiers
+        # Postgres default: NULLS LAST ascending, NULLS FIRST descending
+        nulls_first = "nullsfirst" in modifiers or (
+            descending and "nullslast" not in modifiers
+        )
+        present = [row for row in rows if row.get(column) is not None]
+        missing = [row for row in rows if row.get(column) is None]
+        present.sort(key=lambda row: row[column], reverse=descending)
+        rows = missing + present if nulls_first else present + missing
+    return rows
+
+
+def _project(db: Database, table: str, row: dict, select: str) -> dict:
+    if not select or select == "*":
+        return dict(row)
+
+    result = {}
+    for item in _split(select):
+        embedded = re.match(r"^(\w+)\((.*)\)$", item, re.DOTALL)
+        if embedded is None:
+            if item == "*":
+                result.update(row)
+            else:
+                result[item] = row.get(item)
+            continue
+
+        relation, columns = embedded.groups()
+        # Many-to-one: story_characters.character_id -> characters
+        foreign_key = f"{relation.rstrip('s')}_id"
+        if foreign_key in row:
+            target = db.get(relation, row[foreign_key])
+            result[relation] = (
+                _project(db, relation, target, columns) if target else None
+            )
+        else:
+            # One-to-many: scenes -> choices.scene_id
+            back_key = f"{table.rstrip('s')}_id"
+            result[relation] = [
+                _project(db, relation, child, columns)
+                for child in db.table(relation).values()
+                if child.get(back_key) == row.get("id")
+            ]
+    return result
+
+
+def _json(payload, status: int = 200, headers: Optional[dict] = None) -> Response:
+    return Response(
+        orjson.dumps(payload),
+        status_code=status,
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+def _error(error: PostgrestError) -> Response:
+    return _json(
+        {"code": error.code, "message": error.message, "details": None, "hint": None},
+        status=error.status,
+    )
+
+
+def create_app(db: Database, latency: float = 0.005) -> FastAPI:
+    """Every request waits `latency` seconds first (network + query time)."""
+    app = FastAPI(title="fake-postgrest")
+
+    @app.get("/health")
+    async def health():
+        return {
+            "requests": db.requests,
+            "rows": {name: len(rows) for name, rows in db.tables.items()},
+            "objects": len(db.storage),
+        }
+
+    @app.post("/rest/v1/rpc/{name}")
+    async def rpc(name: str, request: Request):
+        db.requests += 1
+        await asyncio.sleep(latency)
+        body = await request.body()
+        try:
+            return _json(db.rpc(name, orjson.loads(body) if body else {}))
+        except PostgrestError as e:
+            return _error(e)
+
+    @app.api_route("/rest/v1/{table}", methods=["GET", "POST", "PATCH", "DELETE"])
+    async def table(table: str, request: Request):
+        db.requests += 1
+        await asyncio.sleep(latency)
+        params = request.query_params
+        prefer = request.headers.get("prefer", "")
+        body = await request.body()
+        payload = orjson.loads(body) if body else None
+
+        try:
+            where = parse_filters(params.multi_items())
+            if request.method == "GET":
+                rows = db.select(table, where)
+            elif request.method == "POST":
+                resolution = re.search(r"resolution=([\w-]+)", prefer)
+                rows = db.insert(
+                    table,
+                    payload if isinstance(payload, list) else [payload],
+                    on_conflict=params.get("on_conflict"),
+                    resolution=resolution.group(1) if resolution else None,
+                )
+            elif request.method == "PATCH":
+                rows = db.update(table, where, payload or {})
+            else:
+                rows = db.delete(table, where)
+        except PostgrestError as e:
+            return _error(e)
+
+        total = len(rows)
+        rows = _sort(rows, params.get("order"))
+        offset = int(params.get("offset", 0))
+        rows = rows[offset:]
+        if "limit" in params:
+            rows = rows[: int(params["limit"])]
+        data = [_project(db, table, row, params.get("select", "*")) for row in rows]
+
+        headers = {}
+        if "count=" in prefer:
+            span = f"{offset}-{offset + len(data) - 1}" if data else "*"
+            headers["content-range"] = f"{span}/{total}"
+
+        status = 201 if request.method == "POST" else 200
+        if "return=representation" not in prefer and request.method != "GET":
+            return Response(
+                status_code=204 if status == 200 else status, headers=headers
+            )
+
+        if "vnd.pgrst.object" in request.headers.get("accept", ""):
+            if len(data) != 1:
+                return _error(
+                    PostgrestError(
+                        406,
+                        "PGRST116",
+                        "JSON object requested, multiple (or no) rows returned",
+                    )
+                )
+            return _json(data[0], status, headers)
+        return _json(data, status, headers)
+
+    @app.post("/storage/v1/object/{bucket}/{path:path}")
+    async def upload(bucket: str, path: str, request: Request):
+        await asyncio.sleep(latency)
+        db.storage[f"{bucket}/{path}"] = len(await request.body())
+        return {"Key": f"{bucket}/{path}", "Id": str(uuid.uuid4())}
+
+    return app
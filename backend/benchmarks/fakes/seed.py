@@ -0,0 +1,151 @@
+"""Deterministic fixture data for the fake database."""
+
+import random
+import uuid
+
+from benchmarks.fakes.postgrest import Database
+
+BENCH_USER_ID = "00000000-0000-4000-8000-000000000001"
+
+ROLES = ("주인공", "조력자", "라이벌", "안내자")
+
+GENRES = ("fantasy", "scifi", "mystery", "romance", "horror", "adventure")
+
+NAMES = (
+    "서연",
+    "민준",
+    "하윤",
+    "도윤",
+    "지아",
+    "시우",
+    "아린",
+    "카이",
+    "레나",
+    "로완",
+    "유나",
+    "태오",
+)
+
+SENTENCES = (
+    "그녀는 비에 젖은 골목을 지나 낡은 서점의 문을 열었다.",
+    "희미한 등불 아래에서 오래된 지도가 조용히 빛났다.",
+    "누군가 멀리서 이름을 불렀지만 돌아보지 않았다.",
+    "심장이 빠르게 뛰었고, 손끝이 차갑게 떨렸다.",
+    "창밖으로 붉은 달이 떠오르며 도시를 물들였다.",
+    "그는 미소를 지었지만 눈빛은 슬픔으로 가득했다.",
+)
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _content(rng: random.Random, sentences: int = 6) -> str:
+    return " ".join(rng.choice(SENTENCES) for _ in range(sentences))
+
+
+def seed(
+    db: Database,
+    stories: int = 20,
+    scenes_per_story: int = 30,
+    characters_per_story: int = 4,
+    random_seed: int = 7,
+) -> dict:
+    """
+    Stories with linear scene chains (two choices per scene, one leading on)
+    and a cast per story. Character embeddings are left empty for the
+    app's own indexer to fill. Returns the ids the load driver needs.
+    """
+    rng = random.Random(random_seed)
+    summary = {"user_id": BENCH_USER_ID, "stories": []}
+    db.insert("users", [{"id": BENCH_USER_ID, "email": "bench@example.com"}])
+
+    for s in range(stories):
+        (story,) = db.insert(
+            "stories",
+            [
+                {
+                    "id": _uuid(rng),
+                    "user_id": BENCH_USER_ID,
+                    "title": f"벤치마크 이야기 {s + 1}",
+                    "genre": GENRES[s % len(GENRES)],
+                    "description": _content(rng, 2),
+                    "total_scenes": scenes_per_story,
+                }
+            ],
+        )
+
+        scene_ids = [_uuid(rng) for _ in range(scenes_per_story)]
+        for sequence, scene_id in enumerate(scene_ids, start=1):
+            db.insert(
+                "scenes",
+                [
+                    {
+                        "id": scene_id,
+                        "story_id": story["id"],
+                        "content": _content(rng),
+                        "sequence": sequence,
+                        "emotion_score": round(rng.random(), 3),
+                        "importance_score": round(rng.random(), 3),
+                        "scene_type": (
+                            "ending" if sequence == scenes_per_story else "choice"
+                        ),
+                    }
+                ],
+            )
+            if sequence < scenes_per_story:
+                db.insert(
+                    "choices",
+                    [
+                        {
+                            "scene_id": scene_id,
+                            "text": "앞으로 나아간다",
+                            "sequence": 1,
+                            "next_scene_id": scene_ids[sequence],
+                        },
+                        {
+                            "scene_id": scene_id,
+                            "text": "잠시 멈춰 주위를 살핀다",
+                            "sequence": 2,
+                        },
+                    ],
+                )
+
+        cast = rng.sample(NAMES, min(characters_per_story, len(NAMES)))
+        characters = db.insert(
+            "characters",
+            [
+                {
+                    "id": _uuid(rng),
+                    "user_id": BENCH_USER_ID,
+                    "name": name,
+                    "description": (
+                        f"{name}은(는) {story['title']}의 {ROLES[i % len(ROLES)]}이다."
+                    ),
+                    "aliases": [f"{name}씨"],
+                    "personality_traits": ["용감함", "호기심"],
+                }
+                for i, name in enumerate(cast)
+            ],
+        )
+        db.insert(
+            "story_characters",
+            [
+                {
+                    "story_id": story["id"],
+                    "character_id": character["id"],
+                    "role_in_story": "protagonist" if i == 0 else "supporting",
+                }
+                for i, character in enumerate(characters)
+            ],
+        )
+
+        summary["stories"].append(
+            {
+                "id": story["id"],
+                "scene_ids": scene_ids,
+                "characters": [c["name"] for c in characters],
+            }
+        )
+
+    return summary
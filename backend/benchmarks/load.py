@@ -0,0 +1,158 @@
+"""Closed-loop load generation and latency statistics."""
+
+import asyncio
+import math
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: List[float]) -> dict:
+    """Seconds -> {p50, p95, p99, max, mean} in milliseconds."""
+    values = sorted(samples)
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None, "mean": None}
+    return {
+        "p50": round(percentile(values, 0.50) * 1000, 2),
+        "p95": round(percentile(values, 0.95) * 1000, 2),
+        "p99": round(percentile(values, 0.99) * 1000, 2),
+        "max": round(values[-1] * 1000, 2),
+        "mean": round(sum(values) / len(values) * 1000, 2),
+    }
+
+
+class Recorder:
+    """
+    Latencies and errors per operation. Calls started before `record_from`
+    (a time.perf_counter() value: the warm-up) are not recorded.
+    """
+
+    def __init__(self, record_from: float = 0.0):
+        self.record_from = record_from
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.error_samples: List[str] = []
+
+    async def timed(self, operation: str, call: Awaitable):
+        """Await `call`, recording its latency (and failure) under `operation`."""
+        started = time.perf_counter()
+        recording = started >= self.record_from
+        try:
+            result = await call
+        except Exception as e:
+            if recording:
+                self._error(operation, f"{type(e).__name__}: {e}")
+            raise
+        if isinstance(result, httpx.Response) and result.status_code >= 400:
+            if recording:
+                self._error(
+                    operation, f"HTTP {result.status_code}: {result.text[:200]}"
+                )
+            raise RequestFailed(operation, result.status_code)
+        if recording:
+            self.latencies[operation].append(time.perf_counter() - started)
+        return result
+
+    def observe(self, operation: str, started: float, seconds: float) -> None:
+        """Record a latency measured by the scenario itself (time to first token)."""
+        if started >= self.record_from:
+            self.latencies[operation].append(seconds)
+
+    def _error(self, operation: str, detail: str) -> None:
+        self.errors[operation] += 1
+        if len(self.error_samples) < 10:
+            self.error_samples.append(f"{operation}: {detail}")
+
+
+class RequestFailed(Exception):
+    def __init__(self, operation: str, status: int):
+        super().__init__(f"{operation} returned {status}")
+        self.status = status
+
+
+# One iteration of a scenario: (client, recorder, worker number, iteration number)
+Iteration = Callable[[httpx.AsyncClient, Recorder, int, int], Awaitable[None]]
+
+
+async def run_closed_loop(
+    client: httpx.AsyncClient,
+    iteration: Iteration,
+    concurrency: int,
+    duration: float,
+    warmup: float = 0.0,
+) -> Tuple[Recorder, float, int]:
+    """
+    `concurrency` workers each run `iteration` back to back: for `warmup`
+    seconds unrecorded, then for `duration` seconds recorded. Returns the
+    recorder, the measured wall time and the recorded iteration count.
+    """
+    record_from = time.perf_counter() + warmup
+    deadline = record_from + duration
+    recorder = Recorder(record_from)
+    completed = 0
+
+    async def worker(number: int) -> None:
+        nonlocal completed
+        i = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await iteration(client, recorder, number, i)
+            except Exception:
+                # Already recorded; keep the load steady
+                pass
+            else:
+                if started >= record_from:
+                    completed += 1
+            i += 1
+
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    # Iterations started before the deadline run to completion
+    return recorder, time.perf_counter() - record_from, completed
+
+
+def histogram_delta(before: str, after: str, name: str) -> List[Tuple[float, float]]:
+    """
+    (upper bound, count) buckets of an unlabelled Prometheus histogram
+    observed between two scrapes of the text format.
+    """
+
+    def buckets(text: str) -> Dict[float, float]:
+        result = {}
+        prefix = f'{name}_bucket{{le="'
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                bound, _, value = line[len(prefix) :].partition('"} ')
+                result[math.inf if bound == "+Inf" else float(bound)] = float(value)
+        return result
+
+    start, end = buckets(before), buckets(after)
+    return [(bound, end[bound] - start.get(bound, 0.0)) for bound in sorted(end)]
+
+
+def histogram_quantile(
+    cumulative: List[Tuple[float, float]], q: float
+) -> Optional[float]:
+    """Linear interpolation inside the bucket holding the q-th observation."""
+    if not cumulative or cumulative[-1][1] == 0:
+        return None
+    target = q * cumulative[-1][1]
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, count in cumulative:
+        if count >= target:
+            if math.isinf(bound):
+                return lower_bound
+            fraction = (target - lower_count) / max(count - lower_count, 1e-9)
+            return lower_bound + (bound - lower_bound) * fraction
+        lower_bound, lower_count = bound, count
+    return lower_bound
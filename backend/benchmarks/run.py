@@ -0,0 +1,352 @@
+"""
+Run the load-test suite against a locally started app wired to the fakes.
+
+    python -m benchmarks.run --concurrency 16 --duration 30 --out results.json
+    python -m benchmarks.run --baseline baseline.json --fail-on-regression
+
+Starts `python -m benchmarks.fakes` and `uvicorn main:app` on free ports,
+backfills character embeddings, runs each scenario in a closed loop and
+writes p50/p95/p99 latency, throughput and event-loop lag as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.load import (
+    histogram_delta,
+    histogram_quantile,
+    run_closed_loop,
+    summarize,
+)
+from benchmarks.scenarios import SCENARIOS
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Compared against the baseline: latency may not grow, throughput may not drop
+LATENCY_KEYS = ("p50", "p95", "p99")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}",
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20, help="Seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds")
+    parser.add_argument("--out", help="Write results JSON here (default: stdout)")
+
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--save-baseline", help="Also write the results here")
+    parser.add_argument("--fail-on-regression", action="store_true")
+
+    parser.add_argument(
+        "--app-env",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Extra environment for the app (repeatable)",
+    )
+    parser.add_argument("--app-log", help="App log file (default: a temp file)")
+
+    # Passed through to the fakes
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--groq-ttft-ms", type=float, default=300)
+    parser.add_argument("--groq-token-ms", type=float, default=10)
+    parser.add_argument("--groq-tokens", type=int, default=120)
+    parser.add_argument("--groq-max-concurrency", type=int, default=0)
+    parser.add_argument("--hf-embed-ms", type=float, default=50)
+    parser.add_argument("--hf-image-ms", type=float, default=2000)
+    parser.add_argument("--stories", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    return parser.parse_args(argv)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def _wait_until_up(
+    url: str, process: subprocess.Popen, timeout: float = 60
+) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                await client.get(url, timeout=1)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def _stop(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def _event_loop_lag(before: str, after: str) -> dict:
+    buckets = histogram_delta(before, after, "novelaine_event_loop_lag_seconds")
+
+    def ms(q: float) -> Optional[float]:
+        value = histogram_quantile(buckets, q)
+        return None if value is None else round(value * 1000, 2)
+
+    return {
+        "samples": int(buckets[-1][1]) if buckets else 0,
+        "p50": ms(0.50),
+        "p95": ms(0.95),
+        "p99": ms(0.99),
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, name: str, fixtures: dict, args: argparse.Namespace
+) -> dict:
+    before = (await client.get("/metrics")).text
+    recorder, wall, completed = await run_closed_loop(
+        client,
+        SCENARIOS[name](fixtures),
+        concurrency=args.concurrency,
+        duration=args.duration,
+        warmup=args.warmup,
+    )
+    after = (await client.get("/metrics")).text
+
+    requests = sum(len(v) for v in recorder.latencies.values())
+    errors = sum(recorder.errors.values())
+    # The scenario's own name is its headline operation
+    headline = recorder.latencies.get(name) or [
+        s for samples in recorder.latencies.values() for s in samples
+    ]
+    return {
+        "iterations": completed,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(completed / wall, 2) if wall > 0 else 0.0,
+        "latency_ms": summarize(headline),
+        "ops": {
+            operation: {
+                "count": len(samples),
+                "errors": recorder.errors.get(operation, 0),
+                **summarize(samples),
+            }
+            for operation, samples in sorted(recorder.latencies.items())
+        },
+        "event_loop_lag_ms": _event_loop_lag(before, after),
+        "error_samples": recorder.error_samples,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[dict]:
+    """Scenario metrics that regressed by more than `tolerance` (a fraction)."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+
+        checks = [
+            (
+                f"latency_ms.{key}",
+                current["latency_ms"][key],
+                previous["latency_ms"][key],
+                1,
+            )
+            for key in LATENCY_KEYS
+        ]
+        checks.append(
+            (
+                "throughput_rps",
+                current["throughput_rps"],
+                previous["throughput_rps"],
+                -1,
+            )
+        )
+        for metric, now, then, direction in checks:
+            if now is None or not then:
+                continue
+            change = (now - then) / then
+            if change * direction > tolerance:
+                regressions.append(
+                    {
+                        "scenario": name,
+                        "metric": metric,
+                        "baseline": then,
+                        "current": now,
+                        "change": round(change, 3),
+                    }
+                )
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    ports = {name: _free_port() for name in ("postgrest", "groq", "hf", "app")}
+    fakes = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.fakes",
+            f"--postgrest-port={ports['postgrest']}",
+            f"--groq-port={ports['groq']}",
+            f"--hf-port={ports['hf']}",
+            f"--db-latency-ms={args.db_latency_ms}",
+            f"--groq-ttft-ms={args.groq_ttft_ms}",
+            f"--groq-token-ms={args.groq_token_ms}",
+            f"--groq-tokens={args.groq_tokens}",
+            f"--groq-max-concurrency={args.groq_max_concurrency}",
+            f"--hf-embed-ms={args.hf_embed_ms}",
+            f"--hf-image-ms={args.hf_image_ms}",
+            f"--stories={args.stories}",
+            f"--seed={args.seed}",
+        ],
+        cwd=BACKEND_DIR,
+    )
+    app: Optional[subprocess.Popen] = None
+    log_path = args.app_log or tempfile.mkstemp(prefix="bench-app-", suffix=".log")[1]
+
+    env = {
+        **os.environ,
+        "SUPABASE_URL": f"http://127.0.0.1:{ports['postgrest']}",
+        "SUPABASE_KEY": "bench",
+        "GROQ_BASE_URL": f"http://127.0.0.1:{ports['groq']}",
+        "GROQ_API_KEY": "bench",
+        "HF_INFERENCE_URL": f"http://127.0.0.1:{ports['hf']}",
+        "HF_TOKEN": "bench",
+        "EVENT_LOOP_LAG_INTERVAL": "0.05",
+    }
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    try:
+        supabase_url = env["SUPABASE_URL"]
+        await _wait_until_up(f"{supabase_url}/health", fakes)
+        async with httpx.AsyncClient() as client:
+            fixtures = (await client.get(f"{supabase_url}/seed")).json()
+
+        subprocess.run(
+            [sys.executable, "-m", "app.services.character_indexer", "backfill"],
+            cwd=BACKEND_DIR,
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+
+        with open(log_path, "w") as log:
+            app = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    "main:app",
+                    "--host=127.0.0.1",
+                    f"--port={ports['app']}",
+                    "--log-level=warning",
+                    "--no-access-log",
+                ],
+                cwd=BACKEND_DIR,
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        app_url = f"http://127.0.0.1:{ports['app']}"
+        await _wait_until_up(f"{app_url}/", app)
+
+        results = {
+            "meta": {
+                "git_commit": _git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "config": {
+                    key: value
+                    for key, value in vars(args).items()
+                    if key not in ("out", "baseline", "save_baseline", "app_log")
+                },
+                "app_log": log_path,
+            },
+            "scenarios": {},
+        }
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(
+            base_url=app_url, timeout=60, limits=limits
+        ) as client:
+            for name in names:
+                print(f"Running {name}...", file=sys.stderr)
+                results["scenarios"][name] = await run_scenario(
+                    client, name, fixtures, args
+                )
+    finally:
+        if app is not None:
+            _stop(app)
+        _stop(fakes)
+
+    exit_code = 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.tolerance)
+        results["comparison"] = {
+            "baseline": args.baseline,
+            "baseline_commit": baseline.get("meta", {}).get("git_commit"),
+            "tolerance": args.tolerance,
+            "regressions": regressions,
+        }
+        if regressions and args.fail_on_regression:
+            exit_code = 1
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(output + "\n")
+    else:
+        print(output)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(output + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,196 @@
+"""
+One iteration per scenario, against the app's real HTTP API.
+
+Each scenario is built from the /seed fixtures and returns a closure with the
+`load.Iteration` signature; everything it times goes through the recorder
+under "<scenario>" or "<scenario>.<operation>".
+"""
+
+import json
+import random
+import time
+from typing import Callable, Dict
+
+import httpx
+
+from benchmarks.load import Iteration, Recorder
+
+# Plain statements: the RAG decision is "skip", so the turn is one LLM call
+CHAT_MESSAGES = (
+    "창밖으로 비가 내리기 시작했다.",
+    "나는 조용히 문을 닫고 의자에 앉았다.",
+    "오래된 편지를 다시 펼쳐 본다.",
+    "골목 끝에서 발소리가 들려온다.",
+)
+
+# Open questions without a character name: vector search
+OPEN_QUESTIONS = (
+    "이 도시에는 어떤 비밀이 숨어 있어?",
+    "왜 모두가 붉은 달을 두려워하지?",
+    "서점 주인은 어디로 사라졌을까?",
+    "누가 처음으로 지도를 발견했어?",
+    "언제부터 이 골목에 안개가 끼었지?",
+)
+
+
+# A session lasts this many turns, so history and summaries grow realistically
+SESSION_TURNS = 8
+
+
+def _session(scenario: str, stories: list, worker: int, i: int):
+    """(session id, story) for iteration i; a session stays bound to one story."""
+    number = i // SESSION_TURNS
+    story = stories[(worker + number) % len(stories)]
+    return f"bench-{scenario}-{worker}-{number}", story
+
+
+def chat(fixtures: dict) -> Iteration:
+    """POST /api/chat with a statement (no retrieval)."""
+    stories = fixtures["stories"]
+
+    async def iteration(
+        client: httpx.AsyncClient, recorder: Recorder, worker: int, i: int
+    ) -> None:
+        session_id, story = _session("chat", stories, worker, i)
+        await recorder.timed(
+            "chat",
+            client.post(
+                "/api/chat",
+                json={
+                    "message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)],
+                    "story_id": story["id"],
+                    "session_id": session_id,
+                    "user_id": fixtures["user_id"],
+                },
+            ),
+        )
+
+    return iteration
+
+
+def chat_stream(fixtures: dict) -> Iteration:
+    """POST /api/chat/stream; records total time and time to the first token."""
+    stories = fixtures["stories"]
+
+    async def iteration(
+        client: httpx.AsyncClient, recorder: Recorder, worker: int, i: int
+    ) -> None:
+        session_id, story = _session("stream", stories, worker, i)
+        body = {
+            "message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)],
+            "story_id": story["id"],
+            "session_id": session_id,
+            "user_id": fixtures["user_id"],
+        }
+        await recorder.timed("chat_stream", _consume_stream(client, recorder, body))
+
+    return iteration
+
+
+async def _consume_stream(
+    client: httpx.AsyncClient, recorder: Recorder, body: dict
+) -> None:
+    started = time.perf_counter()
+    first_token = None
+    event = None
+    async with client.stream("POST", "/api/chat/stream", json=body) as response:
+        if response.status_code >= 400:
+            await response.aread()
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: ") :]
+            elif line.startswith("data: ") and event == "token" and first_token is None:
+                first_token = time.perf_counter() - started
+            elif line.startswith("data: ") and event == "error":
+                raise RuntimeError(json.loads(line[len("data: ") :])["detail"])
+
+    if first_token is None:
+        raise RuntimeError("stream ended without a token")
+    recorder.observe("chat_stream.first_token", started, first_token)
+
+
+def rag(fixtures: dict, repeat_ratio: float = 0.5) -> Iteration:
+    """
+    Alternates entity-path turns (a character is named) with vector-path
+    turns (an open question). A `repeat_ratio` share of the questions come
+    from a small fixed set, the rest are unique, to control embedding-cache hits.
+    """
+    stories = fixtures["stories"]
+
+    async def iteration(
+        client: httpx.AsyncClient, recorder: Recorder, worker: int, i: int
+    ) -> None:
+        rng = random.Random(worker * 1_000_003 + i)
+        session_id, story = _session("rag", stories, worker, i)
+        if i % 2 and story["characters"]:
+            operation = "rag.entity"
+            message = f"{rng.choice(story['characters'])}은 누구야?"
+        else:
+            operation = "rag.vector"
+            message = rng.choice(OPEN_QUESTIONS)
+            if rng.random() >= repeat_ratio:
+                message = f"{message} ({worker}-{i})"
+
+        await recorder.timed(
+            operation,
+            client.post(
+                "/api/chat",
+                json={
+                    "message": message,
+                    "story_id": story["id"],
+                    "session_id": session_id,
+                    "user_id": fixtures["user_id"],
+                },
+            ),
+        )
+
+    return iteration
+
+
+def scenes(fixtures: dict) -> Iteration:
+    """Create, read, list, update and delete a scene in a seeded story."""
+    stories = fixtures["stories"]
+
+    async def iteration(
+        client: httpx.AsyncClient, recorder: Recorder, worker: int, i: int
+    ) -> None:
+        story = stories[(worker + i) % len(stories)]
+        base = f"/stories/{story['id']}/scenes"
+        # Far past the seeded chain, unique per worker and iteration
+        sequence = 100_000 + worker * 100_000 + i
+
+        response = await recorder.timed(
+            "scenes.create",
+            client.post(
+                base,
+                json={
+                    "content": f"벤치마크 장면 {worker}-{i}. 바람이 불었다.",
+                    "sequence": sequence,
+                    "scene_type": "narrative",
+                    "choices": [{"text": "계속한다", "sequence": 1}],
+                },
+            ),
+        )
+        scene_id = response.json()["data"]["id"]
+
+        await recorder.timed("scenes.get", client.get(f"{base}/{scene_id}"))
+        await recorder.timed("scenes.list", client.get(base, params={"limit": 20}))
+        await recorder.timed(
+            "scenes.update",
+            client.patch(
+                f"{base}/{scene_id}",
+                json={"content": f"수정된 장면 {worker}-{i}. 비가 그쳤다."},
+            ),
+        )
+        await recorder.timed("scenes.delete", client.delete(f"{base}/{scene_id}"))
+
+    return iteration
+
+
+SCENARIOS: Dict[str, Callable[[dict], Iteration]] = {
+    "chat": chat,
+    "chat_stream": chat_stream,
+    "rag": rag,
+    "scenes": scenes,
+}
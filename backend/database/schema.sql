@@ -98,6 +98,8 @@ create table characters (
     user_id uuid references users(id) on delete cascade not null,
     name text not null,
     description text not null,
+    aliases text[],  -- other names used in chat (entity matcher)
+    key_terms text[],  -- signature items/places/titles that point to this character (entity matcher)
     personality_traits text[],
     background_story text,
     appearance_description text,
@@ -106,6 +108,9 @@ create table characters (
     -- Vector embedding for RAG (using pgvector)
     -- Vector embedding for RAG (using pgvector)
     embedding vector(384),
+    -- sha256(model id + embedded text); unchanged hash = skip re-embedding
+    embedding_hash text,
+    embedded_at timestamptz,
     
     created_at timestamptz default now(),
     updated_at timestamptz default now()
@@ -134,6 +139,8 @@ create table generated_images (
     storage_path text,
     model_used text default 'dall-e-3',
     generation_params jsonb,
+    -- sha256(model, normalized prompt, params); rows sharing a key reuse one render
+    cache_key text,
     created_at timestamptz default now()
 );
 
@@ -151,6 +158,57 @@ create table generated_bgms (
     created_at timestamptz default now()
 );
 
+-- ============================================
+-- MEDIA_JOBS (Durable background generation queue)
+-- ============================================
+create table media_jobs (
+    id uuid default gen_random_uuid() primary key,
+    kind text not null,
+    provider text not null,
+    scene_id uuid references scenes(id) on delete cascade,
+    payload jsonb not null default '{}',
+    status text default 'pending' check (status in ('pending', 'running', 'succeeded', 'dead')),
+    attempts integer default 0,
+    max_attempts integer default 5,
+    run_after timestamptz default now(),
+    locked_at timestamptz,
+    last_error text,
+    result jsonb,
+    created_at timestamptz default now(),
+    updated_at timestamptz default now()
+);
+
+-- ============================================
+-- CHAT_SESSIONS (Server-side chat transcripts)
+-- ============================================
+create table chat_sessions (
+    id text primary key,
+    user_id uuid references users(id) on delete cascade,
+    story_id uuid references stories(id) on delete cascade,
+    created_at timestamptz default now()
+);
+
+-- Append-only: rows are only ever inserted, (session_id, seq) orders the transcript
+create table chat_messages (
+    session_id text references chat_sessions(id) on delete cascade not null,
+    seq integer not null,
+    role text not null check (role in ('user', 'assistant')),
+    content text not null,
+    created_at timestamptz default now(),
+    primary key (session_id, seq)
+);
+
+-- ============================================
+-- CHAT_SUMMARIES (Rolling summary per chat session)
+-- ============================================
+create table chat_summaries (
+    session_id text primary key references chat_sessions(id) on delete cascade,
+    summary text not null default '',
+    summarized_count integer not null default 0,  -- leading messages folded into summary
+    created_at timestamptz default now(),
+    updated_at timestamptz default now()
+);
+
 -- ============================================
 -- USER_PROGRESS (Track reading progress)
 -- ============================================
@@ -159,7 +217,9 @@ create table user_progress (
     user_id uuid references users(id) on delete cascade not null,
     story_id uuid references stories(id) on delete cascade not null,
     current_scene_id uuid references scenes(id),
-    completed_scenes uuid[] default '{}',
+    completed_scenes uuid[] default '{}',  -- legacy; superseded by completed_bitmap
+    -- Bit n set = scene with sequence n read (LSB first); merged by merge_user_progress
+    completed_bitmap bytea default '\x'::bytea,
     choices_made jsonb default '{}',
     is_completed boolean default false,
     last_read_at timestamptz default now(),
@@ -174,6 +234,8 @@ create table user_progress (
 create index idx_stories_user_id on stories(user_id);
 create index idx_stories_genre on stories(genre);
 create index idx_stories_status on stories(status);
+-- Keyset pagination of the story list (newest first)
+create index idx_stories_created_at on stories(created_at desc, id desc);
 
 create index idx_chapters_story_id on chapters(story_id);
 create index idx_chapters_sequence on chapters(story_id, sequence);
@@ -187,9 +249,18 @@ create index idx_choices_scene_id on choices(scene_id);
 create index idx_choices_next_scene on choices(next_scene_id);
 
 create index idx_characters_user_id on characters(user_id);
+create index idx_characters_created_at on characters(created_at desc, id desc);
 create index idx_story_characters_story on story_characters(story_id);
 create index idx_story_characters_character on story_characters(character_id);
 
+create index idx_generated_images_scene on generated_images(scene_id);
+create index idx_generated_images_cache_key on generated_images(cache_key, created_at desc);
+
+create index idx_media_jobs_claim on media_jobs(provider, status, run_after);
+create index idx_media_jobs_scene on media_jobs(scene_id);
+
+create index idx_chat_sessions_user on chat_sessions(user_id);
+
 create index idx_user_progress_user on user_progress(user_id);
 create index idx_user_progress_story on user_progress(story_id);
 
@@ -225,6 +296,12 @@ create trigger update_characters_updated_at before update on characters
 create trigger update_user_progress_updated_at before update on user_progress
     for each row execute function update_updated_at_column();
 
+create trigger update_media_jobs_updated_at before update on media_jobs
+    for each row execute function update_updated_at_column();
+
+create trigger update_chat_summaries_updated_at before update on chat_summaries
+    for each row execute function update_updated_at_column();
+
 -- ============================================
 -- ROW LEVEL SECURITY (RLS) POLICIES
 -- ============================================
@@ -237,6 +314,10 @@ alter table characters enable row level security;
 alter table story_characters enable row level security;
 alter table generated_images enable row level security;
 alter table generated_bgms enable row level security;
+alter table media_jobs enable row level security;
+alter table chat_sessions enable row level security;
+alter table chat_messages enable row level security;
+alter table chat_summaries enable row level security;
 alter table user_progress enable row level security;
 
 -- Users: can only read/update own profile
@@ -287,6 +368,16 @@ create policy bgms_via_scene on generated_bgms
         where t.user_id = auth.uid()
     ));
 
+-- Media Jobs: accessible through scene ownership
+create policy media_jobs_via_scene on media_jobs
+    for all using (scene_id in (
+        select s.id from scenes s 
+        join stories t on s.story_id = t.id 
+        where t.user_id = auth.uid()
+    ));
+
+-- Chat sessions/messages/summaries: written by the backend only (service role), no client policy
+
 -- User Progress: users can CRUD own progress
 create policy user_progress_own on user_progress
     for all using (auth.uid() = user_id);
@@ -340,3 +431,215 @@ begin
     limit match_count;
 end;
 $$ language plpgsql;
+
+-- Write a batch of character embeddings (background indexer)
+-- updates: [{"id": uuid, "embedding": [384 floats], "embedding_hash": text}, ...]
+create or replace function update_character_embeddings(updates jsonb)
+returns void as $$
+begin
+    update characters c
+    set embedding = (u->>'embedding')::vector,
+        embedding_hash = u->>'embedding_hash',
+        embedded_at = now()
+    from jsonb_array_elements(updates) u
+    where c.id = (u->>'id')::uuid;
+end;
+$$ language plpgsql;
+
+-- Bulk import: scenes + choices in one statement (one transaction), choice links
+-- resolved by client keys (next_scene_key), scene counter updated once.
+-- Returns the new scene id for every client key.
+create or replace function bulk_insert_scenes(p_story_id uuid, p_scenes jsonb)
+returns table (client_key text, new_scene_id uuid) as $$
+begin
+    return query
+    with items as (
+        select i.value as item
+        from jsonb_array_elements(p_scenes) i
+    ),
+    new_scenes as (
+        insert into scenes (
+            story_id, chapter_id, content, sequence, scene_type,
+            emotion_score, importance_score, has_generated_image, has_generated_bgm
+        )
+        select
+            p_story_id,
+            (item->>'chapter_id')::uuid,
+            item->>'content',
+            (item->>'sequence')::int,
+            coalesce(item->>'scene_type', 'narrative'),
+            (item->>'emotion_score')::float,
+            (item->>'importance_score')::float,
+            false,
+            coalesce((item->>'has_generated_bgm')::boolean, false)
+        from items
+        returning scenes.id, scenes.sequence
+    ),
+    keyed as (
+        -- sequence is unique per story, so it maps rows back to client keys
+        select i.item->>'key' as key, n.id, i.item
+        from new_scenes n
+        join items i on (i.item->>'sequence')::int = n.sequence
+    ),
+    new_choices as (
+        insert into choices (scene_id, text, consequence_summary, sequence, next_scene_id)
+        select
+            k.id,
+            c->>'text',
+            c->>'consequence_summary',
+            (c->>'sequence')::int,
+            coalesce((c->>'next_scene_id')::uuid, target.id)
+        from keyed k
+        cross join jsonb_array_elements(coalesce(k.item->'choices', '[]'::jsonb)) c
+        left join keyed target on target.key = c->>'next_scene_key'
+        returning 1
+    )
+    select k.key, k.id from keyed k;
+
+    update stories
+    set total_scenes = total_scenes + jsonb_array_length(p_scenes)
+    where id = p_story_id;
+end;
+$$ language plpgsql;
+
+-- Bulk rescoring: one statement for all scenes of a story
+create or replace function update_scene_scores(updates jsonb)
+returns void as $$
+begin
+    update scenes s
+    set emotion_score = (u->>'emotion_score')::float,
+        importance_score = (u->>'importance_score')::float
+    from jsonb_array_elements(updates) u
+    where s.id = (u->>'id')::uuid;
+end;
+$$ language plpgsql;
+
+-- Story graph (GET /api/stories/{id}/graph): all scenes and all choices of a
+-- story as compact arrays, two set-based selects in one round trip.
+-- Returns null when the story doesn't exist.
+create or replace function story_graph_rows(p_story_id uuid)
+returns jsonb as $$
+    select jsonb_build_object(
+        'scenes', coalesce((
+            select jsonb_agg(
+                jsonb_build_array(s.id, s.sequence, s.scene_type, s.emotion_score, s.importance_score)
+                order by s.sequence
+            )
+            from scenes s
+            where s.story_id = p_story_id
+        ), '[]'::jsonb),
+        'choices', coalesce((
+            select jsonb_agg(
+                jsonb_build_array(c.id, c.scene_id, c.next_scene_id, c.sequence)
+                order by c.scene_id, c.sequence
+            )
+            from choices c
+            join scenes s on s.id = c.scene_id
+            where s.story_id = p_story_id
+        ), '[]'::jsonb)
+    )
+    where exists (select 1 from stories where id = p_story_id);
+$$ language sql stable;
+
+-- Bitwise OR of two bitmaps of possibly different lengths
+create or replace function bytea_or(a bytea, b bytea)
+returns bytea as $$
+declare
+    result bytea;
+    shorter bytea;
+begin
+    if a is null then return b; end if;
+    if b is null then return a; end if;
+
+    if length(a) >= length(b) then
+        result := a; shorter := b;
+    else
+        result := b; shorter := a;
+    end if;
+    for i in 0 .. length(shorter) - 1 loop
+        result := set_byte(result, i, get_byte(result, i) | get_byte(shorter, i));
+    end loop;
+    return result;
+end;
+$$ language plpgsql immutable;
+
+-- Reader progress write-behind (app/services/progress_buffer.py): one row per
+-- (user, story) in `updates`, each key at most once per call. Completed
+-- scenes arrive as a base64 bitmap and are ORed in; choices are merged.
+-- Rows whose user or story no longer exists are skipped, and a current scene
+-- deleted since the page turn is left unset, so one stale row can't fail the batch
+create or replace function merge_user_progress(updates jsonb)
+returns void as $$
+begin
+    insert into user_progress as p (
+        user_id, story_id, current_scene_id, completed_bitmap,
+        choices_made, is_completed, last_read_at
+    )
+    select
+        (u->>'user_id')::uuid,
+        (u->>'story_id')::uuid,
+        (select s.id from scenes s where s.id = (u->>'current_scene_id')::uuid),
+        decode(coalesce(u->>'completed', ''), 'base64'),
+        coalesce(u->'choices', '{}'::jsonb),
+        coalesce((u->>'is_completed')::boolean, false),
+        coalesce((u->>'last_read_at')::timestamptz, now())
+    from jsonb_array_elements(updates) u
+    where exists (select 1 from users where id = (u->>'user_id')::uuid)
+      and exists (select 1 from stories where id = (u->>'story_id')::uuid)
+    on conflict (user_id, story_id) do update
+    set current_scene_id = coalesce(excluded.current_scene_id, p.current_scene_id),
+        completed_bitmap = bytea_or(p.completed_bitmap, excluded.completed_bitmap),
+        choices_made = p.choices_made || excluded.choices_made,
+        is_completed = p.is_completed or excluded.is_completed,
+        last_read_at = greatest(p.last_read_at, excluded.last_read_at);
+end;
+$$ language plpgsql;
+
+-- Progress bits are keyed by scene sequence, and a deleted scene's sequence
+-- can be taken again (appends use max + 1), so deleting a scene clears its
+-- bit for every reader of the story: the next scene there starts unread
+create or replace function clear_deleted_scene_progress()
+returns trigger as $$
+begin
+    update user_progress
+    set completed_bitmap = set_bit(completed_bitmap, old.sequence, 0)
+    where story_id = old.story_id
+      and old.sequence >= 0
+      and length(completed_bitmap) * 8 > old.sequence
+      and get_bit(completed_bitmap, old.sequence) = 1;
+    return old;
+end;
+$$ language plpgsql;
+
+create trigger clear_deleted_scene_progress after delete on scenes
+    for each row execute function clear_deleted_scene_progress();
+
+-- Claim up to p_limit runnable jobs for a provider (job queue workers)
+-- Jobs stuck in 'running' longer than p_lock_timeout (crashed worker) are reclaimed
+create or replace function claim_media_jobs(
+    p_provider text,
+    p_limit int,
+    p_lock_timeout interval default interval '10 minutes'
+)
+returns setof media_jobs as $$
+begin
+    return query
+    update media_jobs j
+    set status = 'running',
+        attempts = j.attempts + 1,
+        locked_at = now()
+    where j.id in (
+        select m.id
+        from media_jobs m
+        where m.provider = p_provider
+          and (
+              (m.status = 'pending' and m.run_after <= now())
+              or (m.status = 'running' and m.locked_at < now() - p_lock_timeout)
+          )
+        order by m.run_after
+        limit p_limit
+        for update skip locked
+    )
+    returning j.*;
+end;
+$$ language plpgsql;
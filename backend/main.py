@@ -1,13 +1,72 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from dotenv import load_dotenv
 from app.api.chat import router as chat_router
 from app.api.stories import router as stories_router
 from app.api.characters import router as characters_router
 from app.api.scenes import router as scenes_router
+from app.api.jobs import router as jobs_router
+from app.api.images import router as images_router
+from app.api.progress import router as progress_router
+from app.api.metrics import router as metrics_router
+from app.services.container import ServiceContainer
+from app.services.metrics import get_metrics
 
 load_dotenv()
 
-app = FastAPI(title="NovelAIne API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    services = ServiceContainer()
+    await services.start()
+    app.state.services = services
+    yield
+    await services.stop()
+
+
+app = FastAPI(title="NovelAIne API", version="0.1.0", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    # Streaming responses are timed until the response starts, not to the last byte
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        get_metrics().request_seconds.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            # Route template, not the raw path, to keep label cardinality bounded
+            route=_route_label(request),
+            status=status,
+        )
+
+
+def _route_label(request: Request) -> str:
+    """
+    Full route template, e.g. "/api/stories/{story_id}/progress". A route
+    included with a prefix only knows its own path, so the prefix is taken
+    from the leading segments of the request path the template doesn't cover.
+    """
+    template = getattr(request.scope.get("route"), "path", None)
+    if template is None:
+        return "unmatched"
+
+    root_path = request.scope.get("root_path", "")
+    path = request.scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path) :]
+
+    segments = path.split("/")
+    extra = len(segments) - len(template.split("/"))
+    prefix = "/".join(segments[: extra + 1]) if extra > 0 else ""
+    return root_path + prefix + template
 
 
 @app.get("/")
@@ -18,4 +77,8 @@ def read_root():
 app.include_router(chat_router, prefix="/api")
 app.include_router(stories_router, prefix="/api")
 app.include_router(characters_router, prefix="/api")
+app.include_router(jobs_router, prefix="/api")
+app.include_router(images_router, prefix="/api")
+app.include_router(progress_router, prefix="/api")
 app.include_router(scenes_router)
+app.include_router(metrics_router)
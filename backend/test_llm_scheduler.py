@@ -0,0 +1,208 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import groq
+import httpx
+
+from app.services.llm_scheduler import LLMScheduler, SchedulerOverloaded
+
+
+class FakeCompletions:
+    """chat.completions stand-in: fixed latency, optional errors, usage per call."""
+
+    def __init__(self, latency: float = 0.01, total_tokens: int = 30):
+        self.latency = latency
+        self.total_tokens = total_tokens
+        # Raised in order by the next calls
+        self.errors = []
+        self.calls = 0
+        self.cancelled = 0
+
+    async def create(self, **params):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(
+            choices=[],
+            usage=SimpleNamespace(
+                prompt_tokens=0,
+                completion_tokens=self.total_tokens,
+                total_tokens=self.total_tokens,
+            ),
+        )
+
+
+class FakeScheduler(LLMScheduler):
+    def __init__(self, completions: FakeCompletions, **kwargs):
+        super().__init__(**kwargs)
+        self._fake = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    def _groq(self):
+        return self._fake
+
+
+def request(text: str = "hi", model: str = "model-a") -> dict:
+    return {
+        "model": model,
+        "messages": [{"role": "user", "content": text}],
+        "max_tokens": 100,
+    }
+
+
+def rate_limit_error() -> groq.RateLimitError:
+    response = httpx.Response(
+        429,
+        headers={"retry-after": "0"},
+        request=httpx.Request("POST", "http://groq.test/chat/completions"),
+    )
+    return groq.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_limit_grows_while_it_binds():
+    async def run():
+        scheduler = FakeScheduler(
+            FakeCompletions(), min_concurrency=1, initial_concurrency=2
+        )
+        await asyncio.gather(
+            *(scheduler.complete("chat", **request(f"turn {i}")) for i in range(20))
+        )
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert scheduler.limit > 2
+    assert scheduler.in_flight == 0
+
+
+def test_rate_limit_shrinks_limit_and_retries():
+    async def run():
+        completions = FakeCompletions()
+        completions.errors.append(rate_limit_error())
+        scheduler = FakeScheduler(completions, initial_concurrency=8, backoff=0.5)
+        response = await scheduler.complete("chat", **request())
+        return scheduler, completions, response
+
+    scheduler, completions, response = asyncio.run(run())
+    assert response.usage.total_tokens == 30
+    assert completions.calls == 2
+    assert scheduler.limit == 4
+    assert scheduler.counts["decreased"] == 1
+    assert scheduler.counts["throttled"] == 1
+
+
+def test_request_is_shed_at_queue_deadline():
+    async def run():
+        scheduler = FakeScheduler(
+            FakeCompletions(latency=0.3),
+            min_concurrency=1,
+            max_concurrency=1,
+            initial_concurrency=1,
+            queue_timeouts={"interactive": 0.05},
+        )
+        # Expected wait below the deadline, so the request queues and times out there
+        scheduler._service_time = 0.01
+        holder = asyncio.create_task(scheduler.complete("chat", **request("first")))
+        await asyncio.sleep(0)
+        try:
+            await scheduler.complete("chat", **request("second"))
+        except SchedulerOverloaded as e:
+            error = e
+        else:
+            error = None
+        await holder
+        return scheduler, error
+
+    scheduler, error = asyncio.run(run())
+    assert error is not None and "exceeded" in str(error)
+    assert scheduler.counts["shed"] == 1
+    assert scheduler.stats()["queued"]["interactive"] == 0
+
+
+def test_identical_requests_share_one_call():
+    async def run():
+        completions = FakeCompletions()
+        scheduler = FakeScheduler(completions)
+        responses = await asyncio.gather(
+            scheduler.complete("chat", **request()),
+            scheduler.complete("chat", **request()),
+        )
+        # Another priority class never shares with it
+        await scheduler.complete("summary", **request())
+        return scheduler, completions, responses
+
+    scheduler, completions, responses = asyncio.run(run())
+    assert responses[0] is responses[1]
+    assert completions.calls == 2
+    assert scheduler.counts["coalesced"] == 1
+
+
+def test_last_caller_to_leave_cancels_shared_call():
+    async def run():
+        completions = FakeCompletions(latency=0.2)
+        scheduler = FakeScheduler(completions)
+        first = asyncio.create_task(scheduler.complete("chat", **request()))
+        second = asyncio.create_task(scheduler.complete("chat", **request()))
+        await asyncio.sleep(0.02)
+
+        first.cancel()
+        await asyncio.sleep(0.02)
+        still_running = completions.cancelled == 0
+
+        second.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+        await asyncio.sleep(0.02)
+        return scheduler, completions, still_running
+
+    scheduler, completions, still_running = asyncio.run(run())
+    assert still_running
+    assert completions.calls == 1
+    assert completions.cancelled == 1
+    assert scheduler.in_flight == 0
+
+
+def test_token_reservation_is_settled_against_usage():
+    async def run(total_tokens: int):
+        scheduler = FakeScheduler(
+            FakeCompletions(total_tokens=total_tokens), tokens_per_minute=6000
+        )
+        await scheduler.complete("chat", **request())
+        return scheduler._rate_limit("model-a").tokens.level
+
+    # Reserved 102 (2 prompt characters + max_tokens), used 30: 72 handed back
+    assert abs(asyncio.run(run(30)) - (6000 - 30)) < 5
+    # Used more than reserved: the difference is taken as well
+    assert abs(asyncio.run(run(500)) - (6000 - 500)) < 5
+
+
+def test_paced_model_does_not_hold_back_other_models():
+    async def run():
+        scheduler = FakeScheduler(FakeCompletions())
+        scheduler._rate_limit("model-a").paused_until = time.monotonic() + 0.3
+
+        paced = asyncio.create_task(
+            scheduler.complete("chat", **request(model="model-a"))
+        )
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        await scheduler.complete("chat", **request(model="model-b"))
+        other_wait = time.monotonic() - started
+        await paced
+        return other_wait
+
+    assert asyncio.run(run()) < 0.2
+
+
+if __name__ == "__main__":
+    test_limit_grows_while_it_binds()
+    test_rate_limit_shrinks_limit_and_retries()
+    test_request_is_shed_at_queue_deadline()
+    test_identical_requests_share_one_call()
+    test_last_caller_to_leave_cancels_shared_call()
+    test_token_reservation_is_settled_against_usage()
+    test_paced_model_does_not_hold_back_other_models()
+    print("llm scheduler tests passed")
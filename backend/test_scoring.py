@@ -0,0 +1,57 @@
+from app.services.scoring_engine import get_scoring_engine
+
+SCENES = [
+    "He loved her. The deaths and choices, decisions.",
+    "그녀는 비참한 심정으로 울부짖었다. 죽음이 그녀를 덮쳤다. (슬픔/절망)",
+    "A betrayal, then victory: the discovery was a revelation.",
+    "사랑과 분노 사이에서 그는 마지막 선택을 내렸다. 전환점이었다.",
+    "Nothing happened today.",
+    "",
+]
+
+
+def baseline_scene_scores(content: str) -> dict:
+    """The keyword scan the scoring engine replaced (default lexicon)."""
+    emotion_keywords = [
+        "death", "love", "betrayal", "victory", "tragedy",
+        "슬픔", "기쁨", "분노", "사랑", "죽음",
+    ]
+    importance_keywords = [
+        "choice", "decision", "discovery", "revelation",
+        "선택", "결정", "발견", "전환점",
+    ]
+
+    content_lower = content.lower()
+
+    emotion_count = sum(1 for kw in emotion_keywords if kw in content_lower)
+    importance_count = sum(1 for kw in importance_keywords if kw in content_lower)
+
+    emotion_score = min(emotion_count / 3, 1.0)
+    importance_score = min(importance_count / 2, 1.0)
+
+    return {
+        "emotion_score": emotion_score,
+        "importance_score": importance_score,
+        "should_generate_image": emotion_score > 0.5 or importance_score > 0.6,
+        "should_generate_bgm": emotion_score > 0.3,
+    }
+
+
+def test_default_lexicon_matches_baseline():
+    engine = get_scoring_engine()
+    for content in SCENES:
+        assert engine.score(content) == baseline_scene_scores(content), content
+
+
+def test_inflections_are_scored():
+    scores = get_scoring_engine().score(SCENES[0])
+    # "loved", "deaths" / "choices", "decisions"
+    assert scores["emotion_score"] > 0
+    assert scores["importance_score"] == 1.0
+
+
+if __name__ == "__main__":
+    test_default_lexicon_matches_baseline()
+    test_inflections_are_scored()
+    for content in SCENES:
+        print(f"{content!r}: {get_scoring_engine().score(content)}")